@@ -0,0 +1,135 @@
+"""
+Async versions of the hot read endpoints, for ASGI deployments.
+
+Under ASGI a sync view holds a thread, and a database connection, for the
+whole request. These views serve GET on the event loop. /api/health, the
+catalog bodies (catalog.aget) and users already in the JWT user cache
+(CachedJWTAuthentication.aauthenticate) need no thread at all. Each
+remaining database round trip goes through Django's async ORM. Payloads,
+ETags and status codes are those of the sync views in views.py.
+
+backend/urls.py routes these paths here under the ASGI profile
+(settings.ASGI_PROFILE, which backend/asgi.py turns on). Everything else on a path
+goes to its sync view, so DRF still answers it:
+  - other methods
+  - ?page_size= / ?cursor= pages and ?since= deltas
+  - error responses (bad token, 401, 404)
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from . import catalog, views
+from .authentication import CachedJWTAuthentication
+from .conditional import aconditional_response, conditional_response, my_requests_version, request_version
+from .fast_views import user_request_rows
+from .models import ServiceRequest
+from .pagination import is_paginated
+from .renderers import FastJSONRenderer
+
+
+def read_path(sync_view):
+    """
+    Serve GET with the decorated coroutine, which may return None to pass
+    the request on; everything else goes to sync_view, run in a thread.
+    """
+    fallback = sync_to_async(sync_view)
+
+    def decorator(view):
+        @wraps(sync_view)  # keeps csrf_exempt and the DRF view class (for the schema)
+        async def wrapper(request, *args, **kwargs):
+            if request.method == 'GET':
+                response = await view(request, *args, **kwargs)
+                if response is not None:
+                    return response
+            return await fallback(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def _authenticate(request):
+    """
+    Set request.user and request.auth like DRF's authentication. False when
+    the credentials are bad: the sync view then answers with DRF's 401.
+    """
+    try:
+        result = await CachedJWTAuthentication().aauthenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return False
+    request.user, request.auth = result if result is not None else (AnonymousUser(), None)
+    return True
+
+
+async def _authenticated(request):
+    return await _authenticate(request) and request.user.is_authenticated
+
+
+def _json(data):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json')
+
+
+async def _catalog_response(request, name, serialize):
+    if not await _authenticate(request):
+        return None
+    entry = await catalog.aget(name, serialize)
+    return conditional_response(
+        request, entry.version, lambda: HttpResponse(entry.body, content_type='application/json')
+    )
+
+
+# -------------------------------
+# Views
+# -------------------------------
+
+@read_path(views.health)
+async def health(request):
+    if not await _authenticate(request):
+        return None
+    return _json({"status": "OK"})
+
+
+@read_path(views.services_view)
+async def services_view(request):
+    return await _catalog_response(request, "services", views._service_rows)
+
+
+@read_path(views.providers_view)
+async def providers_view(request):
+    if is_paginated(request):
+        return None
+    return await _catalog_response(request, "providers", views._provider_rows)
+
+
+@read_path(views.request_view)
+async def request_view(request, request_id):
+    if not await _authenticated(request):
+        return None
+    # Version functions are shared with the sync views; one round trip each
+    version = await sync_to_async(request_version)(request, request_id)
+    if version is None:
+        return None
+
+    async def respond():
+        rows = await user_request_rows.acall(ServiceRequest.objects.filter(id=request_id))
+        if not rows:  # deleted since the version query
+            return await sync_to_async(views.request_view)(request, request_id)
+        return _json(rows[0])  # same payload as ServiceRequestUserSerializer
+    return await aconditional_response(request, version, respond)
+
+
+@read_path(views.my_requests_view)
+async def my_requests_view(request):
+    if is_paginated(request) or 'since' in request.GET or not await _authenticated(request):
+        return None
+    requests = ServiceRequest.objects.filter(user=request.user)
+    if request.GET.get('status') == 'active':
+        requests = requests.filter(status__in=["Pending", "Accepted", "Arrived"])
+    version = await sync_to_async(my_requests_version)(request)
+
+    async def respond():
+        return _json(await user_request_rows.acall(requests.order_by('-created', '-id')))
+    return await aconditional_response(request, version, respond)
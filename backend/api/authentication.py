@@ -0,0 +1,176 @@
+"""
+JWT authentication without a User query per request.
+
+simplejwt's JWTAuthentication loads the User row for every authenticated
+request, so a polling client pays a query just to say who it is.
+CachedJWTAuthentication keeps the users it resolved in a per-process LRU
+(JWT_USER_CACHE_SIZE entries) keyed by (user id, token version) for
+JWT_USER_CACHE_SECONDS; a hit costs a dict lookup.
+
+The token version is simplejwt's revoke claim: with CHECK_REVOKE_TOKEN
+(SIMPLE_JWT, on by default here) every token carries a hash of the user's
+password hash, and a token whose hash no longer matches is rejected. A
+cached user is only ever stored under the version it was checked against.
+
+Invalidation: post_save / post_delete on User and UserProfile (signals.py)
+drop the user's entries in this process, which covers set_password() +
+save(). Other processes notice within JWT_USER_CACHE_SECONDS: until then a
+deleted or deactivated user, or a token revoked by a password change, still
+authenticates there. queryset.update() on users sends no signals; call
+invalidate() after it.
+
+With JWT_IDENTITY_CLAIMS, tokens issued by tokens_for() also carry "role"
+and "provider_id" (the ServiceProvider matched by email at login), so a
+hot path like the GPS ingest needs no query at all to know its caller. The
+claims are a snapshot: they go stale if the profile or the provider's email
+changes, until the client logs in again. Views read them from request.auth
+(see views._provider_id_for_request).
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.functions import Lower
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import ServiceProvider, UserProfile
+
+_lock = threading.Lock()
+_users = OrderedDict()  # (user id, token version) -> (user, monotonic expiry)
+_counters = {"hits": 0, "misses": 0, "invalidations": 0}
+_generation = 0  # bumped by invalidate(): a lookup that raced one is not cached
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        key = _cache_key(validated_token)
+        user, generation = _lookup(key)
+        if user is None:
+            user = super().get_user(validated_token)  # the stock lookup, is_active and revoke checks
+            _remember(key, user, generation)
+        return _detached(user)
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views (see async_views.py): (user, token), or
+        None without credentials. A cached user never leaves the event loop;
+        only a miss runs the lookup in a thread. Raises like authenticate().
+        """
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        key = _cache_key(validated_token)
+        user, generation = _lookup(key)
+        if user is None:
+            user = await sync_to_async(super().get_user)(validated_token)
+            _remember(key, user, generation)
+        return _detached(user), validated_token
+
+
+def _detached(user):
+    """
+    A copy of a cached user for one request, which may set attributes on
+    request.user or load its relations. copy.copy() alone would share
+    _state.fields_cache, so a profile loaded (or replaced) by one request
+    would leak into the cached user and every later request.
+    """
+    clone = copy.copy(user)
+    clone._state = copy.copy(user._state)
+    clone._state.fields_cache = {}
+    return clone
+
+
+def _cache_key(validated_token):
+    try:
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("Token contained no recognizable user identification")
+    return str(user_id), validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+
+
+def _lookup(key):
+    """(cached user, None) on a hit, else (None, the generation to pass to _remember())."""
+    now = time.monotonic()
+    with _lock:
+        entry = _users.get(key)
+        if entry is not None and entry[1] > now:
+            _users.move_to_end(key)
+            _counters["hits"] += 1
+            return entry[0], None
+        _counters["misses"] += 1
+        return None, _generation
+
+
+def _remember(key, user, generation):
+    with _lock:
+        if generation != _generation:  # an invalidation raced the lookup
+            return
+        _users[key] = (user, time.monotonic() + getattr(settings, 'JWT_USER_CACHE_SECONDS', 30))
+        _users.move_to_end(key)
+        while len(_users) > getattr(settings, 'JWT_USER_CACHE_SIZE', 10000):
+            _users.popitem(last=False)
+
+
+def invalidate(user_id):
+    """Forget every cached token version of a user in this process."""
+    global _generation
+    user_id = str(user_id)
+    with _lock:
+        _generation += 1
+        for key in [key for key in _users if key[0] == user_id]:
+            del _users[key]
+        _counters["invalidations"] += 1
+
+
+def clear():
+    with _lock:
+        _users.clear()
+        for counter in _counters:
+            _counters[counter] = 0
+
+
+def stats():
+    with _lock:
+        lookups = _counters["hits"] + _counters["misses"]
+        return dict(
+            _counters,
+            hit_ratio=round(_counters["hits"] / lookups, 4) if lookups else None,
+            entries=len(_users),
+        )
+
+
+# -------------------------------
+# Identity claims
+# -------------------------------
+
+def identity_claims(user):
+    """{"role", "provider_id"} for a user: the profile role and the provider matched by email."""
+    try:
+        role = user.userprofile.role  # already loaded by the login lookup (backends.EmailBackend)
+    except UserProfile.DoesNotExist:
+        role = None
+    provider_id = None
+    if user.email:
+        provider_id = (
+            ServiceProvider.objects.alias(email_lower=Lower('email')).filter(email_lower=user.email.lower())
+            .values_list('id', flat=True).first()
+        )
+    return {"role": role, "provider_id": provider_id}
+
+
+def tokens_for(user):
+    """RefreshToken for a login; its access token copies the claims."""
+    refresh = RefreshToken.for_user(user)
+    if getattr(settings, 'JWT_IDENTITY_CLAIMS', False):
+        for name, value in identity_claims(user).items():
+            refresh[name] = value
+    return refresh
+
@@ -0,0 +1,26 @@
+"""
+Authentication backend for the login endpoint: users sign in with their email.
+
+authenticate(request, email=..., password=...) runs one query, on the
+auth_user email index (migration 0019), joined with UserProfile so the login
+response's role needs no further lookup. The username-based ModelBackend
+stays after it in AUTHENTICATION_BACKENDS for the admin.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class EmailBackend(ModelBackend):
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        User = get_user_model()
+        # Emails are unique at signup, but the column is not: try each match
+        candidates = list(User._default_manager.select_related('userprofile').filter(email=email)[:5])
+        for user in candidates:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        if not candidates:
+            # Same hashing cost as a wrong password, so timing doesn't reveal unknown emails
+            User().set_password(password)
+        return None
@@ -0,0 +1,228 @@
+"""
+Batch writes behind /api/requests/batch.
+
+    POST  {"requests": [{"service", "user", "provider", "lat", "lng"}, ...]}
+    PATCH {"requests": [{"id", "status"?, "notes"?, "lat"?, "lng"?, "provider"?}, ...]}
+
+Items mean the same as the body of POST /api/requests and PUT
+/api/requests/<id> (status "Accepted" takes the provider's email, like the
+single accept). A batch costs a fixed number of queries however many items
+it carries: one in_bulk per referenced model, one query for the providers'
+active jobs, one bulk_create / bulk_update in one transaction and one insert
+of realtime events, instead of three get_object_or_404 lookups and a save
+per item.
+
+Items are checked independently; the valid ones are written and every item
+gets a result, in input order:
+
+    {"index": 0, "status": 201, "id": 17}
+    {"index": 1, "status": 404, "error": "Service not found."}
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import realtime
+from .models import ACTIVE_JOB_STATUSES, Service, ServiceProvider, ServiceRequest
+from .transitions import (
+    ACCEPT_BUSY, ACCEPT_ERROR_STATUS, ACCEPT_ERRORS, ACCEPT_NO_PROVIDER, ACCEPT_NOT_FOUND, ACCEPT_TAKEN,
+)
+
+STATUSES = {value for value, _ in ServiceRequest.STATUS_CHOICES}
+
+
+class BatchError(Exception):
+    """The batch as a whole is malformed (not a list, empty, too long)."""
+
+
+def items_from(data, max_items):
+    items = data.get("requests") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise BatchError('Send {"requests": [...]} with at least one item.')
+    if len(items) > max_items:
+        raise BatchError(f"At most {max_items} items per batch.")
+    return items
+
+
+def _ok(index, status, req):
+    return {"index": index, "status": status, "id": req.id}
+
+
+def _error(index, status, message):
+    return {"index": index, "status": status, "error": message}
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _coordinates(item, default=None):
+    """(lat, lng) as floats, `default` when both are absent, or None when invalid."""
+    if "lat" not in item and "lng" not in item:
+        return default
+    try:
+        return float(item["lat"]), float(item["lng"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# -------------------------------
+# Creates
+# -------------------------------
+
+def create_requests(items):
+    """Create a Pending request per valid item; returns the results."""
+    results = [None] * len(items)
+    refs = {
+        model: model.objects.in_bulk({
+            key for key in (_int(item.get(field)) for item in items if isinstance(item, dict)) if key is not None
+        })
+        for model, field in ((Service, "service"), (User, "user"), (ServiceProvider, "provider"))
+    }
+
+    new = []  # (index, request)
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = _error(index, 400, "Item must be an object.")
+            continue
+        service = refs[Service].get(_int(item.get("service")))
+        user = refs[User].get(_int(item.get("user")))
+        provider = refs[ServiceProvider].get(_int(item.get("provider")))
+        coordinates = _coordinates(item, default=(0.0, 0.0))
+        if service is None:
+            results[index] = _error(index, 404, "Service not found.")
+        elif user is None:
+            results[index] = _error(index, 404, "User not found.")
+        elif provider is None:
+            results[index] = _error(index, 404, "Provider not found.")
+        elif coordinates is None:
+            results[index] = _error(index, 400, "lat and lng must be numbers.")
+        else:
+            lat, lng = coordinates
+            # bulk_create skips ServiceRequest.save(), which prices the request from its service
+            new.append((index, ServiceRequest(service=service, user=user, provider=provider, lat=lat, lng=lng,
+                                              estimated_cost=service.price)))
+
+    with transaction.atomic():
+        created = ServiceRequest.objects.bulk_create([req for _, req in new], batch_size=500)
+        # bulk_create sends no post_save signals
+        realtime.publish_requests("created", [(req, req.service.name) for req in created])
+    for index, req in new:
+        results[index] = _ok(index, 201, req)
+    return results
+
+
+# -------------------------------
+# Updates
+# -------------------------------
+
+def update_requests(items):
+    """Apply each valid item's changes; returns the results."""
+    results = [None] * len(items)
+    ids = [_int(item.get("id")) if isinstance(item, dict) else None for item in items]
+    rows = ServiceRequest.objects.select_related('service').in_bulk({i for i in ids if i is not None})
+    emails = {
+        str(item.get("provider") or "").lower()
+        for item in items if isinstance(item, dict) and item.get("status") == "Accepted"
+    }
+    providers = {}
+    if emails:
+        providers = {
+            p.email_lower: p.id
+            for p in ServiceProvider.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails)
+        }
+
+    planned = []  # (index, request, fields changed, provider whose slot the row held before)
+    seen = set()
+    for index, (item, request_id) in enumerate(zip(items, ids)):
+        req = rows.get(request_id)
+        if not isinstance(item, dict) or request_id is None:
+            results[index] = _error(index, 400, "Item must be an object with an integer id.")
+        elif req is None:
+            results[index] = _error(index, 404, ACCEPT_ERRORS[ACCEPT_NOT_FOUND])
+        elif request_id in seen:
+            results[index] = _error(index, 400, "Request appears more than once in the batch.")
+        else:
+            seen.add(request_id)
+            slot = req.provider_id if req.status in ACTIVE_JOB_STATUSES else None
+            outcome = _plan_update(item, req, providers)
+            if isinstance(outcome, dict):
+                results[index] = {"index": index, **outcome}
+            else:
+                planned.append((index, req, outcome, slot))
+
+    # one_active_job_per_provider: the slots already held outside the batch, then
+    # rows that stay active with their provider, then new assignments in input order
+    involved = {req.provider_id for _, req, _, _ in planned if req.provider_id}
+    held = set(
+        ServiceRequest.objects.filter(provider_id__in=involved, status__in=ACTIVE_JOB_STATUSES)
+        .exclude(id__in=[req.id for _, req, _, _ in planned]).values_list('provider_id', flat=True)
+    )
+    changed = []
+    for index, req, fields, slot in sorted(planned, key=lambda plan: plan[1].provider_id != plan[3]):
+        if req.status in ACTIVE_JOB_STATUSES and req.provider_id:
+            if req.provider_id in held:
+                results[index] = _error(index, 400, ACCEPT_ERRORS[ACCEPT_BUSY])
+                continue
+            held.add(req.provider_id)
+        changed.append((index, req, fields))
+
+    fields = sorted({field for _, _, changes in changed for field in changes})
+    now = timezone.now()
+    for _, req, _ in changed:
+        req.stamp_status_times(now)  # save() would
+        req.updated = now  # bulk_update skips auto_now
+    try:
+        with transaction.atomic():
+            ServiceRequest.objects.bulk_update(
+                [req for _, req, _ in changed], fields + ['accepted_at', 'completed_at', 'updated'], batch_size=500)
+            # bulk_update sends no post_save signals
+            realtime.publish_requests("updated", [(req, req.service.name) for _, req, _ in changed])
+    except IntegrityError:
+        # A concurrent accept took a provider's slot between the check and the write
+        for index, _, _ in changed:
+            results[index] = _error(index, 409, "Conflicting concurrent update; retry the item.")
+        return results
+    for index, req, _ in changed:
+        results[index] = _ok(index, 200, req)
+    return results
+
+
+def _plan_update(item, req, providers):
+    """
+    Apply the item to `req` in memory. Returns the set of fields it changes,
+    or an error result (without index) when the item is invalid.
+    """
+    status = item.get("status", req.status)
+    if status not in STATUSES:
+        return {"status": 400, "error": f"Unknown status {status!r}."}
+    coordinates = _coordinates(item)
+    if coordinates is None and ("lat" in item or "lng" in item):
+        return {"status": 400, "error": "lat and lng must be numbers."}
+
+    changes = set()
+    if item.get("status") == "Accepted":
+        provider_id = providers.get(str(item.get("provider") or "").lower())
+        if provider_id is None:
+            return {"status": 400, "error": ACCEPT_ERRORS[ACCEPT_NO_PROVIDER]}
+        if req.status in ACTIVE_JOB_STATUSES and req.provider_id == provider_id:
+            pass  # accepting a job the provider already holds is a no-op
+        elif req.status != "Pending":
+            return {"status": ACCEPT_ERROR_STATUS[ACCEPT_TAKEN], "error": ACCEPT_ERRORS[ACCEPT_TAKEN]}
+        else:
+            req.provider_id, req.status = provider_id, "Accepted"
+            changes |= {"provider", "status"}
+    elif "status" in item:
+        req.status = status
+        changes.add("status")
+    if "notes" in item:
+        req.notes = str(item["notes"] or "")
+        changes.add("notes")
+    if coordinates is not None:
+        req.lat, req.lng = coordinates
+        changes |= {"lat", "lng"}
+    return changes
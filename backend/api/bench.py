@@ -0,0 +1,163 @@
+"""
+Shared helpers for the `bench_*` management commands.
+
+Benchmarks never touch db.sqlite3: they run inside a throwaway test database
+created with Django's test utilities and destroyed afterwards.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.test.utils import (
+    setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+
+from .geo import grid_cell
+from .models import ACTIVE_JOB_STATUSES, UserProfile, ServiceProvider, ServiceRequest, Service
+
+SERVICE_TYPES = ["Towing", "Battery", "Fuel", "Flat Tyre", "Lockout"]
+REQUEST_STATUSES = ["Pending", "Accepted", "Arrived", "Completed", "Cancelled"]
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Create a disposable test database (and test environment) for a benchmark run."""
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity, interactive=False, aliases={'default'})
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
+        teardown_test_environment()
+
+
+def time_call(fn, repeat):
+    """Call fn() `repeat` times; return the per-call wall times in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """p50 / p95 / mean of a list of millisecond samples."""
+    return {
+        "p50": statistics.median(samples) if samples else 0.0,
+        "p95": percentile(samples, 95),
+        "mean": statistics.fmean(samples) if samples else 0.0,
+    }
+
+
+def write_table(stdout, headers, rows):
+    """Write rows as a fixed-width text table."""
+    cells = [[str(h) for h in headers]] + [[_fmt(v) for v in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for n, row in enumerate(cells):
+        stdout.write("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+        if n == 0:
+            stdout.write("  ".join("-" * width for width in widths))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+# -------------------------------
+# Fixtures
+# -------------------------------
+
+def create_services():
+    """One Service per SERVICE_TYPES entry (provider.type matches service.name)."""
+    return Service.objects.bulk_create(
+        [Service(name=name, description=f"{name} service", price=500 + 100 * i)
+         for i, name in enumerate(SERVICE_TYPES)]
+    )
+
+
+def create_users(count, prefix="user", role="user"):
+    """Bulk-create users with profiles. Passwords are unusable (no hashing cost)."""
+    users = User.objects.bulk_create(
+        [User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password="!")
+         for i in range(count)]
+    )
+    UserProfile.objects.bulk_create(
+        [UserProfile(user=u, role=role, phone=f"9{i:09d}") for i, u in enumerate(users)]
+    )
+    return users
+
+
+# (lat, lng) of a few Indian metros, used as provider clusters
+CITY_CENTERS = [
+    (15.49, 73.82), (19.08, 72.88), (28.61, 77.21), (12.97, 77.59),
+    (13.08, 80.27), (22.57, 88.36), (17.39, 78.49), (18.52, 73.86),
+]
+
+
+def create_providers(count, rng=None, centers=CITY_CENTERS[:1], spread=0.5):
+    """Bulk-create providers scattered (gaussian) around the given (lat, lng) centers."""
+    rng = rng or random.Random(0)
+    providers = []
+    for i in range(count):
+        center = centers[i % len(centers)]
+        lat = center[0] + rng.gauss(0, spread / 2)
+        lng = center[1] + rng.gauss(0, spread / 2)
+        providers.append(ServiceProvider(
+            name=f"Provider {i}",
+            email=f"provider{i}@example.com",
+            type=SERVICE_TYPES[i % len(SERVICE_TYPES)],
+            lat=lat,
+            lng=lng,
+            grid_cell=grid_cell(lat, lng),  # bulk_create skips save()
+            rating=round(rng.uniform(2.5, 5.0), 1),
+            phone=f"8{i:09d}",
+        ))
+    return ServiceProvider.objects.bulk_create(providers, batch_size=2000)
+
+
+def create_requests(count, services, users, providers, rng=None, statuses=REQUEST_STATUSES,
+                    batch_size=5000):
+    """
+    Bulk-create `count` service requests spread over the given users/providers.
+    A provider gets at most one Accepted/Arrived request (one_active_job_per_provider);
+    further active picks for a busy provider become Completed.
+    """
+    rng = rng or random.Random(0)
+    prices = {s.id: s.price for s in services}
+    busy = set(ServiceRequest.objects.filter(
+        provider__in=providers, status__in=ACTIVE_JOB_STATUSES).values_list('provider_id', flat=True))
+    for start in range(0, count, batch_size):
+        batch = []
+        for _ in range(min(batch_size, count - start)):
+            service = rng.choice(services)
+            provider = rng.choice(providers)
+            status = rng.choice(statuses)
+            if status in ACTIVE_JOB_STATUSES:
+                if provider.id in busy:
+                    status = "Completed"
+                busy.add(provider.id)
+            batch.append(ServiceRequest(
+                service=service,
+                user=rng.choice(users),
+                provider=provider,
+                status=status,
+                lat=15.49 + rng.uniform(-0.5, 0.5),
+                lng=73.82 + rng.uniform(-0.5, 0.5),
+                estimated_cost=prices[service.id],
+            ))
+        ServiceRequest.objects.bulk_create(batch)
@@ -0,0 +1,178 @@
+"""
+Read-through cache for the rarely-changing catalog lists (/api/services and
+/api/providers), stored as pre-rendered JSON bytes.
+
+Two levels:
+  local   per-process LRU of rendered bodies (CATALOG_CACHE_SIZE entries)
+  shared  the Django "default" cache (CACHES setting); set it to Redis or
+          Memcached so every worker sees the same generation and bodies
+
+Each catalog has a generation token in the shared cache. Bodies are keyed by
+(catalog, generation), so invalidating is just replacing the token: every
+process misses on its next read and rebuilds (or picks up another worker's
+rebuild from the shared cache). post_save / post_delete on Service and
+ServiceProvider replace the token (signals.py). In steady state a read is one
+shared-cache get plus a dict lookup, and never touches the database.
+
+With a per-process cache backend (LocMemCache, the default, or DummyCache)
+there is no shared level: a write only reaches the worker that made it. Local
+entries then expire after CATALOG_LOCAL_TTL seconds, so other workers serve
+the old list for at most that long, and the ETag version leaves out the
+(per-process) generation so every worker agrees on it.
+
+Writes through queryset.update() / bulk_update() send no signals; call
+invalidate() after them.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+
+from .conditional import versions
+from .models import Service, ServiceProvider
+from .renderers import FastJSONRenderer
+
+CATALOGS = {
+    "services": Service,
+    "providers": ServiceProvider,
+}
+
+# body: rendered JSON bytes; version: passed to conditional.conditional_response
+CachedBody = namedtuple("CachedBody", "body version")
+
+_lock = threading.Lock()
+_local = OrderedDict()
+_counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _generation_key(name):
+    return f"catalog:{name}:generation"
+
+
+def _body_key(name, generation):
+    return f"catalog:{name}:{generation}"
+
+
+def shared_cache():
+    """Whether the "default" cache is shared between worker processes."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _count(counter):
+    with _lock:
+        _counters[counter] += 1
+
+
+def generation(name):
+    """Current generation token of a catalog (created on first use)."""
+    key = _generation_key(name)
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        token = cache.get(key)
+    return token
+
+
+def get(name, serialize):
+    """
+    CachedBody for a catalog; on a miss the rows are loaded in id order,
+    passed to serialize(queryset) and rendered once.
+    """
+    gen = generation(name)
+    key = (name, gen)
+    entry = _local_hit(key)
+    if entry is not None:
+        return entry
+
+    shared = shared_cache()
+    entry = cache.get(_body_key(name, gen)) if shared else None
+    if entry is not None:
+        _count("shared_hits")
+    else:
+        _count("misses")
+        queryset = CATALOGS[name].objects.order_by('id')
+        rows = serialize(queryset)
+        version = versions(queryset)[0]
+        entry = CachedBody(FastJSONRenderer().render(rows), (gen,) + version if shared else version)
+        if shared:
+            cache.set(_body_key(name, gen), entry, timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 3600))
+
+    expires = None if shared else time.monotonic() + getattr(settings, 'CATALOG_LOCAL_TTL', 5)
+    with _lock:
+        _local[key] = (entry, expires)
+        _local.move_to_end(key)
+        while len(_local) > getattr(settings, 'CATALOG_CACHE_SIZE', 32):
+            _local.popitem(last=False)
+    return entry
+
+
+async def aget(name, serialize):
+    """
+    get() for async views. With an in-process cache backend (the default
+    LocMemCache) a local hit is served on the event loop; a shared-cache
+    round trip or a rebuild runs get() in a thread.
+    """
+    if not shared_cache():
+        entry = _local_hit((name, generation(name)))
+        if entry is not None:
+            return entry
+    return await sync_to_async(get)(name, serialize)
+
+
+def _local_hit(key):
+    with _lock:
+        found = _local.get(key)
+        if found is None:
+            return None
+        entry, expires = found
+        if expires is not None and time.monotonic() >= expires:
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        _counters["local_hits"] += 1
+        return entry
+
+
+def invalidate(name):
+    """
+    Start a new generation now, and again once the current transaction
+    commits so a read racing the write cannot re-cache the old rows.
+    """
+    _new_generation(name)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _new_generation(name))
+
+
+def _new_generation(name):
+    cache.set(_generation_key(name), uuid.uuid4().hex, timeout=None)
+    with _lock:
+        _counters["invalidations"] += 1
+        for key in [k for k in _local if k[0] == name]:
+            del _local[key]
+
+
+def clear():
+    """Drop every cached catalog (local and shared) and reset the counters."""
+    cache.delete_many([_generation_key(name) for name in CATALOGS])
+    with _lock:
+        _local.clear()
+        for counter in _counters:
+            _counters[counter] = 0
+
+
+def stats():
+    with _lock:
+        lookups = _counters["local_hits"] + _counters["shared_hits"] + _counters["misses"]
+        hits = lookups - _counters["misses"]
+        return dict(
+            _counters,
+            hit_ratio=round(hits / lookups, 4) if lookups else None,
+            local_entries=len(_local),
+        )
@@ -0,0 +1,145 @@
+"""
+Conditional GET (ETag / Last-Modified) for the polled read endpoints.
+
+Each endpoint has a cheap "version" function: one query returning
+count + max(updated) of each table its payload is built from. The ETag is
+a hash of that version plus the request path, query string and user, so an
+unchanged poll is answered with 304 Not Modified before any row is loaded or
+serialized.
+
+count + max(updated) changes on every insert, update (auto_now) and delete.
+Code that writes with queryset.update() / bulk_update() must set `updated`
+itself (see dispatch.apply_assignments). auth's User has no `updated`: a
+username change bumps its UserProfile instead (signals.user_changed).
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max, Value
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import ServiceProvider, ServiceRequest, Service, UserProfile
+
+
+def versions(*querysets):
+    """
+    (row count, latest `updated`) for each queryset, all in one round trip
+    (a UNION ALL of one aggregate per queryset).
+    """
+    parts = [
+        qs.order_by().annotate(_part=Value(n)).values('_part')
+        .annotate(count=Count('id'), latest=Max('updated'))
+        .values_list('_part', 'count', 'latest')
+        for n, qs in enumerate(querysets)
+    ]
+    rows = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    found = {part: (count, latest) for part, count, latest in rows}
+    return tuple(found.get(n, (0, None)) for n in range(len(querysets)))
+
+
+def conditional_response(request, version, respond):
+    """
+    304 when the request's If-None-Match / If-Modified-Since still match
+    `version`, else respond(); either way with ETag / Last-Modified headers.
+    """
+    etag, last_modified = _validators(request, version)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = respond()
+        if response.status_code != 200:
+            return response
+    return _with_validators(response, etag, last_modified)
+
+
+async def aconditional_response(request, version, respond):
+    """conditional_response() for async views: respond is a coroutine function."""
+    etag, last_modified = _validators(request, version)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await respond()
+        if response.status_code != 200:
+            return response
+    return _with_validators(response, etag, last_modified)
+
+
+def _validators(request, version):
+    key = "|".join([
+        request.get_full_path(),
+        str(getattr(request.user, 'pk', None)),
+        repr(version),
+    ])
+    etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+    timestamps = [v for v in _flatten(version) if hasattr(v, 'timestamp')]
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    return etag, last_modified
+
+
+def _with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Let browsers keep the body but always revalidate it (no heuristic freshness)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional_get(version_func):
+    """
+    Decorate a DRF function view (below @api_view / @permission_classes, so it
+    runs after authentication). version_func(request, *args, **kwargs) returns
+    a tuple of (count, latest_datetime) pairs or datetimes describing the data
+    (see versions()).
+    GET/HEAD requests whose If-None-Match / If-Modified-Since still match get
+    a 304; other responses get ETag and Last-Modified headers.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            version = version_func(request, *args, **kwargs)
+            if version is None:  # nothing to describe (e.g. 404): just run the view
+                return view(request, *args, **kwargs)
+            return conditional_response(request, version, lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def _flatten(value):
+    if isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _flatten(item)
+    else:
+        yield value
+
+
+# -------------------------------
+# Version functions
+# -------------------------------
+
+def providers_version(request, *args, **kwargs):
+    return versions(ServiceProvider.objects.all())
+
+
+def requests_version(request, *args, **kwargs):
+    # Rows embed service, provider and customer (username, phone) fields, so their changes count too.
+    return versions(
+        ServiceRequest.objects.all(), Service.objects.all(), ServiceProvider.objects.all(),
+        UserProfile.objects.all(),
+    )
+
+
+def my_requests_version(request, *args, **kwargs):
+    return versions(
+        ServiceRequest.objects.filter(user=request.user), Service.objects.all(), ServiceProvider.objects.all(),
+        UserProfile.objects.filter(user=request.user),
+    )
+
+
+def request_version(request, request_id, *args, **kwargs):
+    row = ServiceRequest.objects.filter(id=request_id).values_list(
+        'updated', 'service__updated', 'provider__updated', 'user__userprofile__updated'
+    ).first()
+    return row
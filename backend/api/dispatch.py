@@ -0,0 +1,213 @@
+"""
+Batch auto-dispatch: match Pending requests to idle providers.
+
+One cycle loads every Pending ServiceRequest and every idle ServiceProvider
+(no Accepted/Arrived job), builds a requests x providers cost matrix per
+service type (distance + rating penalty, see ranking.py), solves the
+assignment for the whole batch and applies it with a single bulk_update.
+
+Modes:
+  greedy   cheapest remaining pair first; fast, near-optimal for sparse demand
+  optimal  minimum total cost (Hungarian algorithm)
+
+Run it with `python manage.py dispatch` (see management/commands/dispatch.py).
+"""
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import realtime
+from .models import ACTIVE_JOB_STATUSES, ServiceProvider, ServiceRequest
+from .ranking import RATING_WEIGHT_KM, haversine_matrix, normalize_type
+
+DISPATCH_MODES = ("greedy", "optimal")
+
+# Cost given to pairs that must not be matched (farther than max_km).
+_FORBIDDEN = 1e12
+
+
+def idle_providers():
+    """Providers without an Accepted/Arrived job."""
+    busy = ServiceRequest.objects.filter(
+        status__in=ACTIVE_JOB_STATUSES, provider__isnull=False
+    ).values('provider_id')
+    return ServiceProvider.objects.exclude(id__in=busy)
+
+
+def cost_matrix(requests, providers, max_km=None, rating_weight_km=RATING_WEIGHT_KM):
+    """
+    Cost of sending each provider (columns) to each request (rows):
+    distance_km + rating penalty. Pairs beyond max_km cost _FORBIDDEN.
+    `requests` rows are dicts with lat/lng; `providers` rows add rating.
+    """
+    qlat = np.radians([r['lat'] for r in requests])
+    qlng = np.radians([r['lng'] for r in requests])
+    plat = np.radians([p['lat'] for p in providers])
+    plng = np.radians([p['lng'] for p in providers])
+    rating = np.array([p['rating'] or 0 for p in providers], dtype=np.float64)
+    distance = haversine_matrix(qlat, qlng, plat, plng, np.cos(plat))
+    cost = distance + rating_weight_km * (5.0 - rating)[None, :]
+    if max_km is not None:
+        cost[distance > max_km] = _FORBIDDEN
+    return cost
+
+
+def greedy_assignment(cost):
+    """(row, col) pairs taken cheapest-first, each row and column used once."""
+    n, m = cost.shape
+    order = np.argsort(cost, axis=None, kind='stable')
+    row_used = np.zeros(n, dtype=bool)
+    col_used = np.zeros(m, dtype=bool)
+    pairs = []
+    for flat in order:
+        i, j = divmod(int(flat), m)
+        if cost[i, j] >= _FORBIDDEN or len(pairs) == min(n, m):
+            break
+        if not row_used[i] and not col_used[j]:
+            row_used[i] = col_used[j] = True
+            pairs.append((i, j))
+    return pairs
+
+
+def optimal_assignment(cost):
+    """
+    Minimum-total-cost (row, col) pairs for a rectangular matrix (Hungarian
+    algorithm with potentials, O(n^2 m), inner loop vectorized over columns).
+    Pairs at _FORBIDDEN cost are dropped from the result.
+    """
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # p[j]: row (1-based) matched to column j, 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            used_cols = np.flatnonzero(used)
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = []
+    for j in range(1, m + 1):
+        if p[j]:
+            i, col = int(p[j]) - 1, j - 1
+            if cost[i, col] < _FORBIDDEN:
+                pairs.append((col, i) if transposed else (i, col))
+    return sorted(pairs)
+
+
+def plan_assignments(mode="greedy", max_km=None):
+    """
+    Compute (but do not apply) one dispatch cycle.
+    Returns ([(request_id, provider_id, cost), ...], stats dict).
+    """
+    solve = greedy_assignment if mode == "greedy" else optimal_assignment
+    requests_by_type = defaultdict(list)
+    for row in ServiceRequest.objects.filter(status="Pending").order_by('id').values(
+        'id', 'lat', 'lng', 'service__name'
+    ):
+        requests_by_type[normalize_type(row['service__name'])].append(row)
+    providers_by_type = defaultdict(list)
+    for row in idle_providers().order_by('id').values('id', 'lat', 'lng', 'rating', 'type'):
+        providers_by_type[normalize_type(row['type'])].append(row)
+
+    plan = []
+    for type_, requests in requests_by_type.items():
+        providers = providers_by_type.get(type_)
+        if not providers:
+            continue
+        cost = cost_matrix(requests, providers, max_km=max_km)
+        for i, j in solve(cost):
+            plan.append((requests[i]['id'], providers[j]['id'], float(cost[i, j])))
+    stats = {
+        "pending": sum(len(r) for r in requests_by_type.values()),
+        "idle_providers": sum(len(p) for p in providers_by_type.values()),
+    }
+    return plan, stats
+
+
+def apply_assignments(plan):
+    """
+    Write a plan with one bulk_update. Requests that stopped being Pending and
+    providers that became busy since the plan was computed are skipped.
+    Returns the number of requests assigned.
+    """
+    if not plan:
+        return 0
+    try:
+        return _apply(plan)
+    except IntegrityError:
+        # A provider accepted a job on their own while we wrote (one_active_job_per_provider);
+        # the batch rolled back and the next cycle plans again.
+        return 0
+
+
+def _apply(plan):
+    with transaction.atomic():
+        pending = ServiceRequest.objects.select_related('service').filter(
+            id__in=[r for r, _, _ in plan], status="Pending"
+        ).in_bulk()
+        idle = set(idle_providers().filter(id__in=[p for _, p, _ in plan]).values_list('id', flat=True))
+        now = timezone.now()
+        changed = []
+        for request_id, provider_id, _ in plan:
+            req = pending.get(request_id)
+            if req is None or provider_id not in idle:
+                continue
+            req.provider_id = provider_id
+            req.status = "Accepted"
+            req.accepted_at = now
+            req.updated = now  # bulk_update skips auto_now
+            changed.append(req)
+        ServiceRequest.objects.bulk_update(changed, ['provider', 'status', 'accepted_at', 'updated'], batch_size=500)
+        # bulk_update sends no post_save signals
+        realtime.publish_requests("updated", [(req, req.service.name) for req in changed])
+    return len(changed)
+
+
+def run_cycle(mode="greedy", max_km=None, dry_run=False):
+    """Plan and apply one dispatch cycle; returns counts and per-phase timings (ms)."""
+    if mode not in DISPATCH_MODES:
+        raise ValueError(f"Unknown dispatch mode {mode!r}; use one of {DISPATCH_MODES}.")
+    start = time.perf_counter()
+    plan, stats = plan_assignments(mode, max_km=max_km)
+    planned = time.perf_counter()
+    assigned = 0 if dry_run else apply_assignments(plan)
+    done = time.perf_counter()
+    stats.update({
+        "mode": mode,
+        "planned": len(plan),
+        "assigned": assigned,
+        "total_cost": round(sum(c for _, _, c in plan), 3),
+        "plan_ms": (planned - start) * 1000,
+        "apply_ms": (done - planned) * 1000,
+        "cycle_ms": (done - start) * 1000,
+    })
+    return stats
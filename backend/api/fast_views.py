@@ -0,0 +1,162 @@
+"""
+Bulk read paths for the ServiceRequest list endpoints.
+
+The list views used to walk model instances and lazily load service, user,
+provider and profile for every row (~4 queries per row), and then run every
+field of every row through nested ModelSerializers. Here each list is a
+single joined `values_list()` query, and each row becomes its payload
+through a Projection compiled once at import: one zip() over an itemgetter
+for the plain columns, then the nested objects and datetimes. The payloads
+(key order included) are exactly what the serializers return, so with
+renderers.FastJSONRenderer the response bytes are unchanged; the query
+count stays constant no matter how many rows there are.
+"""
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+SERVICE_FIELDS = ('id', 'name', 'description', 'price')
+PROVIDER_FIELDS = ('id', 'name', 'email', 'type', 'lat', 'lng', 'rating')
+# ServiceProviderSerializer: model fields except grid_cell/updated, in model order
+PROVIDER_DETAIL_FIELDS = PROVIDER_FIELDS + ('created', 'phone')
+CONFIRMATION_FIELDS = ('arrived_by_provider', 'arrived_by_user', 'completed_by_provider', 'completed_by_user')
+
+# Same formatting as the DateTimeFields on ServiceRequestUserSerializer
+_datetime = serializers.DateTimeField().to_representation
+
+
+def _datetime_formatter():
+    """
+    _datetime with the output format and current timezone looked up once for
+    a whole list instead of per value (those lookups were most of the time a
+    list spent in Python).
+    """
+    if not settings.USE_TZ or (api_settings.DATETIME_FORMAT or '').lower() != ISO_8601:
+        return _datetime
+    tz = timezone.get_current_timezone()
+
+    def to_representation(value):
+        if not value or value.utcoffset() is None:
+            return _datetime(value)
+        text = value.astimezone(tz).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return to_representation
+
+
+class DateTime:
+    """A datetime column, formatted like DRF's DateTimeField."""
+
+    def __init__(self, column):
+        self.column = column
+
+
+class Related:
+    """A nested object: `fields` of the `prefix` relation, or None when the foreign key is NULL."""
+
+    def __init__(self, prefix, fields, datetimes=()):
+        self.prefix = prefix
+        self.fields = fields
+        self.datetimes = datetimes
+
+    def compile(self, position):
+        fields, datetimes = self.fields, self.datetimes
+        pick = itemgetter(*(position(f"{self.prefix}__{f}") for f in fields))
+        key = position(f"{self.prefix}__id")
+
+        def build(row, to_datetime):
+            if row[key] is None:
+                return None
+            obj = dict(zip(fields, pick(row)))
+            for f in datetimes:
+                obj[f] = to_datetime(obj[f])
+            return obj
+        return build
+
+
+class Projection:
+    """
+    Payload builder for a fixed layout: [(key, source)] in payload order, a
+    source being a column, DateTime or Related. Call it with a queryset to
+    get the list of payload dicts (await acall() in async views).
+    """
+
+    def __init__(self, layout):
+        columns = []
+
+        def position(column):
+            if column not in columns:
+                columns.append(column)
+            return columns.index(column)
+
+        picks, self._datetimes, self._related = [], [], []
+        for key, source in layout:
+            if isinstance(source, Related):
+                picks.append(position(f"{source.prefix}__id"))  # placeholder, keeps the key's place
+                self._related.append((key, source.compile(position)))
+            elif isinstance(source, DateTime):
+                picks.append(position(source.column))
+                self._datetimes.append((key, position(source.column)))
+            else:
+                picks.append(position(source))
+        self.keys = tuple(key for key, _ in layout)
+        self.columns = tuple(columns)
+        self._pick = itemgetter(*picks)
+
+    def __call__(self, queryset):
+        return self._build(queryset.values_list(*self.columns))
+
+    async def acall(self, queryset):
+        """__call__ for async views: the query goes through Django's async ORM."""
+        return self._build([row async for row in queryset.values_list(*self.columns)])
+
+    def _build(self, rows):
+        keys, pick, datetimes, related = self.keys, self._pick, self._datetimes, self._related
+        to_datetime = _datetime_formatter()
+        data = []
+        for row in rows:
+            item = dict(zip(keys, pick(row)))
+            for key, i in datetimes:
+                item[key] = to_datetime(row[i])
+            for key, build in related:
+                item[key] = build(row, to_datetime)
+            data.append(item)
+        return data
+
+
+SERVICE = Related('service', SERVICE_FIELDS)
+
+# Payload of GET /api/requests
+request_list_rows = Projection([
+    ("id", 'id'),
+    ("service", SERVICE),
+    ("user", 'user__username'),
+    ("user_phone", 'user__userprofile__phone'),
+    ("provider", Related('provider', PROVIDER_FIELDS)),
+    ("status", 'status'),
+    ("lat", 'lat'),
+    ("lng", 'lng'),
+    ("estimated_cost", 'estimated_cost'),
+])
+
+USER_REQUEST_LAYOUT = [
+    ("id", 'id'),
+    ("service", SERVICE),
+    ("user", 'user__username'),
+    ("provider", Related('provider', PROVIDER_DETAIL_FIELDS, datetimes=('created',))),
+    ("status", 'status'),
+    ("notes", 'notes'),
+    ("lat", 'lat'),
+    ("lng", 'lng'),
+    ("estimated_cost", 'estimated_cost'),
+    ("created", DateTime('created')),
+    ("updated", DateTime('updated')),
+] + [(f, f) for f in CONFIRMATION_FIELDS]
+
+# Same output as ServiceRequestUserSerializer(queryset, many=True).data
+user_request_rows = Projection(USER_REQUEST_LAYOUT)
+
+# Same output as ProviderJobSerializer(queryset, many=True).data
+provider_job_rows = Projection(USER_REQUEST_LAYOUT + [("user_phone", 'user__userprofile__phone')])
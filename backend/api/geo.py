@@ -0,0 +1,137 @@
+"""
+Grid index for nearest-provider lookups.
+
+Every ServiceProvider stores the id of the fixed-size lat/lng grid cell it
+sits in (`grid_cell`, indexed). Cells are numbered row-major, so one grid
+row is a contiguous range of ids and a square block of cells is a handful
+of indexed range scans. A k-nearest query searches a growing block of cells
+around the point until the k-th best distance is closer than anything
+outside the block can be, so it reads only the providers nearby instead of
+the whole table.
+"""
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Changing the cell size requires recomputing grid_cell for every provider.
+GRID_CELL_DEGREES = 0.1
+GRID_ROWS = int(round(180 / GRID_CELL_DEGREES))
+GRID_COLS = int(round(360 / GRID_CELL_DEGREES))
+
+# Past this block radius (in cells, about 700 km) the search falls back to a plain scan.
+MAX_SEARCH_RADIUS = 64
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def grid_position(lat, lng):
+    """(row, col) of the grid cell containing a point."""
+    row = int((lat + 90) // GRID_CELL_DEGREES)
+    col = int((lng + 180) // GRID_CELL_DEGREES)
+    return min(max(row, 0), GRID_ROWS - 1), min(max(col, 0), GRID_COLS - 1)
+
+
+def grid_cell(lat, lng):
+    """Cell id stored in ServiceProvider.grid_cell."""
+    row, col = grid_position(lat, lng)
+    return row * GRID_COLS + col
+
+
+def _column_ranges(col, radius):
+    """
+    Column spans (inclusive) within `radius` cells of `col`, wrapping around
+    at the antimeridian.
+    """
+    if 2 * radius + 1 >= GRID_COLS:
+        return [(0, GRID_COLS - 1)]
+    c0, c1 = col - radius, col + radius
+    if c0 < 0:
+        return [(0, c1), (c0 + GRID_COLS, GRID_COLS - 1)]
+    if c1 >= GRID_COLS:
+        return [(c0, GRID_COLS - 1), (0, c1 - GRID_COLS)]
+    return [(c0, c1)]
+
+
+def block_rows(row, radius):
+    """Grid rows (first, last) within `radius` cells of `row`, clamped at the poles."""
+    return max(row - radius, 0), min(row + radius, GRID_ROWS - 1)
+
+
+def block_covers_grid(row, radius):
+    """Whether the block of `radius` cells around `row` is the whole grid."""
+    return block_rows(row, radius) == (0, GRID_ROWS - 1) and 2 * radius + 1 >= GRID_COLS
+
+
+def block_filter(row, col, radius):
+    """
+    Q matching the square block of cells within `radius` cells of (row, col):
+    one grid_cell range per grid row and column span. Columns wrap around at
+    the antimeridian; rows stop at the poles.
+    """
+    r0, r1 = block_rows(row, radius)
+    spans = _column_ranges(col, radius)
+    if spans == [(0, GRID_COLS - 1)]:
+        # Full-width rows are contiguous ids: one range for the whole band.
+        return Q(grid_cell__range=(r0 * GRID_COLS, r1 * GRID_COLS + GRID_COLS - 1))
+    condition = Q()
+    for r in range(r0, r1 + 1):
+        for c0, c1 in spans:
+            condition |= Q(grid_cell__range=(r * GRID_COLS + c0, r * GRID_COLS + c1))
+    return condition
+
+
+def _outside_distance_km(lat, radius):
+    """
+    Lower bound on the distance from a point in the centre cell to any point
+    outside the block of `radius` cells around it.
+    """
+    if radius == 0:
+        return 0.0
+    # Longitude degrees shrink towards the poles: use the widest latitude the block can reach.
+    widest = min(abs(lat) + (radius + 1) * GRID_CELL_DEGREES, 90.0)
+    return radius * GRID_CELL_DEGREES * KM_PER_DEGREE * math.cos(math.radians(widest))
+
+
+def nearest(queryset, lat, lng, k):
+    """
+    The k rows of `queryset` (which must have lat, lng and grid_cell) closest
+    to (lat, lng), as (distance_km, row) pairs sorted by distance.
+
+    Falls back to one plain scan once the block passes MAX_SEARCH_RADIUS, or
+    as soon as widening the block finds no new rows after some were found:
+    few matches (a sparse type, k larger than the matches) would otherwise
+    cost a query per doubling before the scan.
+    """
+    row, col = grid_position(lat, lng)
+    radius = 0
+    seen = 0
+    while True:
+        if radius > MAX_SEARCH_RADIUS:
+            return _rank(queryset, lat, lng, k)
+        candidates = list(queryset.filter(block_filter(row, col, radius)))
+        ranked = _rank(candidates, lat, lng, k)
+        if block_covers_grid(row, radius):
+            return ranked
+        if len(ranked) == k and ranked[-1][0] <= _outside_distance_km(lat, radius):
+            return ranked
+        if seen and len(candidates) == seen:
+            return _rank(queryset, lat, lng, k)
+        seen = len(candidates)
+        radius = radius * 2 if radius else 1
+
+
+def _rank(rows, lat, lng, k):
+    return sorted(
+        ((haversine_km(lat, lng, p.lat, p.lng), p) for p in rows),
+        key=lambda pair: pair[0],
+    )[:k]
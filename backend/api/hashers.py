@@ -0,0 +1,21 @@
+"""
+Password hashing with a per-environment work factor.
+
+TunablePBKDF2PasswordHasher is Django's pbkdf2_sha256 with its iteration
+count read from PASSWORD_HASH_ITERATIONS (Django's default when unset, which
+is what production should use). The iteration count is stored in every hash,
+so hashes made with any count keep verifying; after a change, a user's hash
+is upgraded to the configured count at their next successful login (one
+UPDATE, and their older tokens are revoked, see authentication.py).
+
+Lower counts make logins cheap for local load tests and CI; every login
+spends almost all of its time here (~0.5 s per core at Django 5.2's 1,000,000).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
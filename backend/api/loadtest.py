@@ -0,0 +1,353 @@
+"""
+HTTP load generator for the `loadtest` management command.
+
+Virtual clients (threads) replay the traffic the frontend produces:
+  poll_requests    provider dashboard: GET /api/requests
+  poll_my_active   customer home page: GET /api/myrequests?status=active
+  create_request   customer books a service: POST /api/requests
+  job_flow         provider accepts a request (PUT /api/requests/<id>), then both
+                   sides confirm arrival and completion (4 PATCH calls)
+  login            POST /api/users/login
+
+Each client picks an action by weight (see DEFAULT_MIX), sleeps for its think
+time and repeats until the run ends. Like a browser, GETs revalidate with
+If-None-Match once an ETag has been seen (--no-etag turns this off).
+
+Latency is recorded per endpoint; report() gives requests/s and p50/p95/p99,
+and compare() lines a run up against a saved baseline.
+
+The accounts the clients log in with are created by prepare_accounts() in the
+database the server uses (all named loadtest-*; cleanup_accounts() removes them).
+"""
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .bench import SERVICE_TYPES, create_services, percentile
+from .geo import grid_cell
+from .models import ServiceProvider, Service, UserProfile
+
+PASSWORD = "loadtest"
+PREFIX = "loadtest"
+
+DEFAULT_MIX = {
+    "poll_requests": 40,
+    "poll_my_active": 35,
+    "create_request": 10,
+    "job_flow": 5,
+    "login": 10,
+}
+
+
+def customer_email(n):
+    return f"{PREFIX}-user-{n}@example.com"
+
+
+def provider_email(n):
+    return f"{PREFIX}-provider-{n}@example.com"
+
+
+# -------------------------------
+# Accounts
+# -------------------------------
+
+@transaction.atomic
+def prepare_accounts(customers, providers):
+    """Create the missing loadtest customers and providers (and services if there are none)."""
+    if not Service.objects.exists():
+        create_services()
+    types = list(Service.objects.values_list('name', flat=True)) or SERVICE_TYPES
+    password = make_password(PASSWORD)  # hash once; every account shares it
+
+    wanted = [(customer_email(n), "user") for n in range(customers)]
+    wanted += [(provider_email(n), "provider") for n in range(providers)]
+    existing = set(User.objects.filter(email__in=[e for e, _ in wanted]).values_list('email', flat=True))
+    new = [(email, role) for email, role in wanted if email not in existing]
+    users = User.objects.bulk_create(
+        [User(username=email.split("@")[0], email=email, password=password) for email, _ in new]
+    )
+    UserProfile.objects.bulk_create(
+        [UserProfile(user=user, role=role, phone="0000000000") for user, (_, role) in zip(users, new)]
+    )
+
+    rng = random.Random(0)
+    have = set(ServiceProvider.objects.filter(email__startswith=f"{PREFIX}-").values_list('email', flat=True))
+    rows = []
+    for n in range(providers):
+        if provider_email(n) in have:
+            continue
+        lat, lng = 15.49 + rng.uniform(-0.3, 0.3), 73.82 + rng.uniform(-0.3, 0.3)
+        rows.append(ServiceProvider(
+            name=f"Loadtest Provider {n}", email=provider_email(n), type=types[n % len(types)],
+            lat=lat, lng=lng, grid_cell=grid_cell(lat, lng), rating=4.0, phone="0000000000",
+        ))
+    ServiceProvider.objects.bulk_create(rows)
+    return len(users), len(rows)
+
+
+@transaction.atomic
+def cleanup_accounts():
+    """Delete every loadtest account, provider and (by cascade) request."""
+    users = User.objects.filter(username__startswith=f"{PREFIX}-").delete()[1].get('auth.User', 0)
+    providers = ServiceProvider.objects.filter(email__startswith=f"{PREFIX}-").delete()[1].get(
+        'api.ServiceProvider', 0)
+    return users, providers
+
+
+# -------------------------------
+# HTTP
+# -------------------------------
+
+class Client:
+    """One keep-alive connection, like one browser tab."""
+
+    def __init__(self, base_url, recorder, use_etags=True):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.conn = None
+        self.recorder = recorder
+        self.use_etags = use_etags
+        self.etags = {}
+        self.token = None
+        self.user_id = None
+
+    def request(self, label, method, path, body=None):
+        """Send one request, record it under `label`; returns (status, parsed JSON or None)."""
+        headers = {"Accept": "application/json"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(body)
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if method == "GET" and self.use_etags and path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = self.connection_class(self.host, self.port, timeout=30)
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            payload = response.read()
+            status = response.status
+            if response.getheader("Connection", "").lower() == "close":
+                self.close()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            self.recorder.record(label, (time.perf_counter() - start) * 1000, None)
+            return None, None
+        self.recorder.record(label, (time.perf_counter() - start) * 1000, status)
+
+        if method == "GET" and response.getheader("ETag"):
+            self.etags[path] = response.getheader("ETag")
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Recorder:
+    """Thread-safe latency samples (ms) and status counts per endpoint label."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, label, ms, status):
+        with self._lock:
+            self.samples[label].append(ms)
+            if status is None or not (200 <= status < 400):
+                self.errors[label] += 1
+
+
+# -------------------------------
+# Traffic
+# -------------------------------
+
+class LoadTest:
+    def __init__(self, base_url, clients=20, duration=30.0, customers=50, providers=20,
+                 mix=None, think_ms=(200, 1000), use_etags=True, seed=1):
+        self.base_url = base_url.rstrip("/")
+        self.clients = clients
+        self.duration = duration
+        self.customers = customers
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.think_ms = think_ms
+        self.use_etags = use_etags
+        self.seed = seed
+        self.recorder = Recorder()
+        # A provider holds one active job at a time, so each provider account is
+        # lent to one job_flow at a time
+        self.idle_providers = queue.Queue()
+        for n in range(providers):
+            self.idle_providers.put(n)
+        self.pending = queue.Queue()  # (request id, owner's token) created during the run
+        self.provider_tokens = {}
+        self.services = []
+        self.provider_ids = []
+
+    def run(self):
+        """Run every client for `duration` seconds; returns the report rows."""
+        setup = Client(self.base_url, Recorder(), use_etags=False)
+        _, services = setup.request("setup", "GET", "/api/services")
+        _, providers = setup.request("setup", "GET", "/api/providers")
+        setup.close()
+        if not services or providers is None:
+            raise RuntimeError(f"{self.base_url} did not answer /api/services and /api/providers")
+        self.services = [s["id"] for s in services]
+        self.provider_ids = [p["id"] for p in providers if p["email"].startswith(f"{PREFIX}-")]
+        if not self.provider_ids:
+            raise RuntimeError("No loadtest providers found; run the command with --prepare first.")
+
+        started = time.perf_counter()
+        self.deadline = started + self.duration
+        threads = [threading.Thread(target=self._client, args=(n,), daemon=True) for n in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return report(self.recorder, time.perf_counter() - started)
+
+    def _client(self, n):
+        rng = random.Random(self.seed * 1000 + n)
+        client = Client(self.base_url, self.recorder, self.use_etags)
+        actions, weights = zip(*self.mix.items())
+        try:
+            self._login(client, customer_email(n % self.customers))
+            while time.perf_counter() < self.deadline:
+                action = rng.choices(actions, weights)[0]
+                getattr(self, action)(client, rng)
+                time.sleep(rng.uniform(*self.think_ms) / 1000)
+        finally:
+            client.close()
+
+    def _login(self, client, email):
+        status, body = client.request("POST /api/users/login", "POST", "/api/users/login",
+                                      {"email": email, "password": PASSWORD})
+        if status == 200:
+            client.token, client.user_id = body["access"], body["user_id"]
+        return status == 200
+
+    # --- actions ---
+
+    def poll_requests(self, client, rng):
+        client.request("GET /api/requests", "GET", "/api/requests")
+
+    def poll_my_active(self, client, rng):
+        client.request("GET /api/myrequests?status=active", "GET", "/api/myrequests?status=active")
+
+    def login(self, client, rng):
+        self._login(client, customer_email(rng.randrange(self.customers)))
+
+    def create_request(self, client, rng):
+        if client.user_id is None:
+            return
+        status, body = client.request("POST /api/requests", "POST", "/api/requests", {
+            "user": client.user_id,
+            "service": rng.choice(self.services),
+            "provider": rng.choice(self.provider_ids),
+            "lat": 15.49 + rng.uniform(-0.3, 0.3),
+            "lng": 73.82 + rng.uniform(-0.3, 0.3),
+        })
+        if status == 201:
+            self.pending.put((body["id"], client.token))
+
+    def job_flow(self, client, rng):
+        try:
+            provider = self.idle_providers.get_nowait()
+        except queue.Empty:
+            return self.poll_requests(client, rng)
+        try:
+            request_id, customer_token = self.pending.get_nowait()
+        except queue.Empty:
+            self.idle_providers.put(provider)
+            return self.create_request(client, rng)
+
+        provider_client = Client(self.base_url, self.recorder, use_etags=False)
+        provider_client.token = self.provider_tokens.get(provider)
+        customer = Client(self.base_url, self.recorder, use_etags=False)
+        customer.token = customer_token
+        try:
+            if provider_client.token is None:
+                if not self._login(provider_client, provider_email(provider)):
+                    return
+                self.provider_tokens[provider] = provider_client.token
+            status, _ = provider_client.request(
+                "PUT /api/requests/<id> (accept)", "PUT", f"/api/requests/{request_id}",
+                {"status": "Accepted", "provider": provider_email(provider)},
+            )
+            if status != 200:
+                return
+            for step in ("arrived", "completed"):
+                label = f"PATCH /api/requests/<id>/confirm-{step}"
+                path = f"/api/requests/{request_id}/confirm-{step}"
+                provider_client.request(label, "PATCH", path, {"role": "provider"})
+                customer.request(label, "PATCH", path, {"role": "user"})
+        finally:
+            provider_client.close()
+            customer.close()
+            self.idle_providers.put(provider)
+
+
+# -------------------------------
+# Reporting
+# -------------------------------
+
+REPORT_HEADERS = ["endpoint", "requests", "req/s", "p50 ms", "p95 ms", "p99 ms", "errors"]
+
+
+def report(recorder, elapsed):
+    """One row per endpoint, plus a total: [label, count, rps, p50, p95, p99, errors]."""
+    rows = []
+    everything = []
+    for label in sorted(recorder.samples):
+        samples = recorder.samples[label]
+        everything += samples
+        rows.append(_row(label, samples, elapsed, recorder.errors[label]))
+    rows.append(_row("TOTAL", everything, elapsed, sum(recorder.errors.values())))
+    return rows
+
+
+def _row(label, samples, elapsed, errors):
+    return [label, len(samples), len(samples) / elapsed if elapsed else 0.0,
+            percentile(samples, 50), percentile(samples, 95), percentile(samples, 99), errors]
+
+
+def compare(rows, baseline):
+    """
+    Rows with req/s and p95 / p99 changes against a baseline report
+    (same shape, e.g. loaded from a previous --save file).
+    """
+    before = {row[0]: row for row in baseline}
+    compared = []
+    for row in rows:
+        old = before.get(row[0])
+        compared.append([row[0], row[2], _change(row[2], old and old[2]),
+                         row[4], _change(row[4], old and old[4]),
+                         row[5], _change(row[5], old and old[5])])
+    return compared
+
+
+COMPARE_HEADERS = ["endpoint", "req/s", "vs base", "p95 ms", "vs base", "p99 ms", "vs base"]
+
+
+def _change(new, old):
+    if not old:
+        return "-"
+    return f"{(new - old) / old * 100:+.0f}%"
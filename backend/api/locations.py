@@ -0,0 +1,252 @@
+"""
+Live provider positions: high-frequency GPS ingest with coalesced writes.
+
+Provider devices POST batches of samples to /api/providers/location every few
+seconds. A sample only updates this process's LocationBuffer, which keeps the
+latest fix per provider; a flusher thread writes the buffered positions to
+ServiceProvider every LOCATION_FLUSH_INTERVAL seconds in one transaction (one
+prepared UPDATE run with executemany), so the database takes one write per
+provider per interval however many pings arrive. queryset.bulk_update is not
+used: its CASE WHEN per row took seconds for a few thousand providers.
+
+Consequences:
+  - a stored position is at most one interval (plus the flush) behind the
+    device; a position still buffered when the process dies is lost, and the
+    device's next ping replaces it
+  - samples older than the provider's latest fix are dropped as stale (out of
+    order delivery, retried uploads); samples stamped more than
+    LOCATION_MAX_CLOCK_SKEW seconds in the future are rejected, as one would
+    make every later sample look stale
+  - the stored position carries its sample time (`located`) and the UPDATE
+    only overwrites an older one, so flushes from several workers cannot
+    write a provider's positions out of order
+  - the flush skips ServiceProvider.save() and post_save, so it sets
+    grid_cell itself and moves the providers in the ranking arrays (see
+    signals.py for the single-row path)
+  - `updated` (the conditional GET version) and the providers catalog move on
+    only every LOCATION_PUBLISH_INTERVAL seconds, not on every flush: the
+    cached /api/providers body, and the request payloads embedding provider
+    positions, lag the live positions by at most that long instead of being
+    rebuilt every couple of seconds while any provider is pinging
+
+Every fresh sample also goes to the trajectory recorder (trajectory.py),
+which this flusher thread writes out as well. With the flusher off
+(LOCATION_FLUSH_INTERVAL=0) ingest writes the recorder's due chunks itself,
+so its buffer cannot grow without bound.
+
+stats() reports the ingest rate and the flush lag: the age of the oldest
+buffered fix now, and how long the last flush's fixes waited.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import catalog, ranking, trajectory
+from .geo import grid_cell
+from .models import ServiceProvider
+
+logger = logging.getLogger(__name__)
+
+RATE_WINDOW = 60  # seconds of per-second counters behind the ingest rate
+PUBLISH_BATCH = 500  # provider ids per `updated` UPDATE (SQLite caps bound parameters)
+
+
+class InvalidSamples(Exception):
+    pass
+
+
+def parse_samples(data, max_samples):
+    """
+    [(lat, lng, ts)] from {"samples": [{"lat", "lng", "ts"?}, ...]}; ts is
+    Unix seconds and defaults to now. Raises InvalidSamples.
+    """
+    samples = data.get("samples") if isinstance(data, dict) else data
+    if not isinstance(samples, list) or not samples:
+        raise InvalidSamples('Send {"samples": [{"lat": ..., "lng": ..., "ts": ...}, ...]}.')
+    if len(samples) > max_samples:
+        raise InvalidSamples(f"At most {max_samples} samples per call.")
+    now = time.time()
+    latest_allowed = now + getattr(settings, 'LOCATION_MAX_CLOCK_SKEW', 30)
+    parsed = []
+    for sample in samples:
+        try:
+            lat, lng = float(sample["lat"]), float(sample["lng"])
+            ts = float(sample.get("ts", now))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise InvalidSamples("Each sample needs numeric lat and lng (and ts, if given).")
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise InvalidSamples("lat must be within [-90, 90] and lng within [-180, 180].")
+        if ts > latest_allowed:
+            raise InvalidSamples("ts is in the future; check the device clock.")
+        parsed.append((lat, lng, ts))
+    return parsed
+
+
+class LocationBuffer:
+    """Latest fix per provider, flushed to the database in bulk."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}   # provider id -> (lat, lng, ts, monotonic time first buffered)
+        self._latest = {}    # provider id -> ts of the newest fix accepted
+        self._unpublished = set()  # providers written since `updated` last moved on
+        self._last_publish = float("-inf")
+        self._rate = deque()  # [second, samples] for the last RATE_WINDOW seconds
+        self._thread = None
+        self._counters = {"samples": 0, "stale": 0, "flushes": 0, "rows_written": 0}
+        self._last_flush = {"at": None, "duration_ms": None, "max_lag_ms": None, "rows": 0}
+
+    def ingest(self, provider_id, samples):
+        """Buffer the newest of `samples` [(lat, lng, ts)]; returns how many were not stale."""
+        second = int(time.monotonic())
+        with self._lock:
+            latest = self._latest.get(provider_id, float("-inf"))
+            fresh = [sample for sample in samples if sample[2] > latest]
+            self._counters["samples"] += len(samples)
+            self._counters["stale"] += len(samples) - len(fresh)
+            if self._rate and self._rate[-1][0] == second:
+                self._rate[-1][1] += len(samples)
+            else:
+                self._rate.append([second, len(samples)])
+            while self._rate[0][0] <= second - RATE_WINDOW:
+                self._rate.popleft()
+            if fresh:
+                lat, lng, ts = max(fresh, key=lambda sample: sample[2])
+                buffered_at = self._pending.get(provider_id, (None, None, None, time.monotonic()))[3]
+                self._pending[provider_id] = (lat, lng, ts, buffered_at)
+                self._latest[provider_id] = ts
+        if fresh:
+            trajectory.recorder.add(provider_id, fresh)
+        if _interval() <= 0:
+            if trajectory.recorder.due():
+                trajectory.recorder.flush()
+        else:
+            self._start()
+        return len(fresh)
+
+    def flush(self):
+        """
+        Write the buffered positions in one transaction; returns the number of
+        providers. Every LOCATION_PUBLISH_INTERVAL seconds it also sets
+        `updated` on the providers written since and invalidates the catalog.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            publish = (
+                bool(pending or self._unpublished)
+                and time.monotonic() - self._last_publish >= _publish_interval()
+            )
+            if not pending and not publish:
+                return 0
+            started = time.monotonic()
+            now = timezone.now()
+            rows = []
+            for provider_id, (lat, lng, ts, _) in pending.items():
+                located = connection.ops.adapt_datetimefield_value(datetime.fromtimestamp(ts, dt_timezone.utc))
+                rows.append((lat, lng, grid_cell(lat, lng), located, provider_id, located))
+            moved = sorted(self._unpublished.union(pending)) if publish else []
+            try:
+                with transaction.atomic():
+                    if rows:
+                        with connection.cursor() as cursor:
+                            cursor.executemany(_update_sql(), rows)
+                    for start in range(0, len(moved), PUBLISH_BATCH):
+                        ServiceProvider.objects.filter(id__in=moved[start:start + PUBLISH_BATCH]).update(updated=now)
+            except Exception:
+                with self._lock:  # keep them for the next flush unless a newer fix arrived meanwhile
+                    for provider_id, entry in pending.items():
+                        self._pending.setdefault(provider_id, entry)
+                raise
+            if publish:
+                self._unpublished.clear()
+                self._last_publish = time.monotonic()
+                catalog.invalidate("providers")
+            else:
+                self._unpublished.update(pending)
+            if not pending:
+                return 0
+            ranking.providers_moved([(provider_id, lat, lng) for provider_id, (lat, lng, _, _) in pending.items()])
+
+            finished = time.monotonic()
+            with self._lock:
+                self._counters["flushes"] += 1
+                self._counters["rows_written"] += len(rows)
+                self._last_flush = {
+                    "at": now.isoformat(),
+                    "duration_ms": round((finished - started) * 1000, 2),
+                    "max_lag_ms": round((finished - min(entry[3] for entry in pending.values())) * 1000, 2),
+                    "rows": len(rows),
+                }
+            return len(rows)
+
+    def stats(self):
+        second = int(time.monotonic())
+        with self._lock:
+            recent = sum(count for at, count in self._rate if at > second - RATE_WINDOW)
+            oldest = min((entry[3] for entry in self._pending.values()), default=None)
+            return dict(
+                self._counters,
+                samples_per_second=round(recent / RATE_WINDOW, 2),
+                pending_providers=len(self._pending),
+                pending_lag_ms=round((time.monotonic() - oldest) * 1000, 2) if oldest is not None else 0.0,
+                last_flush=dict(self._last_flush),
+                flush_interval=_interval(),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._latest.clear()
+            self._unpublished.clear()
+            self._last_publish = float("-inf")
+            self._rate.clear()
+            for counter in self._counters:
+                self._counters[counter] = 0
+            self._last_flush = {"at": None, "duration_ms": None, "max_lag_ms": None, "rows": 0}
+
+    # -- flusher thread -----------------------------------------------------
+
+    def _start(self):
+        """Start this process's flusher thread (once)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="location-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(_interval() or 1)
+            try:
+                self.flush()
+                trajectory.recorder.flush()  # writes only chunks older than TRAJECTORY_CHUNK_SECONDS
+            except Exception:
+                logger.exception("location flush failed")
+            finally:
+                close_old_connections()
+
+
+def _update_sql():
+    """Position UPDATE for one provider; skipped when the stored fix is as new or newer."""
+    qn = connection.ops.quote_name
+    return "UPDATE {0} SET {1} = %s, {2} = %s, {3} = %s, {4} = %s WHERE {5} = %s AND ({4} IS NULL OR {4} < %s)".format(
+        qn(ServiceProvider._meta.db_table), *(qn(column) for column in ('lat', 'lng', 'grid_cell', 'located', 'id'))
+    )
+
+
+def _interval():
+    return getattr(settings, 'LOCATION_FLUSH_INTERVAL', 2.0)
+
+
+def _publish_interval():
+    return getattr(settings, 'LOCATION_PUBLISH_INTERVAL', 60.0)
+
+
+buffer = LocationBuffer()
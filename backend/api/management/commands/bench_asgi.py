@@ -0,0 +1,196 @@
+import asyncio
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import time
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.bench import (
+    scratch_database, percentile, write_table,
+    create_services, create_users, create_providers, create_requests,
+)
+from api.models import ServiceRequest
+
+# (label, argv after the executable, extra environment); {port} {workers} {threads} are filled in
+SERVERS = [
+    ("gunicorn gthread (WSGI)",
+     ["gunicorn", "backend.wsgi:application", "--bind", "127.0.0.1:{port}", "--workers", "{workers}",
+      "--worker-class", "gthread", "--threads", "{threads}"], {"ASGI_PROFILE": "0"}),
+    ("uvicorn, stock",
+     ["uvicorn", "backend.asgi:application", "--port", "{port}", "--workers", "{workers}", "--no-access-log"],
+     {"ASGI_PROFILE": "0"}),
+    ("uvicorn, ASGI profile",
+     ["uvicorn", "backend.asgi:application", "--port", "{port}", "--workers", "{workers}", "--no-access-log"],
+     {"ASGI_PROFILE": "1"}),
+]
+
+PATHS = {
+    "health": lambda request_id: "/api/health",
+    "services": lambda request_id: "/api/services",
+    "providers": lambda request_id: "/api/providers",
+    "myrequests": lambda request_id: "/api/myrequests",
+    "request": lambda request_id: f"/api/requests/{request_id}",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent-connection scaling of the hot read endpoints: gunicorn (WSGI, gthread) against "
+        "uvicorn (ASGI), stock and with the ASGI profile (async views, event-loop middleware). Starts "
+        "each server on a throwaway test database and holds N keep-alive connections open against it "
+        "(req/s, p50/p99 per N)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', default="10,100,400", help="comma-separated connection counts")
+        parser.add_argument('--seconds', type=float, default=10.0, help="duration of each run")
+        parser.add_argument('--workers', type=int, default=1, help="server worker processes")
+        parser.add_argument('--threads', type=int, default=8, help="threads per gunicorn worker")
+        parser.add_argument('--paths', default="health,services,myrequests,request",
+                            help=f"endpoints each connection cycles through: {', '.join(PATHS)}")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_asgi shares its scratch database with the servers as a SQLite file.")
+        missing = [argv[0] for _, argv, _ in SERVERS if shutil.which(argv[0]) is None]
+        if missing:
+            raise CommandError(f"Not installed: {', '.join(sorted(set(missing)))} (see requirements.txt).")
+        paths = options['paths'].split(',')
+        if not paths or set(paths) - set(PATHS):
+            raise CommandError(f"--paths are {', '.join(PATHS)}.")
+        with scratch_database():
+            self._run(options, [int(n) for n in options['connections'].split(',')], paths)
+
+    def _run(self, options, connection_counts, paths):
+        rng = random.Random(5)
+        services = create_services()
+        users = create_users(200)
+        providers = create_providers(100, rng=rng)
+        create_requests(5000, services, users, providers, rng=rng)
+        owned = dict(ServiceRequest.objects.order_by('user_id', 'id').values_list('user_id', 'id'))
+        clients = []  # (Authorization header, a request id of that user), one per user
+        for user in users:
+            if user.id in owned:
+                clients.append((f"Bearer {AccessToken.for_user(user)}", owned[user.id]))
+
+        env = dict(os.environ, SQLITE_PATH=str(connection.settings_dict['NAME']), ALLOWED_HOSTS="127.0.0.1",
+                   QUERY_BUDGET="off", METRICS_DIR="", DJANGO_SETTINGS_MODULE="backend.settings")
+        rows = []
+        for label, argv, extra in SERVERS:
+            port = _free_port()
+            argv = [part.format(port=port, workers=options['workers'], threads=options['threads'])
+                    for part in argv]
+            server = subprocess.Popen(argv, cwd=settings.BASE_DIR, env=dict(env, **extra),
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                _wait_until_up(port, server)
+                requests = [_requests(paths, auth, request_id) for auth, request_id in clients]
+                asyncio.run(_flood(port, requests, 10, 1.0))  # warm up: caches, connections
+                for count in connection_counts:
+                    result = asyncio.run(_flood(port, requests, count, options['seconds']))
+                    samples = result["samples"]
+                    rows.append((label, count, len(samples) / options['seconds'],
+                                 percentile(samples, 50), percentile(samples, 99), result["errors"]))
+            finally:
+                server.send_signal(signal.SIGINT)
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+
+        write_table(self.stdout, ["server", "connections", "req/s", "p50 ms", "p99 ms", "errors"], rows)
+        self.stdout.write(
+            f"{options['workers']} worker(s), paths {','.join(paths)}, no ETags; the load generator "
+            f"shares the machine ({os.cpu_count()} CPUs) with the server."
+        )
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(port, server, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise CommandError(f"{' '.join(server.args)} exited with status {server.returncode}.")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"{' '.join(server.args)} did not answer within {timeout:.0f}s.")
+
+
+def _requests(paths, auth, request_id):
+    """Raw HTTP/1.1 keep-alive GETs for one client, in the order it sends them."""
+    return [
+        (f"GET {PATHS[name](request_id)} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: application/json\r\n"
+         f"Authorization: {auth}\r\n\r\n").encode()
+        for name in paths
+    ]
+
+
+async def _flood(port, requests, count, seconds):
+    """`count` connections sending their requests back to back for `seconds`; latencies in ms."""
+    result = {"samples": [], "errors": 0}
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(
+        _connection(port, requests[n % len(requests)], deadline, result) for n in range(count)
+    ))
+    return result
+
+
+async def _connection(port, requests, deadline, result):
+    reader = writer = None
+    sent = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(requests[sent % len(requests)])
+            sent += 1
+            status, keep_alive = await asyncio.wait_for(_response(reader), timeout=30)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            result["errors"] += 1
+            writer = _close(writer)
+            await asyncio.sleep(0.01)
+            continue
+        if not 200 <= status < 400:
+            result["errors"] += 1
+        result["samples"].append((time.perf_counter() - started) * 1000)
+        if not keep_alive:
+            writer = _close(writer)
+    _close(writer)
+
+
+async def _response(reader):
+    """(status, keep-alive) of one response, its body read and discarded."""
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split()[1])
+    headers = {}
+    for line in head[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+    if headers.get("transfer-encoding") == "chunked":
+        raise ValueError("chunked responses are not supported")
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("connection") != "close"
+
+
+def _close(writer):
+    if writer is not None:
+        writer.close()
+    return None
@@ -0,0 +1,147 @@
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections
+
+from api import transitions
+from api.bench import (
+    scratch_database, percentile, write_table,
+    create_services, create_users, create_providers, create_requests,
+)
+from api.fast_views import user_request_rows
+from api.models import ServiceRequest
+from backend.database import sqlite_database, sqlite_init_command
+
+# Connection settings compared on SQLite: the old hardcoded defaults (rollback
+# journal, a new connection per request) and the tuned profile from backend/database.py.
+SQLITE_PROFILES = {
+    "baseline": {
+        "OPTIONS": {"init_command": "PRAGMA journal_mode=DELETE;PRAGMA synchronous=FULL"},
+        "CONN_MAX_AGE": 0,
+    },
+    "tuned": None,  # filled from the environment at run time
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure mixed read/write throughput from several worker processes (like gunicorn "
+        "workers) sharing one database, for each database profile. Runs in a throwaway "
+        "test database; on Postgres only the configured profile is measured."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes (gunicorn --workers).')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run.')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of operations that write.')
+        parser.add_argument('--requests', type=int, default=20000, help='Service requests to seed.')
+
+    def handle(self, *args, **options):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise CommandError("bench_db forks worker processes (like gunicorn); it needs Linux or macOS.")
+        if not 0 <= options['write_ratio'] <= 1:
+            raise CommandError("--write-ratio must be between 0 and 1.")
+        with scratch_database():
+            self._run(options)
+
+    def _run(self, options):
+        rng = random.Random(11)
+        services = create_services()
+        users = create_users(200)
+        providers = create_providers(100, rng=rng)
+        create_requests(options['requests'], services, users, providers, rng=rng)
+        ids = {
+            "users": [u.id for u in users],
+            "services": [s.id for s in services],
+            "requests": list(ServiceRequest.objects.values_list('id', flat=True)),
+        }
+
+        if connection.vendor == "sqlite":
+            tuned = sqlite_database(settings.BASE_DIR)
+            # WAL even without SQLITE_PATH: the benchmark runs on its own throwaway file
+            tuned["OPTIONS"] = dict(tuned["OPTIONS"], init_command=sqlite_init_command())
+            profiles = dict(SQLITE_PROFILES, tuned={key: tuned[key] for key in ("OPTIONS", "CONN_MAX_AGE")})
+        else:
+            profiles = {"current": {}}
+
+        rows = []
+        for name, overrides in profiles.items():
+            connection.settings_dict.update(overrides)
+            connection.close()
+            connection.ensure_connection()  # applies the profile's PRAGMAs (journal mode is stored in the file)
+            connections.close_all()          # workers must not share the parent's connection
+            result = run_workers(options['workers'], options['seconds'], options['write_ratio'], ids)
+            reads, writes = result["reads"], result["writes"]
+            rows.append((
+                name, options['workers'],
+                (len(reads) + len(writes)) / options['seconds'],
+                len(reads) / options['seconds'], len(writes) / options['seconds'],
+                percentile(reads, 50), percentile(reads, 99),
+                percentile(writes, 50), percentile(writes, 99),
+                result["errors"],
+            ))
+        write_table(
+            self.stdout,
+            ["profile", "workers", "ops/s", "reads/s", "writes/s",
+             "read p50", "read p99", "write p50", "write p99", "errors"],
+            rows,
+        )
+
+
+def run_workers(workers, seconds, write_ratio, ids):
+    """Fork `workers` processes hammering the database; merge their latency samples (ms)."""
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    start_at = time.time() + 0.5  # let every worker fork before the clock starts
+    procs = [
+        ctx.Process(target=_worker, args=(n, start_at, seconds, write_ratio, ids, queue))
+        for n in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    merged = {"reads": [], "writes": [], "errors": 0}
+    for _ in procs:
+        result = queue.get()
+        merged["reads"] += result["reads"]
+        merged["writes"] += result["writes"]
+        merged["errors"] += result["errors"]
+    for proc in procs:
+        proc.join()
+    return merged
+
+
+def _worker(seed, start_at, seconds, write_ratio, ids, queue):
+    rng = random.Random(seed)
+    result = {"reads": [], "writes": [], "errors": 0}
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            write = rng.random() < write_ratio
+            began = time.perf_counter()
+            try:
+                if not write:
+                    # GET /api/myrequests
+                    user_request_rows(ServiceRequest.objects.filter(
+                        user_id=rng.choice(ids["users"])).order_by('-created', '-id')[:50])
+                elif rng.random() < 0.5:
+                    # POST /api/requests
+                    ServiceRequest.objects.create(
+                        service_id=rng.choice(ids["services"]), user_id=rng.choice(ids["users"]),
+                        lat=15.49 + rng.uniform(-0.5, 0.5), lng=73.82 + rng.uniform(-0.5, 0.5),
+                    )
+                else:
+                    # PATCH /api/requests/<id>/confirm-arrived
+                    transitions.confirm(rng.choice(ids["requests"]), "arrived", rng.choice(transitions.CONFIRM_ROLES))
+            except OperationalError:  # "database is locked" after the busy timeout
+                result["errors"] += 1
+                continue
+            finally:
+                close_old_connections()  # end of "request": honours CONN_MAX_AGE
+            result["writes" if write else "reads"].append((time.perf_counter() - began) * 1000)
+    finally:
+        connections.close_all()
+        queue.put(result)
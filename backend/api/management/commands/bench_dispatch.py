@@ -0,0 +1,42 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from api.bench import (
+    scratch_database, write_table,
+    create_services, create_users, create_providers, create_requests, CITY_CENTERS,
+)
+from api.dispatch import DISPATCH_MODES, run_cycle
+
+
+class Command(BaseCommand):
+    help = (
+        "Time dispatch cycles (plan only) for growing numbers of Pending requests, "
+        "to size the dispatch interval. Runs in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pending', default='100,500,1000', help='Comma-separated Pending request counts.')
+        parser.add_argument('--providers', type=int, default=5000)
+        parser.add_argument('--max-km', type=float, default=50.0)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self._run(sorted(int(n) for n in options['pending'].split(',')),
+                      options['providers'], options['max_km'])
+
+    def _run(self, pending_sizes, provider_count, max_km):
+        rng = random.Random(11)
+        services = create_services()
+        customers = create_users(100, prefix="customer")
+        providers = create_providers(provider_count, rng=rng, centers=CITY_CENTERS[:1], spread=1.0)
+        rows = []
+        created = 0
+        for size in pending_sizes:
+            create_requests(size - created, services, customers, providers, rng=rng, statuses=["Pending"])
+            created = size
+            for mode in DISPATCH_MODES:
+                stats = run_cycle(mode, max_km=max_km, dry_run=True)
+                rows.append((size, provider_count, mode, stats["planned"], stats["total_cost"],
+                             stats["plan_ms"]))
+        write_table(self.stdout, ["pending", "providers", "mode", "planned", "total cost", "cycle ms"], rows)
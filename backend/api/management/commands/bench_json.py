@@ -0,0 +1,68 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.bench import (
+    scratch_database, time_call, summarize, write_table,
+    create_services, create_users, create_providers, create_requests,
+)
+from api.fast_views import provider_job_rows, user_request_rows
+from api.models import ServiceRequest
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import ProviderJobSerializer, ServiceRequestUserSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark list payloads: nested ModelSerializers + JSONRenderer against the fast_views "
+        "projections + FastJSONRenderer (ms per 10k rows). Runs in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self._run(options['rows'], options['repeat'])
+
+    def _run(self, count, repeat):
+        rng = random.Random(42)
+        services = create_services()
+        users = create_users(200)
+        providers = create_providers(500, rng=rng)
+        create_requests(count, services, users, providers, rng=rng)
+        queryset = ServiceRequest.objects.select_related('service', 'provider', 'user__userprofile').order_by('-id')
+        per_10k = 10000 / count
+        payloads = [
+            ("myrequests", ServiceRequestUserSerializer, user_request_rows),
+            ("provider jobs", ProviderJobSerializer, provider_job_rows),
+        ]
+        strategies = [
+            ("serializer + JSONRenderer", "serializer", JSONRenderer()),
+            ("projection + JSONRenderer", "projection", JSONRenderer()),
+            ("projection + FastJSONRenderer", "projection", FastJSONRenderer()),
+        ]
+
+        rows = []
+        for name, serializer_class, project in payloads:
+            build = {
+                "serializer": lambda: serializer_class(queryset, many=True).data,
+                "projection": lambda: project(queryset),
+            }
+            expected = JSONRenderer().render(build["serializer"]())
+            baseline = None
+            for label, source, renderer in strategies:
+                if renderer.render(build[source]()) != expected:
+                    raise CommandError(f"{name}: {label} does not match the serializer output")
+                data = build[source]()
+                built = summarize(time_call(build[source], repeat))["p50"]
+                rendered = summarize(time_call(lambda: renderer.render(data), repeat))["p50"]
+                total = (built + rendered) * per_10k
+                baseline = baseline or total
+                rows.append((name, label, built * per_10k, rendered * per_10k, total, f"{baseline / total:.1f}x"))
+
+        write_table(self.stdout, ["payload", "strategy", "build ms", "render ms", "ms / 10k rows", "speedup"], rows)
+        self.stdout.write(f"{count} rows, {len(expected)} bytes per provider jobs body, identical for every "
+                          f"strategy; orjson {'installed' if orjson else 'not installed (stdlib json)'}")
@@ -0,0 +1,68 @@
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from api.bench import scratch_database, time_call, summarize, write_table, create_users
+from api.authentication import tokens_for
+
+
+def legacy_login(email, password):
+    """The login view before EmailBackend: email lookup, username authenticate, then the profile."""
+    user = authenticate(username=User.objects.get(email=email).username, password=password)
+    return tokens_for(user), user.userprofile.role
+
+
+def email_login(email, password):
+    user = authenticate(email=email, password=password)
+    return tokens_for(user), user.userprofile.role
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark logins: the old three-lookup path against EmailBackend, and the full "
+        "POST /api/users/login, for each PBKDF2 iteration count. Runs in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--logins', type=int, default=20, help="timed logins per strategy")
+        parser.add_argument('--iterations', default="1000000,100000,10000",
+                            help="comma-separated PASSWORD_HASH_ITERATIONS values")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self._run(options['users'], options['logins'], [int(n) for n in options['iterations'].split(',')])
+
+    def _run(self, count, logins, iteration_counts):
+        users = create_users(count)
+        emails = [user.email for user in users]
+        client = Client()
+
+        def http_login(email, password):
+            response = client.post("/api/users/login", {"email": email, "password": password},
+                                   content_type="application/json")
+            assert response.status_code == 200, response.content
+
+        strategies = [
+            ("legacy (get + authenticate)", legacy_login),
+            ("EmailBackend", email_login),
+            ("POST /api/users/login", http_login),
+        ]
+
+        rows = []
+        for iterations in iteration_counts:
+            with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+                User.objects.update(password=make_password("pw"))
+                for label, login in strategies:
+                    queries = []  # not CaptureQueriesContext: a request start resets its log
+                    with connection.execute_wrapper(lambda execute, *call: queries.append(1) or execute(*call)):
+                        login(emails[0], "pw")
+                    picks = iter(range(1, logins + 1))
+                    p50 = summarize(time_call(lambda: login(emails[next(picks) % count], "pw"), logins))["p50"]
+                    rows.append((iterations, label, p50, 1000 / p50, len(queries)))
+
+        write_table(self.stdout, ["iterations", "strategy", "ms / login", "logins / s", "queries"], rows)
+        self.stdout.write(f"{count} users, {logins} logins per row, one worker")
@@ -0,0 +1,52 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from api.bench import (
+    scratch_database, time_call, summarize, write_table,
+    create_providers, CITY_CENTERS, SERVICE_TYPES,
+)
+from api.geo import haversine_km, nearest
+from api.models import ServiceProvider
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the grid-indexed nearest-provider lookup against a full scan. "
+        "Runs in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=100000, help='Synthetic providers to create.')
+        parser.add_argument('--queries', type=int, default=200, help='Random lookups to time.')
+        parser.add_argument('--k', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self._run(options['providers'], options['queries'], options['k'])
+
+    def _run(self, count, queries, k):
+        rng = random.Random(7)
+        create_providers(count, rng=rng, centers=CITY_CENTERS, spread=1.5)
+        points = []
+        for _ in range(queries):
+            lat, lng = rng.choice(CITY_CENTERS)
+            points.append((lat + rng.gauss(0, 0.5), lng + rng.gauss(0, 0.5), rng.choice(SERVICE_TYPES)))
+
+        def full_scan(lat, lng, type_):
+            candidates = ServiceProvider.objects.filter(type__iexact=type_)
+            return sorted(candidates, key=lambda p: haversine_km(lat, lng, p.lat, p.lng))[:k]
+
+        def grid(lat, lng, type_):
+            return [p for _, p in nearest(ServiceProvider.objects.filter(type__iexact=type_), lat, lng, k)]
+
+        # Same answers from both strategies
+        for lat, lng, type_ in points[:20]:
+            assert [p.id for p in grid(lat, lng, type_)] == [p.id for p in full_scan(lat, lng, type_)]
+
+        rows = []
+        for name, fn, n in (("grid index", grid, queries), ("full scan", full_scan, min(queries, 20))):
+            it = iter(points)
+            stats = summarize(time_call(lambda: fn(*next(it)), n))
+            rows.append((name, count, n, stats["p50"], stats["p95"]))
+        write_table(self.stdout, ["strategy", "providers", "queries", "p50 ms", "p95 ms"], rows)
@@ -0,0 +1,71 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.bench import (
+    scratch_database, time_call, summarize, write_table,
+    create_services, create_users, create_providers, create_requests,
+)
+from api.models import ServiceRequest
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark /api/provider/jobs against /api/requests as the ServiceRequest table grows. "
+        "Runs in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,50000',
+                            help='Comma-separated table sizes (total ServiceRequest rows).')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests timed per endpoint and size.')
+        parser.add_argument('--legacy-max', type=int, default=5000,
+                            help='Skip /api/requests above this many rows (it gets slow).')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options['sizes'].split(','))
+        with scratch_database():
+            self._run(sizes, options['repeat'], options['legacy_max'])
+
+    def _run(self, sizes, repeat, legacy_max):
+        rng = random.Random(42)
+        services = create_services()
+        customers = create_users(50, prefix="customer")
+        providers = create_providers(200, rng=rng)
+        provider = providers[0]
+        account = create_users(1, prefix="provider", role="provider")[0]
+        account.email = provider.email
+        account.save()
+
+        # The rows the provider actually needs stay fixed: one active job, some history
+        # and a queue of pending jobs for their service type. Growth is other providers' history.
+        own_service = next(s for s in services if s.name == provider.type)
+        create_requests(1, [own_service], customers, [provider], rng=rng, statuses=["Accepted"])
+        create_requests(20, services, customers, [provider], rng=rng, statuses=["Completed", "Cancelled"])
+        create_requests(30, [own_service], customers, providers[1:], rng=rng, statuses=["Pending"])
+
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(account).access_token}")
+        endpoints = [
+            ("/api/provider/jobs?bucket=available", None),
+            ("/api/provider/jobs?bucket=active", None),
+            ("/api/provider/jobs?bucket=past", None),
+            ("/api/requests", legacy_max),
+        ]
+
+        rows = []
+        for size in sizes:
+            missing = size - ServiceRequest.objects.count()
+            if missing > 0:
+                create_requests(missing, services, customers, providers[1:], rng=rng,
+                                statuses=["Completed", "Cancelled"])
+            for url, max_rows in endpoints:
+                if max_rows is not None and size > max_rows:
+                    rows.append((size, url, "-", "skipped", "-"))
+                    continue
+                body = client.get(url).content
+                stats = summarize(time_call(lambda: client.get(url), repeat))
+                rows.append((size, url, len(body), stats["p50"], stats["p95"]))
+
+        write_table(self.stdout, ["rows", "endpoint", "bytes", "p50 ms", "p95 ms"], rows)
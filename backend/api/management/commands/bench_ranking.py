@@ -0,0 +1,46 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from api.bench import time_call, summarize, write_table, CITY_CENTERS, SERVICE_TYPES
+from api.geo import haversine_km
+from api.ranking import ProviderArrays, RATING_WEIGHT_KM
+
+
+class Command(BaseCommand):
+    help = "Benchmark vectorized provider ranking against a per-provider Python loop (no database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=50000)
+        parser.add_argument('--batch', type=int, default=200, help='Requests ranked together by rank_many().')
+        parser.add_argument('--k', type=int, default=5)
+
+    def handle(self, *args, **options):
+        n, batch, k = options['providers'], options['batch'], options['k']
+        rng = random.Random(3)
+        rows = []
+        for i in range(n):
+            lat, lng = CITY_CENTERS[i % len(CITY_CENTERS)]
+            rows.append((i + 1, lat + rng.gauss(0, 0.5), lng + rng.gauss(0, 0.5),
+                         round(rng.uniform(2.5, 5), 1), SERVICE_TYPES[i % len(SERVICE_TYPES)]))
+        index = ProviderArrays()
+        index.load(rows)
+        points = [(lat + rng.gauss(0, 0.3), lng + rng.gauss(0, 0.3)) for lat, lng in
+                  (rng.choice(CITY_CENTERS) for _ in range(batch))]
+        lat0, lng0 = points[0]
+
+        def python_loop():
+            scored = [(haversine_km(lat0, lng0, lat, lng) + RATING_WEIGHT_KM * (5 - rating), pid)
+                      for pid, lat, lng, rating, _ in rows]
+            return sorted(scored)[:k]
+
+        loop = summarize(time_call(python_loop, 5))
+        single = summarize(time_call(lambda: index.rank(lat0, lng0, k=k), 50))
+        many = summarize(time_call(
+            lambda: index.rank_many([p[0] for p in points], [p[1] for p in points], k=k), 5
+        ))
+        write_table(self.stdout, ["strategy", "providers", "requests", "p50 ms", "ms / request"], [
+            ("python loop", n, 1, loop["p50"], loop["p50"]),
+            ("numpy rank", n, 1, single["p50"], single["p50"]),
+            ("numpy rank_many", n, batch, many["p50"], many["p50"] / batch),
+        ])
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.dispatch import DISPATCH_MODES, run_cycle
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign Pending requests to idle providers of the matching type in one batch. "
+        "Runs once, or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=DISPATCH_MODES, default='greedy')
+        parser.add_argument('--max-km', type=float, default=50.0,
+                            help='Never send a provider farther than this (km).')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between cycles; 0 runs a single cycle.')
+        parser.add_argument('--dry-run', action='store_true', help='Plan only, write nothing.')
+
+    def handle(self, *args, **options):
+        if options['max_km'] <= 0:
+            raise CommandError("--max-km must be positive.")
+        while True:
+            close_old_connections()
+            stats = run_cycle(options['mode'], max_km=options['max_km'], dry_run=options['dry_run'])
+            self.stdout.write(
+                "[{mode}] pending={pending} idle={idle_providers} planned={planned} assigned={assigned} "
+                "cost={total_cost} plan={plan_ms:.1f}ms apply={apply_ms:.1f}ms cycle={cycle_ms:.1f}ms".format(**stats)
+            )
+            if not options['interval']:
+                break
+            time.sleep(max(0.0, options['interval'] - stats['cycle_ms'] / 1000))
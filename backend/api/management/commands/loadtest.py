@@ -0,0 +1,86 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bench import write_table
+from api.loadtest import (
+    COMPARE_HEADERS, DEFAULT_MIX, REPORT_HEADERS, LoadTest, cleanup_accounts, compare, prepare_accounts,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay realistic polling / booking / job traffic against a running server "
+        "(runserver, gunicorn or uvicorn) and report req/s and p50/p95/p99 per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test.')
+        parser.add_argument('--clients', type=int, default=20, help='Concurrent virtual clients.')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run.')
+        parser.add_argument('--customers', type=int, default=50, help='Loadtest customer accounts to use.')
+        parser.add_argument('--providers', type=int, default=20, help='Loadtest provider accounts to use.')
+        parser.add_argument('--mix', default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                            help='Action weights, e.g. poll_requests=40,login=10.')
+        parser.add_argument('--think', default='200,1000', help='Think time range between actions (ms).')
+        parser.add_argument('--no-etag', action='store_true', help='Never send If-None-Match.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prepare', action='store_true',
+                            help="Create the loadtest-* accounts in this project's database first.")
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the loadtest-* accounts and their requests, then exit.')
+        parser.add_argument('--save', help='Write the report as JSON (a baseline for --baseline).')
+        parser.add_argument('--baseline', help='Compare against a report saved with --save.')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            users, providers = cleanup_accounts()
+            self.stdout.write(f"Deleted {users} loadtest users and {providers} providers.")
+            return
+        if options['prepare']:
+            users, providers = prepare_accounts(options['customers'], options['providers'])
+            self.stdout.write(f"Created {users} loadtest users and {providers} providers.")
+
+        test = LoadTest(
+            options['url'],
+            clients=options['clients'],
+            duration=options['duration'],
+            customers=options['customers'],
+            providers=options['providers'],
+            mix=self._mix(options['mix']),
+            think_ms=self._think(options['think']),
+            use_etags=not options['no_etag'],
+            seed=options['seed'],
+        )
+        try:
+            rows = test.run()
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+        write_table(self.stdout, REPORT_HEADERS, rows)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)["rows"]
+            self.stdout.write("")
+            write_table(self.stdout, COMPARE_HEADERS, compare(rows, baseline))
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump({"options": {k: options[k] for k in ('url', 'clients', 'duration', 'mix')},
+                           "rows": rows}, f, indent=2)
+
+    def _mix(self, value):
+        try:
+            mix = {name: float(weight) for name, weight in (part.split('=') for part in value.split(','))}
+        except ValueError:
+            raise CommandError("--mix must look like poll_requests=40,login=10.")
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown or not any(mix.values()):
+            raise CommandError(f"--mix actions are {', '.join(DEFAULT_MIX)}.")
+        return mix
+
+    def _think(self, value):
+        try:
+            low, high = (float(v) for v in value.split(','))
+        except ValueError:
+            raise CommandError("--think must be two numbers, e.g. 200,1000.")
+        return low, high
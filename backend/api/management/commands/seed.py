@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import catalog, ranking
+from api.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the configured database with synthetic users, providers (clustered around "
+        "city centres) and service requests. Deterministic for a given --seed; rows are "
+        "generated and inserted in batches, never all in memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--providers', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='seed',
+                            help='Usernames / emails are <prefix>-user-N and <prefix>-provider-N.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--orm', action='store_true',
+                            help='Insert requests with bulk_create instead of raw SQL (slower; for comparison).')
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='Do not drop and rebuild the request indexes around the load.')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['providers'], options['requests']) < 0 or options['batch_size'] < 1:
+            raise CommandError("Counts must be >= 0 and --batch-size >= 1.")
+        if options['requests'] and not (options['users'] and options['providers']):
+            raise CommandError("Requests need --users and --providers > 0.")
+
+        started = time.perf_counter()
+
+        def progress(table, done, total):
+            if done == total or done % (options['batch_size'] * 10) == 0:
+                self.stdout.write(f"{table}: {done}/{total}")
+
+        counts = seed(
+            options['users'], options['providers'], options['requests'],
+            seed=options['seed'], prefix=options['prefix'], batch_size=options['batch_size'],
+            raw=not options['orm'], defer_indexes=not options['keep_indexes'], progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        # Bulk and raw inserts send no signals
+        catalog.invalidate("providers")
+        catalog.invalidate("services")
+        ranking.reload_provider_index()
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded {users} users, {providers} providers, {requests} requests in {elapsed:.1f}s.".format(
+                elapsed=elapsed, **counts)
+        ))
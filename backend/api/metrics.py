@@ -0,0 +1,301 @@
+"""
+Per-endpoint request metrics in Prometheus text format (GET /api/metrics).
+
+MetricsMiddleware records, for every request, under its URL pattern (the
+route string from backend/urls.py, e.g. "api/requests/<int:request_id>") and
+method:
+  http_requests_total{status}      requests by status code
+  http_request_duration_seconds    latency histogram
+  http_request_db_queries          queries per request (histogram)
+  http_request_db_seconds          time spent in the database per request (histogram)
+  http_response_size_bytes         response body size (histogram; streaming responses count 0)
+Query count and time come from a connection execute_wrapper (see watch()).
+The middleware is sync and async capable, so under ASGI it adds no thread
+hop in front of async views.
+
+Aggregation is lock-free on the request path: each thread owns a store that
+only it writes (stores are keyed by thread ident, so a thread pool reuses
+them); a scrape sums the stores. Counters may be a request apart while a
+scrape races a write, never lost.
+
+Across gunicorn workers: with METRICS_DIR set, every worker writes a
+snapshot of its totals to <METRICS_DIR>/<pid>-<token>.json at most every
+METRICS_DUMP_INTERVAL seconds (and at exit), and a scrape of any worker
+merges its live totals with every other worker's file. Files of exited
+workers are kept so the merged counters never go down; empty the directory
+when the server is (re)started, as with prometheus_client's multiprocess
+mode. Without METRICS_DIR each worker reports only itself.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+HISTOGRAMS = (
+    # (name, help, buckets, field)
+    ("http_request_duration_seconds", "Request latency.", LATENCY_BUCKETS, "duration"),
+    ("http_request_db_queries", "Database queries per request.", QUERY_BUCKETS, "queries"),
+    ("http_request_db_seconds", "Time spent in database queries per request.", LATENCY_BUCKETS, "db"),
+    ("http_response_size_bytes", "Response body size.", SIZE_BUCKETS, "bytes"),
+)
+UNMATCHED = "<unmatched>"
+
+
+# -------------------------------
+# Per-thread stores
+# -------------------------------
+
+def _histogram(buckets):
+    return {"counts": [0] * (len(buckets) + 1), "sum": 0.0}  # last slot: above every bound
+
+
+def _new_series():
+    series = {"statuses": {}}
+    for _, _, buckets, field in HISTOGRAMS:
+        series[field] = _histogram(buckets)
+    return series
+
+
+def _observe(histogram, buckets, value):
+    histogram["counts"][bisect.bisect_left(buckets, value)] += 1
+    histogram["sum"] += value
+
+
+_stores = {}  # thread ident -> {(route, method): series}
+_stores_lock = threading.Lock()
+
+
+def _store():
+    ident = threading.get_ident()
+    store = _stores.get(ident)
+    if store is None:
+        with _stores_lock:  # only when a thread records its first request
+            store = _stores.setdefault(ident, {})
+    return store
+
+
+def record(route, method, status, duration, queries, db_seconds, size):
+    key = (route, method)
+    store = _store()
+    series = store.get(key)
+    if series is None:
+        series = store[key] = _new_series()
+    series["statuses"][status] = series["statuses"].get(status, 0) + 1
+    for (_, _, buckets, field), value in zip(HISTOGRAMS, (duration, queries, db_seconds, size)):
+        _observe(series[field], buckets, value)
+    _maybe_dump()
+
+
+def snapshot():
+    """This process's totals: {(route, method): series}, summed over threads."""
+    merged = {}
+    for store in list(_stores.values()):
+        for key, series in list(store.items()):
+            _merge_series(merged, key, series)
+    return merged
+
+
+def _merge_series(merged, key, series):
+    target = merged.get(key)
+    if target is None:
+        target = merged[key] = _new_series()
+    for status, count in list(series["statuses"].items()):
+        target["statuses"][status] = target["statuses"].get(status, 0) + count
+    for _, _, _, field in HISTOGRAMS:
+        target[field]["counts"] = [a + b for a, b in zip(target[field]["counts"], series[field]["counts"])]
+        target[field]["sum"] += series[field]["sum"]
+
+
+def clear():
+    with _stores_lock:
+        _stores.clear()
+
+
+# -------------------------------
+# Multiprocess files
+# -------------------------------
+
+_token = uuid.uuid4().hex[:8]
+_dump_lock = threading.Lock()
+_last_dump = 0.0
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def _own_file(directory):
+    return os.path.join(directory, f"{os.getpid()}-{_token}.json")
+
+
+def dump():
+    """Write this process's totals to METRICS_DIR (atomically)."""
+    directory = _metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = _own_file(directory)
+    rows = [[route, method, series] for (route, method), series in snapshot().items()]
+    with open(path + ".tmp", "w") as f:
+        json.dump(rows, f)
+    os.replace(path + ".tmp", path)
+
+
+def _maybe_dump():
+    global _last_dump
+    if not _metrics_dir() or time.monotonic() - _last_dump < getattr(settings, 'METRICS_DUMP_INTERVAL', 5):
+        return
+    if _dump_lock.acquire(blocking=False):  # another thread is already writing
+        try:
+            _last_dump = time.monotonic()
+            dump()
+        finally:
+            _dump_lock.release()
+
+
+def collect():
+    """Totals of this process plus every other worker's latest file."""
+    merged = snapshot()
+    directory = _metrics_dir()
+    if not directory or not os.path.isdir(directory):
+        return merged
+    own = os.path.basename(_own_file(directory))
+    for name in os.listdir(directory):
+        if not name.endswith(".json") or name == own:
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            continue  # being replaced by its worker
+        for route, method, series in rows:
+            series["statuses"] = {int(status): count for status, count in series["statuses"].items()}
+            _merge_series(merged, (route, method), series)
+    return merged
+
+
+atexit.register(lambda: _metrics_dir() and dump())
+
+
+# -------------------------------
+# Exposition
+# -------------------------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def render(totals):
+    """Prometheus text exposition (version 0.0.4) of collect() output."""
+    keys = sorted(totals)
+    lines = ["# HELP http_requests_total Requests by URL pattern, method and status.",
+             "# TYPE http_requests_total counter"]
+    for route, method in keys:
+        for status, count in sorted(totals[(route, method)]["statuses"].items()):
+            lines.append(f"http_requests_total{_labels(route=route, method=method, status=status)} {count}")
+    for name, help_text, buckets, field in HISTOGRAMS:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for route, method in keys:
+            histogram = totals[(route, method)][field]
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], histogram["counts"]):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{name}_bucket{_labels(route=route, method=method, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(route=route, method=method)} {float(histogram['sum'])!r}")
+            lines.append(f"{name}_count{_labels(route=route, method=method)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------------
+# Middleware
+# -------------------------------
+
+class _QueryTimer:
+    """Query count and time of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_timer = ContextVar("metrics_query_timer", default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timer = _timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.seconds += time.perf_counter() - started
+        timer.queries += 1
+
+
+def watch(connection):
+    """
+    Count this connection's queries for the request running them. Installed
+    on every new connection (signals.py) rather than per request: connections
+    belong to a thread, and an async view's queries run on a thread of
+    sync_to_async's, which still sees the request's context.
+    """
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _timed_execute)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        token = _timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timer.reset(token)
+        self._record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        token = _timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timer.reset(token)
+        self._record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    def _record(self, request, response, duration, timer):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else UNMATCHED
+        size = 0 if response.streaming else len(response.content)
+        record(route, request.method, response.status_code, duration, timer.queries, timer.seconds, size)
@@ -0,0 +1,86 @@
+"""
+Django's built-in middleware for the ASGI profile (settings.ASGI_PROFILE).
+
+Under ASGI, MiddlewareMixin runs every process_request / process_response in
+a thread (sync_to_async), in case the hook blocks. The default stack makes
+that a dozen thread hops per request (thirteen with CSRF's process_view),
+which costs more than an async view itself: about 2 ms per request here
+against 0.7 ms without them (see README, ASGI).
+
+The hooks of these middlewares only read headers and cookies and set
+attributes, so the subclasses below run them on the event loop. The two
+that can touch the database hop to a thread only when they will:
+SessionMiddleware when it saves the session, MessageMiddleware when it stores
+messages (which may load the session). CsrfViewMiddleware keeps the stock
+behaviour with CSRF_USE_SESSIONS, where its hooks read and write the session.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, common, csrf, security
+from django.utils.deprecation import MiddlewareMixin
+
+
+class InlineHooksMixin:
+    """MiddlewareMixin.__acall__ with the hooks called on the event loop."""
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, 'process_request'):
+            response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, 'process_response'):
+            response = self.process_response(request, response)
+        return response
+
+
+class SecurityMiddleware(InlineHooksMixin, security.SecurityMiddleware):
+    pass
+
+
+class CommonMiddleware(InlineHooksMixin, common.CommonMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(InlineHooksMixin, auth.AuthenticationMiddleware):
+    pass  # request.user stays lazy: loading it is up to the view
+
+
+class XFrameOptionsMiddleware(InlineHooksMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
+
+
+class SessionMiddleware(InlineHooksMixin, sessions.SessionMiddleware):
+    async def __acall__(self, request):
+        self.process_request(request)  # a lazy SessionStore: nothing is loaded yet
+        response = await self.get_response(request)
+        if request.session.modified or settings.SESSION_SAVE_EVERY_REQUEST:
+            return await sync_to_async(self.process_response, thread_sensitive=True)(request, response)
+        return self.process_response(request, response)
+
+
+class MessageMiddleware(InlineHooksMixin, messages.MessageMiddleware):
+    async def __acall__(self, request):
+        self.process_request(request)
+        response = await self.get_response(request)
+        storage = request._messages
+        if storage.used or storage.added_new:
+            return await sync_to_async(self.process_response, thread_sensitive=True)(request, response)
+        return self.process_response(request, response)
+
+
+class CsrfViewMiddleware(InlineHooksMixin, csrf.CsrfViewMiddleware):
+    async def __acall__(self, request):
+        if settings.CSRF_USE_SESSIONS:
+            return await MiddlewareMixin.__acall__(self, request)
+        return await super().__acall__(request)
+
+    async def process_view(self, request, callback, callback_args, callback_kwargs):
+        # A coroutine, so the handler does not wrap this hook in a thread either
+        process_view = super().process_view
+        if settings.CSRF_USE_SESSIONS:
+            process_view = sync_to_async(process_view, thread_sensitive=True)
+            return await process_view(request, callback, callback_args, callback_kwargs)
+        return process_view(request, callback, callback_args, callback_kwargs)
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+# The grid as of this migration, frozen: later changes to api.geo must not
+# change what the backfill computes on a fresh database.
+CELL_DEG = 0.1
+ROWS = 1800
+COLS = 3600
+
+
+def grid_cell(lat, lng):
+    row = min(max(int((lat + 90) // CELL_DEG), 0), ROWS - 1)
+    col = min(max(int((lng + 180) // CELL_DEG), 0), COLS - 1)
+    return row * COLS + col
+
+
+def fill_grid_cells(apps, schema_editor):
+    ServiceProvider = apps.get_model('api', 'ServiceProvider')
+    providers = list(ServiceProvider.objects.only('id', 'lat', 'lng'))
+    for provider in providers:
+        provider.grid_cell = grid_cell(provider.lat, provider.lng)
+    ServiceProvider.objects.bulk_update(providers, ['grid_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_servicerequest_arrived_by_provider_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='grid_cell',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_realtimeevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
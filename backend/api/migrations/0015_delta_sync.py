@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_service_serviceprovider_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.BigIntegerField()),
+                ('user_id', models.IntegerField()),
+                ('provider_id', models.BigIntegerField(blank=True, null=True)),
+                ('service_type', models.CharField(blank=True, max_length=100)),
+                ('deleted', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:54
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_delta_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='requesttombstone',
+            index=models.Index(fields=['user_id', 'deleted'], name='tomb_user_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requesttombstone',
+            index=models.Index(fields=['provider_id', 'deleted'], name='tomb_provider_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requesttombstone',
+            index=models.Index(fields=['service_type', 'deleted'], name='tomb_type_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceprovider',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='provider_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['user', '-created', '-id'], name='req_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['user', 'updated'], name='req_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['provider', 'status'], name='req_provider_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['status', '-id'], name='req_status_id_idx'),
+        ),
+    ]
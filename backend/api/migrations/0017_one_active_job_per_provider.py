@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='servicerequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['Accepted', 'Arrived'])), fields=('provider',), name='one_active_job_per_provider'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_one_active_job_per_provider'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrajectoryChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('provider', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.serviceprovider')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trajectory_chunks', to='api.servicerequest')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['request', 'start'], name='traj_request_start_idx'), models.Index(fields=['provider', 'start'], name='traj_provider_start_idx')],
+            },
+        ),
+    ]
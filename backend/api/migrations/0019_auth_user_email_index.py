@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index auth_user.email for the login lookup (api/backends.py). auth.User
+    is not ours to add Meta.indexes to, hence the raw SQL (valid on SQLite
+    and PostgreSQL). It runs after auth's last migration: on SQLite, altering
+    auth_user rebuilds the table and drops indexes Django doesn't know about.
+    """
+
+    dependencies = [
+        ('api', '0018_trajectory_chunks'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_idx',
+        ),
+    ]
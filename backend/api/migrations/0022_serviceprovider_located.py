@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_userprofile_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='located',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .geo import grid_cell
 
 User = get_user_model()
 
@@ -9,6 +13,9 @@ class UserProfile(models.Model):
     role = models.CharField(max_length=16, default="user")  # user / provider / admin
     phone = models.CharField(max_length=32, blank=True)
     created = models.DateTimeField(auto_now_add=True)
+    # Also bumped when the user's username changes (signals.user_changed): request payloads
+    # embed both, and the conditional GET versions track this column (see conditional.py)
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username} ({self.role})"
@@ -23,6 +30,20 @@ class ServiceProvider(models.Model):
     rating = models.FloatField(default=0)
     created = models.DateTimeField(auto_now_add=True)
     phone = models.CharField(max_length=32, blank=False, null=False)
+    grid_cell = models.IntegerField(default=0, db_index=True, editable=False)  # see api/geo.py
+    located = models.DateTimeField(null=True, blank=True, editable=False)  # sample time of the GPS fix, see api/locations.py
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Case-insensitive email lookups: filter on Lower('email') (see provider_by_email)
+            models.Index(Lower('email'), name='provider_email_lower_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Keep the spatial grid cell in sync with lat/lng
+        self.grid_cell = grid_cell(float(self.lat), float(self.lng))
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -33,11 +54,16 @@ class Service(models.Model):
     description = models.TextField(blank=True)
     price = models.FloatField()  # base cost
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
+# A provider works one job at a time: at most one request per provider in these statuses
+ACTIVE_JOB_STATUSES = ["Accepted", "Arrived"]
+
+
 class ServiceRequest(models.Model):
     STATUS_CHOICES = [
         ("Pending", "Pending"),
@@ -59,15 +85,112 @@ class ServiceRequest(models.Model):
     completed_by_provider = models.BooleanField(default=False)
     completed_by_user = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
-    updated = models.DateTimeField(auto_now=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)  # delta sync watermark (api/sync.py)
+    # When the provider took the job / the job was completed: bound the GPS samples
+    # attributed to the request (api/trajectory.py); see stamp_status_times()
+    accepted_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Match the hot queries; api/tests.py QueryPlanTests checks they are used.
+        indexes = [
+            # my_requests_view: user (+ status) newest first, and keyset pages
+            models.Index(fields=['user', '-created', '-id'], name='req_user_created_idx'),
+            # delta sync: user's rows changed since a watermark
+            models.Index(fields=['user', 'updated'], name='req_user_updated_idx'),
+            # request_view accept / dispatch: provider's Accepted/Arrived jobs
+            models.Index(fields=['provider', 'status'], name='req_provider_status_idx'),
+            # provider feed "available" bucket and dispatch: Pending requests, newest first
+            models.Index(fields=['status', '-id'], name='req_status_id_idx'),
+        ]
+        constraints = [
+            # Partial unique index; transitions.accept() relies on it under concurrency
+            models.UniqueConstraint(
+                fields=['provider'],
+                condition=models.Q(status__in=ACTIVE_JOB_STATUSES),
+                name='one_active_job_per_provider',
+            ),
+        ]
+
+    def stamp_status_times(self, now):
+        """Set accepted_at / completed_at when the status first reaches them (bulk writes call this)."""
+        if self.status in ACTIVE_JOB_STATUSES and self.accepted_at is None:
+            self.accepted_at = now
+        if self.status == "Completed" and self.completed_at is None:
+            self.completed_at = now
 
     def save(self, *args, **kwargs):
         # Auto-set estimated_cost from the linked service
         if self.service:
             self.estimated_cost = self.service.price
+        self.stamp_status_times(timezone.now())
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Req {self.id} {self.service.name} {self.status}"
 
 
+
+
+class RequestTombstone(models.Model):
+    """Marker left by a deleted ServiceRequest so delta sync can report the deletion."""
+    request_id = models.BigIntegerField()
+    user_id = models.IntegerField()
+    provider_id = models.BigIntegerField(null=True, blank=True)
+    service_type = models.CharField(max_length=100, blank=True)  # normalized service name
+    deleted = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'deleted'], name='tomb_user_deleted_idx'),
+            models.Index(fields=['provider_id', 'deleted'], name='tomb_provider_deleted_idx'),
+            models.Index(fields=['service_type', 'deleted'], name='tomb_type_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted req {self.request_id}"
+
+
+class RealtimeEvent(models.Model):
+    """Outbox row used by realtime.DatabaseBroker to fan events out across workers."""
+    channels = models.CharField(max_length=255)
+    payload = models.JSONField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Event {self.id} {self.payload.get('event')}"
+
+
+class StreamTicket(models.Model):
+    """
+    Short-lived, single-use pass for opening the /api/events stream (see
+    realtime.issue_ticket); only a hash of the ticket is stored.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Stream ticket for {self.user_id}"
+
+
+class TrajectoryChunk(models.Model):
+    """
+    A run of GPS samples recorded for a provider during a request, packed as
+    delta-encoded integer arrays (see api/trajectory.py) rather than a row per point.
+    """
+    request = models.ForeignKey(ServiceRequest, on_delete=models.CASCADE, related_name='trajectory_chunks')
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.SET_NULL, null=True, blank=True)
+    start = models.DateTimeField()  # first and last sample in the chunk
+    end = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['request', 'start'], name='traj_request_start_idx'),
+            models.Index(fields=['provider', 'start'], name='traj_provider_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trajectory of req {self.request_id} ({self.count} points)"
@@ -0,0 +1,99 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+
+A page is "rows strictly after the last row of the previous page" in the
+list's ordering, e.g. (created, id) < (last.created, last.id) for newest
+first. The database seeks straight to that point, so page 1000 costs the
+same as page 1 (unlike OFFSET, which walks every skipped row).
+
+Pagination is opt-in so existing clients keep receiving a plain list:
+    ?page_size=N        first page of N rows (capped at API_MAX_PAGE_SIZE)
+    ?cursor=<token>     the page after the one that returned <token> as "next"
+Paginated responses look like {"results": [...], "next": "<token>" | null}.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def is_paginated(request):
+    params = getattr(request, 'query_params', request.GET)  # DRF or plain Django request (async_views)
+    return 'cursor' in params or 'page_size' in params
+
+
+def page_size(request):
+    default = getattr(settings, 'API_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+    try:
+        size = int(request.query_params.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, model, ordering):
+    """Turn a cursor token back into typed key values for `ordering`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor()
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor()
+    try:
+        return [
+            model._meta.get_field(name.lstrip('-')).to_python(value)
+            for name, value in zip(ordering, values)
+        ]
+    except ValidationError:
+        raise InvalidCursor()
+
+
+def keyset_filter(ordering, values):
+    """
+    Q for rows after `values` in `ordering`, e.g. for ('-created', '-id'):
+        created < c OR (created = c AND id < i)
+    """
+    condition = Q()
+    equal = Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        condition |= equal & Q(**{f"{field}__{lookup}": value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def keyset_page(request, queryset, ordering, serialize):
+    """
+    One page of `queryset` in `ordering` (which must end in a unique field).
+
+    `serialize` turns a (sliced) queryset into a list of dicts; every ordering
+    field must appear as a top-level key of those dicts, since the next cursor
+    is read from the last row. Returns the paginated response body.
+    """
+    size = page_size(request)
+    queryset = queryset.order_by(*ordering)
+    token = request.query_params.get('cursor')
+    if token:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(token, queryset.model, ordering)))
+
+    rows = serialize(queryset[:size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[name.lstrip('-')] for name in ordering])
+    return {"results": rows, "next": next_cursor}
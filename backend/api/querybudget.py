@@ -0,0 +1,162 @@
+"""
+Query budgets and N+1 detection for views.
+
+    @query_budget(3)                       # any method
+    @query_budget({"GET": 3, "POST": 6})   # per method
+    @api_view([...])
+    def some_view(request): ...
+
+    with query_budget(2, name="feed"):     # any block, e.g. in a test
+        ...
+
+Put the decorator above @api_view so authentication queries count too.
+Within the scope every query is counted and its shape recorded (SQL with
+literals and IN-list lengths normalized). The scope fails when
+
+  - it ran more queries than its budget, or
+  - one shape ran QUERY_BUDGET_REPEAT_LIMIT or more times: the per-row
+    lazy load of an N+1
+
+and the report names the shape and the first project line (under BASE_DIR,
+outside this module) that issued its second execution.
+
+QUERY_BUDGET chooses what a failure does: "raise" (QueryBudgetExceeded,
+the default in the test suite, see test_runner.py), "warn" (log a warning,
+the default with DEBUG) or "off" (the default otherwise: no wrapper, no
+overhead).
+"""
+import functools
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_MODES = ("raise", "warn", "off")
+
+_IN_LIST = re.compile(r"\bIN \((?:%s, )*%s\)", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in "raise" mode; an AssertionError so test runners report a failure."""
+
+
+def shape(sql):
+    """SQL with literals and IN-list lengths normalized, so per-row repeats compare equal."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def _mode():
+    mode = getattr(settings, 'QUERY_BUDGET', None)
+    if mode is None:
+        mode = "warn" if settings.DEBUG else "off"
+    return mode
+
+
+_WRAPPER_FILES = {__file__, metrics.__file__}  # execute_wrappers, never the caller
+
+
+def _call_site():
+    """'file:line in function' of the innermost project frame outside the query wrappers."""
+    base = str(getattr(settings, 'BASE_DIR', ''))
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename in _WRAPPER_FILES or not frame.filename.startswith(base) or "site-packages" in frame.filename:
+            continue
+        return f"{Path(frame.filename).relative_to(base)}:{frame.lineno} in {frame.name}"
+    return "<unknown>"
+
+
+class _Recorder:
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+        self.sites = {}  # shape -> call site of its second execution
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        key = shape(sql)
+        self.shapes[key] += 1
+        if self.shapes[key] == 2:
+            self.sites[key] = _call_site()
+        return execute(sql, params, many, context)
+
+
+class query_budget:
+    """Decorator / context manager; see the module docstring."""
+
+    def __init__(self, budget, name=None):
+        self.budget = budget
+        self.name = name
+        self._scopes = []
+
+    # -- decorator ------------------------------------------------------------
+
+    def __call__(self, view):
+        name = self.name or view.__name__
+
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            with query_budget(self._limit(request.method), name=name):
+                return view(request, *args, **kwargs)
+
+        wrapped.query_budget = self.budget
+        return wrapped
+
+    def _limit(self, method):
+        if isinstance(self.budget, dict):
+            return self.budget.get(method)
+        return self.budget
+
+    # -- context manager ------------------------------------------------------
+
+    def __enter__(self):
+        mode = _mode()
+        if mode == "off":
+            self._scopes.append(None)
+            return self
+        recorder = _Recorder()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        self._scopes.append((mode, recorder, stack))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        scope = self._scopes.pop()
+        if scope is None:
+            return False
+        mode, recorder, stack = scope
+        stack.close()
+        if exc_type is not None:
+            return False  # don't mask the view's own error
+        problems = self.problems(recorder)
+        if problems:
+            message = f"{self.name or 'query_budget'}: " + "\n".join(problems)
+            if mode == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return False
+
+    def problems(self, recorder):
+        found = []
+        limit = self.budget if not isinstance(self.budget, dict) else None
+        if limit is not None and recorder.count > limit:
+            found.append(f"{recorder.count} queries, budget {limit}.")
+        repeat_limit = getattr(settings, 'QUERY_BUDGET_REPEAT_LIMIT', 5)
+        for key, times in recorder.shapes.most_common():
+            if times < repeat_limit:
+                break
+            found.append(f"Same query ran {times} times (N+1?), from {recorder.sites[key]}:\n    {key}")
+        return found
@@ -0,0 +1,234 @@
+"""
+Vectorized provider ranking for dispatch.
+
+Provider coordinates, ratings and types live in contiguous NumPy arrays so a
+ranking is one vectorized pass (haversine -> score -> top-k) instead of a
+Python loop per provider. Many requests can be ranked at once as a
+(requests x providers) matrix.
+
+The arrays are per-process. They are patched incrementally from the
+ServiceProvider post_save/post_delete signals (see signals.py) and fully
+reloaded when older than DISPATCH_INDEX_MAX_AGE seconds, which also picks up
+changes made by other worker processes.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .geo import EARTH_RADIUS_KM
+
+# Score = distance_km + RATING_WEIGHT_KM * (5 - rating): each missing star counts as this many km.
+RATING_WEIGHT_KM = 2.0
+# Cells of the (requests x providers) matrix computed per chunk in rank_many().
+MATRIX_CHUNK_CELLS = 1_000_000
+
+
+def normalize_type(value):
+    """Provider.type / Service.name are compared trimmed and case-insensitively."""
+    return (value or "").strip().lower()
+
+
+class ProviderArrays:
+    """
+    Column store of providers: slot i holds one provider. Removed providers
+    leave a dead slot (active=False) that the next insert reuses.
+    """
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+        self.loaded_at = None
+
+    def _allocate(self, capacity):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.lat = np.zeros(capacity, dtype=np.float64)       # radians
+        self.lng = np.zeros(capacity, dtype=np.float64)       # radians
+        self.cos_lat = np.ones(capacity, dtype=np.float64)
+        self.rating = np.zeros(capacity, dtype=np.float64)
+        self.type_code = np.full(capacity, -1, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.size = 0              # slots in use (live or dead)
+        self._slots = {}           # provider id -> slot
+        self._free = []            # dead slots available for reuse
+        self._type_codes = {}      # normalized type -> code
+
+    def _grow(self):
+        capacity = max(1024, 2 * len(self.ids))
+        for name in ('ids', 'lat', 'lng', 'cos_lat', 'rating', 'type_code', 'active'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def type_code_for(self, type_):
+        return self._type_codes.get(normalize_type(type_), -2)
+
+    # -- loading / incremental updates -----------------------------------
+
+    def load(self, providers):
+        """Replace the contents with (id, lat, lng, rating, type) tuples."""
+        rows = list(providers)
+        with self._lock:
+            self._allocate(max(1024, len(rows)))
+            for row in rows:
+                self._put(*row)
+            self.loaded_at = time.monotonic()
+
+    def upsert(self, provider_id, lat, lng, rating, type_):
+        with self._lock:
+            self._put(provider_id, lat, lng, rating, type_)
+
+    def move_many(self, rows):
+        """Update the coordinates of already-indexed providers from (id, lat, lng) rows."""
+        with self._lock:
+            moved = [(self._slots[pid], lat, lng) for pid, lat, lng in rows if pid in self._slots]
+            if not moved:
+                return
+            slots, lats, lngs = (np.array(column) for column in zip(*moved))
+            self.lat[slots] = np.radians(lats.astype(np.float64))
+            self.lng[slots] = np.radians(lngs.astype(np.float64))
+            self.cos_lat[slots] = np.cos(self.lat[slots])
+
+    def remove(self, provider_id):
+        with self._lock:
+            slot = self._slots.pop(provider_id, None)
+            if slot is not None:
+                self.active[slot] = False
+                self._free.append(slot)
+
+    def _put(self, provider_id, lat, lng, rating, type_):
+        slot = self._slots.get(provider_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                if self.size == len(self.ids):
+                    self._grow()
+                slot = self.size
+                self.size += 1
+            self._slots[provider_id] = slot
+        code = self._type_codes.setdefault(normalize_type(type_), len(self._type_codes))
+        self.ids[slot] = provider_id
+        self.lat[slot] = np.radians(float(lat))
+        self.lng[slot] = np.radians(float(lng))
+        self.cos_lat[slot] = np.cos(self.lat[slot])
+        self.rating[slot] = float(rating or 0)
+        self.type_code[slot] = code
+        self.active[slot] = True
+
+    def __len__(self):
+        return len(self._slots)
+
+    # -- ranking -----------------------------------------------------------
+
+    def _candidates(self, type_):
+        """Views of the live slots, restricted to `type_` when given."""
+        n = self.size
+        mask = self.active[:n].copy()
+        if type_ is not None:
+            mask &= self.type_code[:n] == self.type_code_for(type_)
+        idx = np.flatnonzero(mask)
+        return idx, self.lat[idx], self.lng[idx], self.cos_lat[idx], self.rating[idx]
+
+    def rank(self, lat, lng, k=5, type_=None, rating_weight_km=RATING_WEIGHT_KM, exclude=()):
+        """
+        Best `k` providers for one point, as a list of
+        (provider_id, distance_km, score) sorted by score (lower is better).
+        """
+        ranked = self.rank_many([lat], [lng], k=k, type_=type_,
+                                rating_weight_km=rating_weight_km, exclude=exclude)
+        return ranked[0]
+
+    def rank_many(self, lats, lngs, k=5, type_=None, rating_weight_km=RATING_WEIGHT_KM, exclude=()):
+        """
+        Rank providers for many points at once. Returns one ranked list per
+        point (see rank()). Work is done in row chunks of the
+        (points x providers) matrix to bound memory.
+        """
+        with self._lock:
+            idx, plat, plng, pcos, prating = self._candidates(type_)
+            ids = self.ids[idx]
+        if exclude:
+            keep = ~np.isin(ids, np.fromiter(exclude, dtype=np.int64))
+            ids, plat, plng, pcos, prating = ids[keep], plat[keep], plng[keep], pcos[keep], prating[keep]
+
+        qlat = np.radians(np.asarray(lats, dtype=np.float64))
+        qlng = np.radians(np.asarray(lngs, dtype=np.float64))
+        n = len(ids)
+        k = min(k, n)
+        if k == 0:
+            return [[] for _ in range(len(qlat))]
+
+        penalty = rating_weight_km * (5.0 - prating)
+        chunk = max(1, MATRIX_CHUNK_CELLS // n)
+        results = []
+        for start in range(0, len(qlat), chunk):
+            distance = haversine_matrix(qlat[start:start + chunk], qlng[start:start + chunk], plat, plng, pcos)
+            score = distance + penalty
+            if k < n:
+                top = np.argpartition(score, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(n), (score.shape[0], n))
+            rows = np.arange(score.shape[0])[:, None]
+            order = np.argsort(score[rows, top], axis=1, kind='stable')
+            top = top[rows, order]
+            for r in range(score.shape[0]):
+                cols = top[r]
+                results.append(list(zip(
+                    ids[cols].tolist(), distance[r, cols].tolist(), score[r, cols].tolist()
+                )))
+        return results
+
+
+def haversine_matrix(qlat, qlng, plat, plng, pcos):
+    """
+    Great-circle distances in km between each query point (rows) and each
+    provider (columns). All angles in radians; pcos is cos(plat).
+    """
+    dlat = plat[None, :] - qlat[:, None]
+    dlng = plng[None, :] - qlng[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(qlat)[:, None] * pcos[None, :] * np.sin(dlng / 2) ** 2
+    np.clip(a, 0.0, 1.0, out=a)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+# -------------------------------
+# Process-wide index
+# -------------------------------
+
+_index = ProviderArrays()
+_index_lock = threading.Lock()
+
+
+def provider_index():
+    """The process-wide ProviderArrays, (re)loaded from the database when missing or stale."""
+    max_age = getattr(settings, 'DISPATCH_INDEX_MAX_AGE', 60)
+    if _index.loaded_at is None or time.monotonic() - _index.loaded_at > max_age:
+        with _index_lock:
+            if _index.loaded_at is None or time.monotonic() - _index.loaded_at > max_age:
+                reload_provider_index()
+    return _index
+
+
+def reload_provider_index():
+    from .models import ServiceProvider
+
+    _index.load(ServiceProvider.objects.values_list('id', 'lat', 'lng', 'rating', 'type').iterator())
+
+
+def provider_saved(provider):
+    if _index.loaded_at is not None:
+        _index.upsert(provider.id, provider.lat, provider.lng, provider.rating, provider.type)
+
+
+def providers_moved(rows):
+    """(id, lat, lng) rows written without save() (see locations.py)."""
+    if _index.loaded_at is not None:
+        _index.move_many(rows)
+
+
+def provider_deleted(provider_id):
+    if _index.loaded_at is not None:
+        _index.remove(provider_id)
@@ -0,0 +1,291 @@
+"""
+Live ServiceRequest events for the /api/events Server-Sent Events stream.
+
+Pieces:
+  Hub             in-process pub/sub: every open SSE connection subscribes to
+                  a few channels and gets events on an asyncio queue.
+  LocalBroker     publish straight into this process's hub (single process,
+                  e.g. `runserver`).
+  DatabaseBroker  stand-in for Redis pub/sub across workers: publish inserts a
+                  RealtimeEvent row, and one poller thread per worker fans new
+                  rows out to its local hub. Clients hold one idle connection
+                  instead of polling; the database sees one small query per
+                  worker per REALTIME_POLL_INTERVAL.
+
+Channels:
+  user:<user id>          the customer's own requests
+  provider:<provider id>  jobs assigned to a provider
+  type:<service type>     every request of a service type (available jobs)
+
+Select the broker with the REALTIME_BROKER setting ("database" or "local").
+RealtimeEvent rows older than REALTIME_EVENT_TTL are pruned by the writers
+as well as by the poller, so the outbox stays bounded without subscribers.
+
+The stream needs an ASGI server (settings.ASGI_PROFILE): under WSGI a never-
+ending response would hold a worker per client, so nothing is published
+there at all. EventSource cannot send an
+Authorization header, so browsers first POST for a stream ticket and open
+/api/events?ticket=...: short-lived and single-use, so it is harmless in
+access and proxy logs, unlike an access token in the query string.
+"""
+import asyncio
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .ranking import normalize_type
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+
+
+# -------------------------------
+# Hub
+# -------------------------------
+
+class Subscription:
+    def __init__(self, channels, loop):
+        self.channels = frozenset(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def offer(self, event):
+        """Called on the subscriber's event loop; drops the oldest event when the client lags."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class Hub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def subscribe(self, channels):
+        """Subscribe the running event loop to `channels`."""
+        sub = Subscription(channels, asyncio.get_running_loop())
+        with self._lock:
+            for channel in sub.channels:
+                self._channels[channel].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._channels.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._channels[channel]
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._channels)
+
+    def deliver(self, event):
+        """Hand an event to every subscriber of its channels. Safe to call from any thread."""
+        with self._lock:
+            targets = set()
+            for channel in event["channels"]:
+                targets.update(self._channels.get(channel, ()))
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, event)
+            except RuntimeError:  # subscriber's loop already closed
+                self.unsubscribe(sub)
+
+
+hub = Hub()
+
+
+# -------------------------------
+# Brokers
+# -------------------------------
+
+class LocalBroker:
+    def publish(self, event):
+        hub.deliver(event)
+
+    def publish_many(self, events):
+        for event in events:
+            hub.deliver(event)
+
+    def start(self):
+        pass
+
+
+class DatabaseBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+        self._last_prune = 0.0
+
+    def publish(self, event):
+        from .models import RealtimeEvent
+
+        RealtimeEvent.objects.create(channels=" ".join(event["channels"]), payload=event)
+        self.prune()
+
+    def publish_many(self, events):
+        from .models import RealtimeEvent
+
+        RealtimeEvent.objects.bulk_create(
+            [RealtimeEvent(channels=" ".join(event["channels"]), payload=event) for event in events], batch_size=500
+        )
+        self.prune()
+
+    def prune(self):
+        """Delete expired RealtimeEvent rows, at most once per REALTIME_EVENT_TTL in this process."""
+        from .models import RealtimeEvent
+
+        ttl = getattr(settings, 'REALTIME_EVENT_TTL', 300)
+        with self._lock:
+            if time.monotonic() - self._last_prune <= ttl:
+                return 0
+            self._last_prune = time.monotonic()
+        return RealtimeEvent.objects.filter(created__lt=timezone.now() - timedelta(seconds=ttl)).delete()[0]
+
+    def start(self):
+        """Start this worker's poller thread (once) when the first client subscribes."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="realtime-poller", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        interval = getattr(settings, 'REALTIME_POLL_INTERVAL', 0.5)
+        try:
+            while hub.has_subscribers():
+                try:
+                    self.poll_once()
+                except Exception:
+                    logger.exception("realtime poll failed")
+                time.sleep(interval)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._thread = None
+
+    def poll_once(self):
+        """Deliver RealtimeEvent rows newer than the last one seen; prune expired rows."""
+        from .models import RealtimeEvent
+
+        if self._last_id is None:
+            latest = RealtimeEvent.objects.order_by('-id').values_list('id', flat=True).first()
+            self._last_id = latest or 0
+            return 0
+        rows = list(RealtimeEvent.objects.filter(id__gt=self._last_id).order_by('id').values_list('id', 'payload'))
+        for event_id, payload in rows:
+            hub.deliver(payload)
+            self._last_id = event_id
+        self.prune()
+        return len(rows)
+
+
+_brokers = {"local": LocalBroker(), "database": DatabaseBroker()}
+
+
+def broker():
+    return _brokers[getattr(settings, 'REALTIME_BROKER', 'database')]
+
+
+# -------------------------------
+# Publishing
+# -------------------------------
+
+def request_event(kind, req, service_name=None):
+    """Event dict for a ServiceRequest; kind is created / updated / deleted."""
+    channels = [f"user:{req.user_id}"]
+    if req.provider_id:
+        channels.append(f"provider:{req.provider_id}")
+    if service_name:
+        channels.append(f"type:{normalize_type(service_name)}")
+    return {
+        "event": f"request.{kind}",
+        "channels": channels,
+        "id": req.id,
+        "status": req.status,
+        "provider": req.provider_id,
+        "updated": req.updated.isoformat() if req.updated else None,
+    }
+
+
+def publish_request(kind, req, service_name=None):
+    """Publish once the surrounding transaction commits (immediately in autocommit)."""
+    if not settings.ASGI_PROFILE:  # no stream to deliver to
+        return
+    event = request_event(kind, req, service_name)
+    transaction.on_commit(lambda: _publish(event))
+
+
+def publish_requests(kind, pairs):
+    """publish_request for many (request, service name) pairs, as one broker write."""
+    if not settings.ASGI_PROFILE:
+        return
+    events = [request_event(kind, req, service_name) for req, service_name in pairs]
+    if events:
+        transaction.on_commit(lambda: _publish_many(events))
+
+
+def _publish(event):
+    try:
+        broker().publish(event)
+    except Exception:
+        logger.exception("failed to publish %s", event["event"])
+
+
+def _publish_many(events):
+    try:
+        broker().publish_many(events)
+    except Exception:
+        logger.exception("failed to publish %d %s events", len(events), events[0]["event"])
+
+
+def channels_for(user, provider=None):
+    """Channels an SSE client may listen to."""
+    channels = [f"user:{user.id}"]
+    if provider is not None:
+        channels += [f"provider:{provider.id}", f"type:{normalize_type(provider.type)}"]
+    return channels
+
+
+# -------------------------------
+# Stream tickets
+# -------------------------------
+
+def _ticket_key(ticket):
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+
+def issue_ticket(user):
+    """A new stream ticket for `user`, valid for REALTIME_TICKET_TTL seconds."""
+    from .models import StreamTicket
+
+    now = timezone.now()
+    StreamTicket.objects.filter(expires__lte=now).delete()
+    ticket = secrets.token_urlsafe(32)
+    ttl = getattr(settings, 'REALTIME_TICKET_TTL', 30)
+    StreamTicket.objects.create(key=_ticket_key(ticket), user=user, expires=now + timedelta(seconds=ttl))
+    return ticket
+
+
+def redeem_ticket(ticket):
+    """The user a valid ticket was issued to, or None. A ticket redeems once."""
+    from .models import StreamTicket
+
+    row = (StreamTicket.objects.select_related('user')
+           .filter(key=_ticket_key(ticket), expires__gt=timezone.now()).first())
+    # Deleting the row is the redemption: of two concurrent uses only one deletes it
+    if row is None or not StreamTicket.objects.filter(pk=row.pk).delete()[0]:
+        return None
+    return row.user if row.user.is_active else None
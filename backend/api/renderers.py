@@ -0,0 +1,120 @@
+"""
+JSON rendering for API responses (REST_FRAMEWORK DEFAULT_RENDERER_CLASSES).
+
+FastJSONRenderer encodes with orjson when it is installed (pip install
+orjson) and otherwise behaves exactly like DRF's JSONRenderer. Its output is
+byte-for-byte what JSONRenderer produces with the default settings:
+
+  - datetimes / dates / times, Decimals, lazy strings, numpy values, sets,
+    dataclasses go through DRF's encoder, as with json.dumps
+  - U+2028 / U+2029 are escaped like JSONRenderer does
+  - orjson writes floats below 1e-4 and from 1e16 up differently from
+    repr() (0.00001 / 1e-6 / 1e16 against 1e-05 / 1e-06 / 1e+16): a body
+    that may hold one is rendered again with json (see
+    _floats_may_differ), as is anything orjson cannot encode (ints beyond
+    64 bits)
+  - orjson writes NaN and infinity as null, where JSONRenderer (STRICT_JSON)
+    raises: a body with a null is checked for them (see _has_non_finite)
+    and rendered by JSONRenderer when it holds one, so the error surfaces
+  - indented output (Accept: application/json; indent=4) and
+    non-default UNICODE_JSON / COMPACT_JSON use JSONRenderer itself
+"""
+import marshal
+import math
+from decimal import Decimal
+
+import numpy as np
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional; JSONRenderer's output is the same, only slower
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+_LINE_SEPARATORS = ("\u2028".encode(), "\u2029".encode())
+_ZERO, _E, _MINUS = np.uint8(ord("0")), np.uint8(ord("e")), np.uint8(ord("-"))
+_MARSHAL_FLOAT = np.uint8(ord("g"))
+
+
+def _floats_may_differ(body):
+    """
+    Whether orjson's body may hold a float repr() writes differently: a
+    number starting "0.0000", or an "e" between a digit and a digit or "-".
+    Strings are scanned too; a false positive only costs the json fallback.
+    The exponent scan is vectorized: a regex over a multi-megabyte list body
+    costs more than orjson itself.
+    """
+    start = body.find(b"0.0000")
+    while start != -1:
+        if not body[start - 1:start].isdigit():  # 0.00001, not 74.00001
+            return True
+        start = body.find(b"0.0000", start + 1)
+    raw = np.frombuffer(body, dtype=np.uint8)
+    e = np.flatnonzero(raw[1:-1] == _E) + 1
+    before, after = raw[e - 1], raw[e + 1]
+    return bool((((before - _ZERO) < 10) & (((after - _ZERO) < 10) | (after == _MINUS))).any())
+
+
+def _has_non_finite(data, native):
+    """
+    Whether `data` holds a NaN or infinite number; only asked when orjson's
+    body holds a null, the only way one shows up there. With `native` data
+    (orjson never called `default`: only dicts, lists, strings, numbers) this
+    is a vectorized scan: marshal (format 2) writes each float as b"g" and 8
+    little-endian bytes, so look for an all-ones exponent. A b"g" inside a
+    string or an int only costs the json fallback. Anything else (datetimes,
+    Decimals, numpy values, serializer lists) is walked in Python.
+    """
+    if native:
+        try:
+            packed = marshal.dumps(data, 2)
+        except ValueError:  # dict / list subclasses
+            pass
+        else:
+            raw = np.frombuffer(packed, dtype=np.uint8)
+            g = np.flatnonzero(raw[:-8] == _MARSHAL_FLOAT)
+            return bool((((raw[g + 8] & 0x7f) == 0x7f) & ((raw[g + 7] & 0xf0) == 0xf0)).any())
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+        elif isinstance(value, (float, np.floating)):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, Decimal):
+            if not value.is_finite():
+                return True
+        elif isinstance(value, np.ndarray) and value.dtype.kind == "f":
+            if not np.isfinite(value).all():
+                return True
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        encoder = self.encoder_class()
+        native = True
+
+        def default(value):
+            nonlocal native
+            native = False
+            return encoder.default(value)
+
+        try:
+            body = orjson.dumps(data, default=default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _floats_may_differ(body) or (b"null" in body and _has_non_finite(data, native)):
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"\xe2" in body:  # lead byte of U+2028 / U+2029; one memchr for ASCII bodies
+            body = body.replace(_LINE_SEPARATORS[0], b"\\u2028").replace(_LINE_SEPARATORS[1], b"\\u2029")
+        return body
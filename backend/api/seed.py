@@ -0,0 +1,236 @@
+"""
+Synthetic data for the `seed` management command.
+
+Rows are generated lazily from generators seeded with `seed`, so the same
+seed and counts always produce the same data, and only one batch is held in
+memory.
+
+Users, profiles and providers (tens of thousands) go through bulk_create.
+Service requests (millions) are generated with NumPy and inserted with a raw
+executemany, with the table's secondary indexes dropped and rebuilt around
+the load: building a model instance per row and updating nine indexes per
+row are what make bulk_create slow at that size. Raw inserts skip signals,
+so the caller invalidates the catalog cache.
+
+Invariants the app relies on are kept:
+  - providers get grid_cell (geo.py) and `updated`
+  - a provider has at most one Accepted/Arrived request (one_active_job_per_provider);
+    a second active pick for a busy provider becomes Completed
+  - confirmation flags match the status
+"""
+import random
+from contextlib import contextmanager, nullcontext
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .bench import CITY_CENTERS, SERVICE_TYPES
+from .geo import grid_cell
+from .models import ACTIVE_JOB_STATUSES, ServiceProvider, ServiceRequest, Service, UserProfile
+
+# Share of requests in each status (roughly what a year of traffic looks like)
+STATUS_WEIGHTS = {"Completed": 70, "Cancelled": 15, "Pending": 10, "Accepted": 3, "Arrived": 2}
+
+REQUEST_COLUMNS = (
+    "service_id", "user_id", "provider_id", "status", "notes", "lat", "lng", "estimated_cost",
+    "arrived_by_provider", "arrived_by_user", "completed_by_provider", "completed_by_user",
+    "created", "updated",
+)
+GENERATE_CHUNK = 10000
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def ensure_services():
+    """The SERVICE_TYPES catalog, creating missing entries; returns [(id, name, price)]."""
+    existing = {s.name: s for s in Service.objects.filter(name__in=SERVICE_TYPES)}
+    Service.objects.bulk_create([
+        Service(name=name, description=f"{name} service", price=500 + 100 * i)
+        for i, name in enumerate(SERVICE_TYPES) if name not in existing
+    ])
+    return list(Service.objects.filter(name__in=SERVICE_TYPES).order_by('id').values_list('id', 'name', 'price'))
+
+
+def user_rows(count, prefix, password="!"):
+    for n in range(count):
+        yield User(username=f"{prefix}-user-{n}", email=f"{prefix}-user-{n}@example.com", password=password)
+
+
+def provider_rows(count, prefix, rng, now):
+    for n in range(count):
+        lat_c, lng_c = CITY_CENTERS[n % len(CITY_CENTERS)]
+        lat, lng = lat_c + rng.gauss(0, 0.4), lng_c + rng.gauss(0, 0.4)
+        yield ServiceProvider(
+            name=f"Provider {n}", email=f"{prefix}-provider-{n}@example.com",
+            type=SERVICE_TYPES[n % len(SERVICE_TYPES)], lat=lat, lng=lng, grid_cell=grid_cell(lat, lng),
+            rating=round(rng.uniform(2.5, 5.0), 1), phone=f"8{n:09d}", updated=now,
+        )
+
+
+def request_rows(count, services, user_ids, provider_ids, seed, now, raw=True, days=365):
+    """
+    Tuples in REQUEST_COLUMNS order, generated GENERATE_CHUNK at a time with
+    NumPy (a Python-level loop per row is most of the cost at a million rows);
+    the fixed chunk keeps the data independent of the insert batch size. provider_ids[i] has type SERVICE_TYPES[i % len]
+    (provider_rows order), so each request goes to a provider of its service type.
+    Timestamps are the backend's raw text format when `raw`, else aware datetimes.
+    """
+    rng = np.random.default_rng(seed)
+    statuses = np.array(list(STATUS_WEIGHTS))
+    weights = np.array(list(STATUS_WEIGHTS.values()), dtype=np.float64)
+    weights /= weights.sum()
+    users = np.asarray(user_ids, dtype=np.int64)
+    all_providers = np.asarray(provider_ids, dtype=np.int64)
+    pools = [all_providers[SERVICE_TYPES.index(name)::len(SERVICE_TYPES)] for _, name, _ in services]
+    pools = [pool if len(pool) else all_providers for pool in pools]
+    service_ids = np.array([sid for sid, _, _ in services], dtype=np.int64)
+    prices = np.array([price for _, _, price in services], dtype=np.float64)
+    centers = np.array(CITY_CENTERS)
+    now_us = int(now.timestamp() * 1_000_000)
+    span_us = days * 86400 * 1_000_000
+    busy = set()
+
+    for start in range(0, count, GENERATE_CHUNK):
+        n = min(GENERATE_CHUNK, count - start)
+        service = rng.integers(len(services), size=n)
+        pick = rng.random(n)
+        provider = np.empty(n, dtype=np.int64)
+        for i, pool in enumerate(pools):
+            mask = service == i
+            provider[mask] = pool[(pick[mask] * len(pool)).astype(np.int64)]
+        status = statuses[rng.choice(len(statuses), size=n, p=weights)]
+        for row in np.flatnonzero(np.isin(status, ACTIVE_JOB_STATUSES)):
+            if provider[row] in busy:
+                status[row] = "Completed"
+            busy.add(provider[row])
+        arrived = np.isin(status, ("Arrived", "Completed")).tolist()
+        completed = (status == "Completed").tolist()
+        created = now_us - (rng.random(n) * span_us).astype(np.int64)
+        updated = np.minimum(now_us, created + (rng.random(n) * 7200e6).astype(np.int64))
+        center = centers[rng.integers(len(centers), size=n)]
+        lat = center[:, 0] + rng.normal(0, 0.3, n)
+        lng = center[:, 1] + rng.normal(0, 0.3, n)
+        yield from zip(
+            service_ids[service].tolist(), users[rng.integers(len(users), size=n)].tolist(), provider.tolist(),
+            status.tolist(), [""] * n, lat.tolist(), lng.tolist(), prices[service].tolist(),
+            arrived, arrived, completed, completed,
+            _timestamps(created, raw), _timestamps(updated, raw),
+        )
+
+
+def _timestamps(micros, raw):
+    stamps = micros.astype('datetime64[us]')
+    if not raw:
+        return [value.replace(tzinfo=dt_timezone.utc) for value in stamps.astype(object)]
+    text = np.datetime_as_string(stamps, unit='us')
+    if connection.vendor == "sqlite":  # Django stores naive UTC "YYYY-MM-DD HH:MM:SS.ffffff"
+        return np.char.replace(text, "T", " ").tolist()
+    return np.char.add(text, "+00:00").tolist()
+
+
+def _secondary_indexes(table):
+    """(name, CREATE statement) of the table's indexes other than its primary key."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+                [table],
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN "
+                "(SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u'))",
+                [table, table],
+            )
+        else:
+            return []
+        return cursor.fetchall()
+
+
+@contextmanager
+def deferred_indexes(model):
+    """
+    Drop the model's secondary indexes for a bulk load and rebuild them after:
+    one sorted build per index is much cheaper than a million random inserts
+    into each. They are rebuilt even if the load fails; rebuilding also
+    re-checks partial unique indexes such as one_active_job_per_provider.
+    """
+    indexes = _secondary_indexes(model._meta.db_table)
+    with connection.cursor() as cursor:
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+def insert_requests_raw(rows):
+    """executemany INSERT of REQUEST_COLUMNS tuples (no model instances, no signals)."""
+    qn = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        qn(ServiceRequest._meta.db_table),
+        ", ".join(qn(c) for c in REQUEST_COLUMNS),
+        ", ".join(["%s"] * len(REQUEST_COLUMNS)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def insert_requests_orm(rows):
+    """bulk_create for comparison; note it overwrites created/updated (auto_now)."""
+    ServiceRequest.objects.bulk_create(
+        [ServiceRequest(**dict(zip(REQUEST_COLUMNS, row))) for row in rows]
+    )
+
+
+def seed(users, providers, requests, seed=42, prefix="seed", batch_size=10000, raw=True,
+         defer_indexes=True, password="!", progress=None):
+    """
+    Insert the synthetic rows in batches of `batch_size`, one transaction per
+    batch, with the request indexes dropped meanwhile (defer_indexes).
+    progress(table, done, total) is called after each batch.
+    Returns {"users": n, "providers": n, "requests": n}.
+    """
+    progress = progress or (lambda *args: None)
+    rng = random.Random(seed)
+    now = timezone.now()
+    services = ensure_services()
+
+    user_ids = []
+    for batch in batched(user_rows(users, prefix, password), batch_size):
+        with transaction.atomic():
+            created = User.objects.bulk_create(batch)
+            UserProfile.objects.bulk_create(
+                [UserProfile(user=u, role="user", phone=f"9{u.id:09d}") for u in created]
+            )
+        user_ids += [u.id for u in created]
+        progress("users", len(user_ids), users)
+
+    provider_ids = []
+    for batch in batched(provider_rows(providers, prefix, rng, now), batch_size):
+        with transaction.atomic():
+            provider_ids += [p.id for p in ServiceProvider.objects.bulk_create(batch)]
+        progress("providers", len(provider_ids), providers)
+
+    insert = insert_requests_raw if raw else insert_requests_orm
+    done = 0
+    if requests and user_ids and provider_ids:
+        with deferred_indexes(ServiceRequest) if defer_indexes else nullcontext():
+            rows = request_rows(requests, services, user_ids, provider_ids, seed, now, raw)
+            for batch in batched(rows, batch_size):
+                with transaction.atomic():
+                    insert(batch)
+                done += len(batch)
+                progress("requests", done, requests)
+    return {"users": len(user_ids), "providers": len(provider_ids), "requests": done}
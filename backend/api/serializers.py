@@ -36,7 +36,7 @@ class UserSerializer(serializers.ModelSerializer):
 class ServiceProviderSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceProvider
-        fields = "__all__"
+        exclude = ['grid_cell', 'updated', 'located']  # internal index / change-tracking columns
         extra_kwargs = {'phone': {'read_only': True}}  # ensure phone is included and not writable
 
 class ServiceSerializer(serializers.ModelSerializer):
@@ -74,3 +74,11 @@ class ServiceRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceRequest
         fields = '__all__'
+
+
+class ProviderJobSerializer(ServiceRequestUserSerializer):
+    """Job card payload for the provider dashboard (request + customer phone)."""
+    user_phone = serializers.CharField(source='user.userprofile.phone', read_only=True, default=None)
+
+    class Meta(ServiceRequestUserSerializer.Meta):
+        fields = ServiceRequestUserSerializer.Meta.fields + ['user_phone']
@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Service, ServiceProvider, ServiceRequest, UserProfile
+from . import authentication, catalog, metrics, ranking, realtime, sync
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    metrics.watch(connection)
+
+
+@receiver(post_save, sender=ServiceProvider)
+def provider_saved(sender, instance, **kwargs):
+    ranking.provider_saved(instance)
+    catalog.invalidate("providers")
+
+
+@receiver(post_delete, sender=ServiceProvider)
+def provider_deleted(sender, instance, **kwargs):
+    ranking.provider_deleted(instance.id)
+    catalog.invalidate("providers")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Password changes (set_password + save) included: the token version is re-checked
+    authentication.invalidate(instance.pk)
+    if kwargs.get('signal') is post_save and (update_fields is None or 'username' in update_fields):
+        # Request payloads embed the username: move the conditional GET version on
+        # (not on login, which saves only last_login)
+        UserProfile.objects.filter(user_id=instance.pk).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    authentication.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def service_changed(sender, instance, **kwargs):
+    catalog.invalidate("services")
+
+
+def _service_name(req):
+    # Only use an already-loaded service; never query from a signal handler
+    service = ServiceRequest._meta.get_field('service').get_cached_value(req, default=None)
+    return service.name if service else None
+
+
+@receiver(post_save, sender=ServiceRequest)
+def request_saved(sender, instance, created, **kwargs):
+    realtime.publish_request("created" if created else "updated", instance, _service_name(instance))
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def request_deleted(sender, instance, **kwargs):
+    service_name = _service_name(instance)
+    if service_name is None:
+        service_name = Service.objects.filter(id=instance.service_id).values_list('name', flat=True).first()
+    sync.record_deletion(instance, service_name)
+    realtime.publish_request("deleted", instance, service_name)
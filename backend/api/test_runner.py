@@ -0,0 +1,15 @@
+"""
+Test runner for `manage.py test` (settings.TEST_RUNNER).
+
+Query budgets (querybudget.py) raise in the test suite unless QUERY_BUDGET
+chose another mode, so an N+1 fails the test that introduced it.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        if not settings.QUERY_BUDGET:
+            settings.QUERY_BUDGET = "raise"
@@ -1,3 +1,1369 @@
-from django.test import TestCase
-
-# Create your tests here.
+import asyncio
+import itertools
+import os
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
+
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test import (
+    AsyncClient, AsyncRequestFactory, LiveServerTestCase, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.database import database_from_env
+
+from . import async_views, authentication, catalog, dispatch, geo, loadtest, locations, metrics, ranking, realtime, renderers, seed, trajectory, transitions
+from .querybudget import QueryBudgetExceeded, query_budget, shape
+from .geo import grid_cell, haversine_km
+from .models import (
+    ACTIVE_JOB_STATUSES, UserProfile, ServiceProvider, ServiceRequest, Service, RealtimeEvent, RequestTombstone, StreamTicket,
+    TrajectoryChunk,
+)
+from .serializers import ProviderJobSerializer, ServiceRequestUserSerializer
+from .views import provider_jobs_queryset
+
+
+class ApiTestCase(TestCase):
+    """Small shared fixture: two services, two providers, a customer and a provider login."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.towing = Service.objects.create(name="Towing", price=1200)
+        cls.battery = Service.objects.create(name="Battery", price=600)
+        cls.provider = ServiceProvider.objects.create(
+            name="Tow Co", email="tow@example.com", type="towing", lat=15.5, lng=73.8, phone="111"
+        )
+        cls.other_provider = ServiceProvider.objects.create(
+            name="Spark", email="spark@example.com", type="Battery", lat=15.4, lng=73.9, phone="222"
+        )
+        cls.customer = User.objects.create_user("alice", "alice@example.com", "pw")
+        UserProfile.objects.create(user=cls.customer, role="user", phone="999")
+        cls.provider_user = User.objects.create_user("tow", "TOW@example.com", "pw")
+        UserProfile.objects.create(user=cls.provider_user, role="provider")
+
+    def setUp(self):
+        # Cached catalog bodies and users may hold rows from a rolled-back test
+        catalog.clear()
+        authentication.clear()
+
+    def make_request(self, service=None, provider=None, status="Pending", user=None):
+        return ServiceRequest.objects.create(
+            service=service or self.towing,
+            user=user or self.customer,
+            provider=provider or self.provider,
+            status=status,
+            lat=15.5,
+            lng=73.8,
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+
+class ProviderJobFeedTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pending = self.make_request(provider=self.other_provider)
+        self.pending_other_type = self.make_request(service=self.battery, provider=self.other_provider)
+        self.active = self.make_request(status="Accepted")
+        self.someone_elses = self.make_request(provider=self.other_provider, status="Accepted")
+        self.done = self.make_request(status="Completed")
+        self.cancelled = self.make_request(status="Cancelled")
+        self.client = self.client_for(self.provider_user)
+
+    def ids(self, bucket):
+        response = self.client.get(f"/api/provider/jobs?bucket={bucket}")
+        self.assertEqual(response.status_code, 200)
+        return [job["id"] for job in response.json()]
+
+    def test_buckets_only_return_the_providers_rows(self):
+        self.assertEqual(self.ids("available"), [self.pending.id])
+        self.assertEqual(self.ids("active"), [self.active.id])
+        self.assertEqual(self.ids("past"), [self.cancelled.id, self.done.id])
+
+    def test_job_payload_includes_customer_phone(self):
+        job = self.client.get("/api/provider/jobs?bucket=active").json()[0]
+        self.assertEqual(job["user"], "alice")
+        self.assertEqual(job["user_phone"], "999")
+        self.assertEqual(job["provider"]["email"], "tow@example.com")
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for _ in range(5):
+            self.make_request(provider=self.other_provider)
+        with self.assertNumQueries(2):
+            self.client.get("/api/provider/jobs?bucket=available")
+
+    def test_invalid_bucket_and_missing_profile(self):
+        self.assertEqual(self.client.get("/api/provider/jobs?bucket=all").status_code, 400)
+        response = self.client_for(self.customer).get("/api/provider/jobs")
+        self.assertEqual(response.status_code, 404)
+
+
+class BulkListQueryTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_request()
+        self.make_request(service=self.battery, provider=self.other_provider, status="Accepted")
+        orphan = self.make_request(status="Completed")
+        orphan.provider = None
+        orphan.save()
+
+    def test_requests_view_query_count_is_constant(self):
+        # One ETag version query (see conditional.py) plus one joined list query
+        with self.assertNumQueries(2):
+            first = self.client_for(self.customer).get("/api/requests").json()
+        for _ in range(10):
+            self.make_request()
+        with self.assertNumQueries(2):
+            second = self.client_for(self.customer).get("/api/requests").json()
+        self.assertEqual(len(second), len(first) + 10)
+
+    def test_requests_view_payload(self):
+        rows = self.client_for(self.customer).get("/api/requests").json()
+        self.assertEqual(rows[0]["user"], "alice")
+        self.assertEqual(rows[0]["user_phone"], "999")
+        self.assertEqual(rows[0]["service"], {
+            "id": self.towing.id, "name": "Towing", "description": "", "price": 1200.0,
+        })
+        self.assertEqual(rows[1]["provider"]["email"], "spark@example.com")
+        self.assertIsNone(rows[2]["provider"])
+
+    def test_my_requests_matches_serializer(self):
+        for _ in range(5):
+            self.make_request()
+        expected = ServiceRequestUserSerializer(
+            ServiceRequest.objects.filter(user=self.customer).order_by('-created'), many=True
+        ).data
+        client = self.client_for(self.customer)
+        with self.assertNumQueries(2):
+            response = client.get("/api/myrequests")
+        self.assertEqual(response.json(), [dict(row) for row in expected])
+
+
+class FastJSONTests(ApiTestCase):
+    PLAIN = [{
+        "coords": [15.5, -0.0, 74.00006], "big": 2 ** 63, "cost": np.float64(0.1),
+        "text": "caf\u00e9 \u2028 \U0001F600 e-5", "none": None, 3: (True, False),
+    }]
+
+    @skipUnless(renderers.orjson, "orjson is not installed")
+    def test_orjson_output_matches_json_renderer(self):
+        plain = [dict(self.PLAIN[0], when=timezone.now())]
+        expected = JSONRenderer().render(plain)
+        with mock.patch.object(JSONRenderer, "render", side_effect=AssertionError("fell back to json")):
+            self.assertEqual(renderers.FastJSONRenderer().render(plain), expected)
+
+        # orjson formats these differently from repr(): rendered by json instead
+        tricky = [1e-05, 2.5e-7, 1e16, 2 ** 70]
+        self.assertEqual(renderers.FastJSONRenderer().render(tricky), b"[1e-05,2.5e-07,1e+16,1180591620717411303424]")
+
+    @skipUnless(renderers.orjson, "orjson is not installed")
+    def test_non_finite_floats_raise_like_json_renderer(self):
+        for bad in (float("nan"), float("inf"), -float("inf"), np.float64("nan"), Decimal("NaN")):
+            with self.subTest(bad=bad), self.assertRaises(ValueError):
+                renderers.FastJSONRenderer().render([{"cost": None}, {"cost": bad}])
+        when = timezone.now()  # not marshallable: checked by the Python walk
+        self.assertEqual(renderers.FastJSONRenderer().render([{"cost": None, "lat": 1.5e300, "at": when}]),
+                         JSONRenderer().render([{"cost": None, "lat": 1.5e300, "at": when}]))
+
+    def test_output_without_orjson_matches_json_renderer(self):
+        plain = [dict(self.PLAIN[0], when=timezone.now())]
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(renderers.FastJSONRenderer().render(plain), JSONRenderer().render(plain))
+
+    def test_provider_jobs_body_matches_serializer(self):
+        walk_in = User.objects.create_user("bob", "bob@example.com", "pw")  # no profile: user_phone null
+        self.make_request(status="Completed")
+        self.make_request(status="Cancelled", user=walk_in)
+        expected = JSONRenderer().render(
+            ProviderJobSerializer(provider_jobs_queryset(self.provider, "past"), many=True).data
+        )
+        response = self.client_for(self.provider_user).get("/api/provider/jobs?bucket=past")
+        self.assertEqual(response.content, expected)
+        self.assertIn(b'"user_phone":null', response.content)
+
+
+class KeysetPaginationTests(ApiTestCase):
+    def walk(self, client, url, page_size):
+        """Follow `next` cursors to the end, checking each page costs the same two queries."""
+        ids, cursor = [], None
+        while True:
+            params = {"page_size": page_size}
+            if cursor:
+                params["cursor"] = cursor
+            with CaptureQueriesContext(connection) as queries:
+                body = client.get(url, params).json()
+            self.assertEqual(len(queries), 2)  # ETag version + page
+            ids += [row["id"] for row in body["results"]]
+            cursor = body["next"]
+            if not cursor:
+                return ids
+
+    def test_my_requests_pages_cover_everything_newest_first(self):
+        made = [self.make_request() for _ in range(7)]
+        # Same `created` for several rows: the id tie-breaker must keep pages disjoint
+        ServiceRequest.objects.filter(id__in=[r.id for r in made[2:5]]).update(created=made[2].created)
+        client = self.client_for(self.customer)
+        expected = list(
+            ServiceRequest.objects.filter(user=self.customer)
+            .order_by('-created', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.walk(client, "/api/myrequests", 2), expected)
+
+    def test_requests_and_providers_paginate_by_id(self):
+        made = [self.make_request() for _ in range(5)]
+        client = self.client_for(self.customer)
+        self.assertEqual(self.walk(client, "/api/requests", 2), [r.id for r in made])
+        self.assertEqual(self.walk(client, "/api/providers", 1), [self.provider.id, self.other_provider.id])
+
+    def test_unpaginated_list_and_bad_cursor(self):
+        self.make_request()
+        client = self.client_for(self.customer)
+        self.assertIsInstance(client.get("/api/users").json(), list)
+        self.assertEqual(client.get("/api/requests", {"cursor": "not-a-cursor"}).status_code, 400)
+
+
+class NearbyProvidersTests(ApiTestCase):
+    def test_returns_k_nearest_of_type_in_distance_order(self):
+        far = ServiceProvider.objects.create(
+            name="Far Tow", email="far@example.com", type="Towing", lat=19.0, lng=72.8, phone="3"
+        )
+        near = ServiceProvider.objects.create(
+            name="Near Tow", email="near@example.com", type="TOWING", lat=15.501, lng=73.801, phone="4"
+        )
+        rows = APIClient().get("/api/providers/nearby", {"lat": 15.5, "lng": 73.8, "type": "towing", "k": 2}).json()
+        self.assertEqual([r["id"] for r in rows], [self.provider.id, near.id])
+        self.assertLess(rows[0]["distance_km"], rows[1]["distance_km"])
+
+        # Fewer matches than k: the search widens until it has seen everything
+        rows = APIClient().get("/api/providers/nearby", {"lat": 15.5, "lng": 73.8, "type": "towing", "k": 10}).json()
+        self.assertEqual([r["id"] for r in rows], [self.provider.id, near.id, far.id])
+
+    def test_grid_cell_follows_location_changes(self):
+        self.provider.lat, self.provider.lng = -33.9, 151.2
+        self.provider.save()
+        rows = APIClient().get("/api/providers/nearby", {"lat": -33.9, "lng": 151.2, "k": 1}).json()
+        self.assertEqual(rows[0]["id"], self.provider.id)
+
+    def test_search_wraps_at_antimeridian(self):
+        east = ServiceProvider.objects.create(
+            name="Date Line Tow", email="dl@example.com", type="Winch", lat=0.0, lng=179.99, phone="5"
+        )
+        with self.assertNumQueries(2):  # centre cell, then the block reaching across the antimeridian
+            ranked = geo.nearest(ServiceProvider.objects.filter(type="Winch"), 0.0, -179.99, 1)
+        self.assertEqual([p.id for _, p in ranked], [east.id])
+
+    def test_few_matches_fall_back_to_one_scan(self):
+        with CaptureQueriesContext(connection) as ctx:
+            ranked = geo.nearest(ServiceProvider.objects.all(), 15.5, 73.8, 10)
+        self.assertEqual([p.id for _, p in ranked], [self.provider.id, self.other_provider.id])
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+
+    def test_requires_coordinates(self):
+        self.assertEqual(APIClient().get("/api/providers/nearby", {"lat": 1}).status_code, 400)
+
+
+class ProviderRankingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        ranking.reload_provider_index()
+        self.index = ranking.provider_index()
+
+    def test_rank_matches_haversine_and_rating_penalty(self):
+        ranked = self.index.rank(15.45, 73.85, k=2)
+        self.assertEqual(len(ranked), 2)
+        for provider_id, distance, score in ranked:
+            provider = ServiceProvider.objects.get(id=provider_id)
+            self.assertAlmostEqual(distance, haversine_km(15.45, 73.85, provider.lat, provider.lng), places=6)
+            self.assertAlmostEqual(score, distance + ranking.RATING_WEIGHT_KM * (5 - provider.rating), places=6)
+        self.assertLessEqual(ranked[0][2], ranked[1][2])
+
+    def test_type_filter_and_signal_updates(self):
+        self.assertEqual([r[0] for r in self.index.rank(15.5, 73.8, k=5, type_=" Towing ")], [self.provider.id])
+
+        extra = ServiceProvider.objects.create(
+            name="Tow 2", email="tow2@example.com", type="towing", lat=15.5, lng=73.8, rating=5, phone="5"
+        )
+        self.assertEqual(self.index.rank(15.5, 73.8, k=1, type_="towing")[0][0], extra.id)
+        extra.delete()
+        self.assertEqual([r[0] for r in self.index.rank(15.5, 73.8, k=5, type_="towing")], [self.provider.id])
+
+    def test_rank_many_equals_rank_per_point(self):
+        points = [(15.5, 73.8), (15.4, 73.9), (20.0, 70.0)]
+        batch = self.index.rank_many([p[0] for p in points], [p[1] for p in points], k=2)
+        self.assertEqual(batch, [self.index.rank(lat, lng, k=2) for lat, lng in points])
+
+
+class DispatchTests(ApiTestCase):
+    def test_optimal_assignment_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        for size in [(3, 3), (2, 4), (4, 2), (5, 5)]:
+            cost = rng.uniform(0, 100, size=size)
+            pairs = dispatch.optimal_assignment(cost)
+            self.assertEqual(len(pairs), min(size))
+            n, m = size
+            if n <= m:
+                best = min(sum(cost[i, cols[i]] for i in range(n)) for cols in itertools.permutations(range(m), n))
+            else:
+                best = min(sum(cost[rows[j], j] for j in range(m)) for rows in itertools.permutations(range(n), m))
+            self.assertAlmostEqual(sum(cost[i, j] for i, j in pairs), best)
+            self.assertLessEqual(best, sum(cost[i, j] for i, j in dispatch.greedy_assignment(cost)) + 1e-9)
+
+    def test_cycle_assigns_idle_providers_of_matching_type(self):
+        busy_tow = ServiceProvider.objects.create(
+            name="Busy", email="busy@example.com", type="Towing", lat=15.5, lng=73.8, rating=5, phone="6"
+        )
+        self.make_request(provider=busy_tow, status="Accepted")
+        tow_job = self.make_request(provider=self.other_provider)
+        battery_job = self.make_request(service=self.battery, provider=self.provider)
+        far_job = self.make_request()
+        far_job.lat, far_job.lng = 28.6, 77.2
+        far_job.save()
+
+        for mode in dispatch.DISPATCH_MODES:
+            with self.subTest(mode=mode):
+                stats = dispatch.run_cycle(mode, max_km=50, dry_run=True)
+                self.assertEqual(stats["planned"], 2)
+        stats = dispatch.run_cycle("optimal", max_km=50)
+        self.assertEqual(stats["assigned"], 2)
+
+        tow_job.refresh_from_db()
+        battery_job.refresh_from_db()
+        far_job.refresh_from_db()
+        self.assertEqual((tow_job.status, tow_job.provider_id), ("Accepted", self.provider.id))
+        self.assertEqual((battery_job.status, battery_job.provider_id), ("Accepted", self.other_provider.id))
+        self.assertEqual(far_job.status, "Pending")
+        self.assertEqual(dispatch.run_cycle("greedy", max_km=5000)["planned"], 0)
+
+
+class RealtimeTests(ApiTestCase):
+    @override_settings(ASGI_PROFILE=True)
+    def test_request_saves_publish_to_user_provider_and_type_channels(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            req = self.make_request()
+        event = RealtimeEvent.objects.get()
+        self.assertEqual(event.payload["event"], "request.created")
+        self.assertEqual(event.channels, f"user:{self.customer.id} provider:{self.provider.id} type:towing")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            req.status = "Accepted"
+            req.save()
+        self.assertEqual(RealtimeEvent.objects.latest('id').payload["status"], "Accepted")
+
+    async def test_database_broker_fans_out_to_subscribers(self):
+        broker = realtime.DatabaseBroker()
+        await sync_to_async(broker.poll_once)()  # remembers the current high-water mark
+        mine = realtime.hub.subscribe([f"user:{self.customer.id}"])
+        other = realtime.hub.subscribe(["user:0"])
+        try:
+            await sync_to_async(broker.publish)({"event": "request.updated", "channels": [f"user:{self.customer.id}"]})
+            self.assertEqual(await sync_to_async(broker.poll_once)(), 1)
+            event = await asyncio.wait_for(mine.queue.get(), timeout=1)
+            self.assertEqual(event["event"], "request.updated")
+            self.assertTrue(other.queue.empty())
+        finally:
+            realtime.hub.unsubscribe(mine)
+            realtime.hub.unsubscribe(other)
+
+    def test_nothing_is_published_without_asgi(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            req = self.make_request()
+            req.status = "Accepted"
+            req.save()
+        self.assertFalse(RealtimeEvent.objects.exists())
+
+    @override_settings(REALTIME_EVENT_TTL=60)
+    def test_writers_prune_expired_events(self):
+        broker = realtime.DatabaseBroker()
+        broker.publish({"event": "request.updated", "channels": ["user:0"]})
+        RealtimeEvent.objects.update(created=timezone.now() - timedelta(seconds=120))
+        broker._last_prune = float("-inf")  # as if the last prune were a TTL ago
+        broker.publish({"event": "request.updated", "channels": ["user:0"]})
+        self.assertEqual(RealtimeEvent.objects.count(), 1)
+
+    def test_no_stream_without_asgi(self):
+        # Under WSGI a stream would hold a worker forever: refuse at once so clients keep polling
+        self.assertEqual(self.client_for(self.customer).post("/api/events/ticket").status_code, 501)
+        self.assertEqual(self.client.get("/api/events").status_code, 501)
+
+    @override_settings(ASGI_PROFILE=True)
+    def test_stream_tickets_are_single_use(self):
+        self.assertEqual(APIClient().post("/api/events/ticket").status_code, 401)
+        ticket = self.client_for(self.customer).post("/api/events/ticket").json()["ticket"]
+        self.assertEqual(realtime.redeem_ticket(ticket), self.customer)
+        self.assertIsNone(realtime.redeem_ticket(ticket))
+
+        ticket = realtime.issue_ticket(self.customer)
+        StreamTicket.objects.update(expires=timezone.now())
+        self.assertIsNone(realtime.redeem_ticket(ticket))
+
+    @override_settings(REALTIME_BROKER="local", ASGI_PROFILE=True)
+    async def test_event_stream(self):
+        response = await self.async_client.get("/api/events")
+        self.assertEqual(response.status_code, 401)
+        token = str(AccessToken.for_user(self.provider_user))
+        response = await self.async_client.get("/api/events", {"token": token})
+        self.assertEqual(response.status_code, 401)  # access tokens never travel in the URL
+
+        ticket = await sync_to_async(realtime.issue_ticket)(self.provider_user)
+        response = await self.async_client.get("/api/events", {"ticket": ticket})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+        realtime.broker().publish({"event": "request.created", "channels": ["type:towing"], "id": 7})
+        chunk = await asyncio.wait_for(anext(stream), timeout=1)
+        self.assertEqual(chunk, b'event: request.created\ndata: {"event": "request.created", "id": 7}\n\n')
+        await stream.aclose()
+
+
+class ConditionalGetTests(ApiTestCase):
+    def assert_revalidates(self, client, url):
+        """
+        First GET returns an ETag; repeating it with If-None-Match is a 304 from one
+        version query (none for the cached catalog lists).
+        """
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+        with self.assertNumQueries(0 if url in ("/api/services", "/api/providers") else 1):
+            repeat = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        return etag
+
+    def test_unchanged_lists_and_detail_return_304(self):
+        req = self.make_request()
+        client = self.client_for(self.customer)
+        for url in ["/api/requests", "/api/myrequests", f"/api/requests/{req.id}",
+                    "/api/services", "/api/providers"]:
+            with self.subTest(url=url):
+                self.assert_revalidates(client, url)
+
+    def test_changes_invalidate_the_etag(self):
+        req = self.make_request()
+        client = self.client_for(self.customer)
+        etags = {url: self.assert_revalidates(client, url)
+                 for url in ["/api/myrequests", f"/api/requests/{req.id}", "/api/providers"]}
+
+        req.status = "Accepted"
+        req.save()
+        self.provider.name = "Tow Co Ltd"
+        self.provider.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_customer_edits_invalidate_the_etag(self):
+        req = self.make_request()
+        client = self.client_for(self.customer)
+        urls = ["/api/requests", "/api/myrequests", f"/api/requests/{req.id}"]
+
+        etags = {url: self.assert_revalidates(client, url) for url in urls}
+        self.customer.save(update_fields=['last_login'])  # a login changes nothing in the payloads
+        for url in urls:
+            with self.subTest(url=url, edit="login"):
+                self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 304)
+
+        profile = self.customer.userprofile
+        profile.phone = "888"
+        profile.save()
+        for url in urls:
+            with self.subTest(url=url, edit="phone"):
+                self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200)
+
+        etags = {url: self.assert_revalidates(client, url) for url in urls}
+        self.customer.username = "alice2"
+        self.customer.save()
+        for url in urls:
+            with self.subTest(url=url, edit="username"):
+                self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200)
+
+        # Deleting a row changes the count even though max(updated) may not move
+        etag = self.assert_revalidates(client, "/api/requests")
+        ServiceRequest.objects.filter(id=req.id).delete()
+        self.assertEqual(client.get("/api/requests", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_is_per_user_and_query(self):
+        self.make_request()
+        client = self.client_for(self.customer)
+        etag = client.get("/api/myrequests")["ETag"]
+        self.assertNotEqual(client.get("/api/myrequests?status=active")["ETag"], etag)
+        self.assertNotEqual(self.client_for(self.provider_user).get("/api/myrequests")["ETag"], etag)
+
+
+class CatalogCacheTests(ApiTestCase):
+    def test_steady_state_reads_skip_the_database(self):
+        client = APIClient()
+        first = client.get("/api/services")
+        self.assertEqual([s["name"] for s in first.json()], ["Towing", "Battery"])
+        with self.assertNumQueries(0):
+            again = client.get("/api/services")
+            client.get("/api/services")
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(again["Content-Type"], "application/json")
+        self.assertEqual(first["ETag"], again["ETag"])
+        stats = client.get("/api/cache/stats").json()
+        self.assertEqual((stats["misses"], stats["local_hits"]), (1, 2))
+
+    def test_body_matches_the_uncached_serializer_output(self):
+        client = APIClient()
+        expected = [{"id": s.id, "name": s.name, "description": s.description, "price": s.price}
+                    for s in Service.objects.order_by("id")]
+        self.assertEqual(client.get("/api/services").json(), expected)
+        paged = client.get("/api/providers", {"page_size": 10}).json()["results"]
+        self.assertEqual(client.get("/api/providers").json(), paged)
+
+    def test_model_signals_invalidate(self):
+        client = APIClient()
+        client.get("/api/providers")
+        client.get("/api/services")
+        self.provider.name = "Tow Co Ltd"
+        self.provider.save()
+        self.battery.delete()
+        self.assertIn("Tow Co Ltd", [p["name"] for p in client.get("/api/providers").json()])
+        self.assertEqual([s["name"] for s in client.get("/api/services").json()], ["Towing"])
+
+    def test_other_process_rebuild_is_shared(self):
+        with TemporaryDirectory() as location, override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location,
+        }}):
+            APIClient().get("/api/services")
+            with mock.patch.object(catalog, "_local", catalog.OrderedDict()):  # a fresh worker
+                with self.assertNumQueries(0):
+                    APIClient().get("/api/services")
+        self.assertEqual(catalog.stats()["shared_hits"], 1)
+
+    def test_per_process_cache_expires_local_entries(self):
+        # LocMemCache: another worker's write never reaches this one, so entries must expire
+        self.assertFalse(catalog.shared_cache())
+        client = APIClient()
+        etag = client.get("/api/providers")["ETag"]
+        catalog.clear()  # a worker with a different generation token agrees on the ETag
+        self.assertEqual(client.get("/api/providers")["ETag"], etag)
+
+        ServiceProvider.objects.filter(id=self.provider.id).update(name="Tow Co Ltd")  # no signal here
+        self.assertNotIn("Tow Co Ltd", client.get("/api/providers").content.decode())
+
+        later = catalog.time.monotonic() + settings.CATALOG_LOCAL_TTL
+        with mock.patch.object(catalog.time, "monotonic", return_value=later):
+            self.assertIn("Tow Co Ltd", client.get("/api/providers").content.decode())
+
+
+class JWTUserCacheTests(ApiTestCase):
+    def bearer(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def test_cached_user_saves_the_lookup_until_it_changes(self):
+        client = self.bearer(AccessToken.for_user(self.customer))
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(client.get("/api/myrequests").status_code, 200)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(client.get("/api/myrequests").status_code, 200)
+        self.assertEqual(len(first) - len(second), 1)
+
+        self.customer.first_name = "Alice"
+        self.customer.save()
+        with CaptureQueriesContext(connection) as third:
+            client.get("/api/myrequests")
+        self.assertEqual(len(third), len(first))
+        stats = authentication.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["invalidations"]), (1, 2, 1))
+
+    def test_password_change_revokes_cached_tokens(self):
+        client = self.bearer(AccessToken.for_user(self.customer))
+        self.assertEqual(client.get("/api/myrequests").status_code, 200)
+        self.customer.set_password("new password")
+        self.customer.save()
+        self.assertEqual(client.get("/api/myrequests").status_code, 401)
+        self.assertEqual(self.bearer(AccessToken.for_user(self.customer)).get("/api/myrequests").status_code, 200)
+
+    def test_request_users_do_not_share_loaded_relations(self):
+        token = AccessToken.for_user(self.customer)
+        auth = authentication.CachedJWTAuthentication()
+        first = auth.get_user(token)
+        first.userprofile.role = "provider"  # loads the profile into this request's user only
+        second = auth.get_user(token)
+        self.assertIsNot(second, first)
+        self.assertNotIn("userprofile", second._state.fields_cache)
+        self.assertEqual(second.userprofile.role, "user")
+
+    @override_settings(JWT_IDENTITY_CLAIMS=True, LOCATION_FLUSH_INTERVAL=0)
+    def test_identity_claims_let_hot_paths_skip_lookups(self):
+        login = APIClient().post("/api/users/login", {"email": "TOW@example.com", "password": "pw"}, format="json")
+        token = AccessToken(login.json()["access"])
+        self.assertEqual((token["role"], token["provider_id"]), ("provider", self.provider.id))
+
+        client = self.bearer(token)
+        ping = {"samples": [{"lat": 15.6, "lng": 73.9}]}
+        self.assertEqual(client.post("/api/providers/location", ping, format="json").status_code, 202)
+        with self.assertNumQueries(0):
+            self.assertEqual(client.post("/api/providers/location", ping, format="json").status_code, 202)
+        locations.buffer.clear()
+        trajectory.recorder.clear()
+
+
+class LoginTests(ApiTestCase):
+    def login(self, email, password):
+        return APIClient().post("/api/users/login", {"email": email, "password": password}, format="json")
+
+    def test_login_is_one_lookup(self):
+        with self.assertNumQueries(2):  # the user and profile, and the refresh token's OutstandingToken row
+            response = self.login("alice@example.com", "pw")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["user_id"], response.json()["role"]), (self.customer.id, "user"))
+        self.assertEqual(self.login("alice@example.com", "wrong").status_code, 400)
+        self.assertEqual(self.login("nobody@example.com", "pw").status_code, 400)
+
+    def test_hash_iterations_follow_the_setting(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.assertTrue(make_password("pw").startswith("pbkdf2_sha256$1000$"))
+            # A hash made with another count still verifies, and is upgraded on login
+            self.assertEqual(self.login("alice@example.com", "pw").status_code, 200)
+        self.customer.refresh_from_db()
+        self.assertTrue(self.customer.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertEqual(self.login("alice@example.com", "pw").status_code, 200)
+
+
+class AsyncViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.req = self.make_request()
+        self.make_request(service=self.battery, status="Completed")
+        self.token = f"Bearer {AccessToken.for_user(self.customer)}"
+
+    def call(self, view, path, method="get", token=None, headers=None, data=None, **kwargs):
+        request = getattr(AsyncRequestFactory(), method)(
+            path, data, content_type="application/json", headers={"authorization": token or self.token, **(headers or {})},
+        )
+        response = async_to_sync(view)(request, **kwargs)
+        if hasattr(response, "render"):  # a DRF response from the sync view; the handler would render it
+            response.render()
+        return response
+
+    def test_responses_match_the_sync_views(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=self.token)
+        cases = [
+            (async_views.health, "/api/health", {}),
+            (async_views.services_view, "/api/services", {}),
+            (async_views.providers_view, "/api/providers", {}),
+            (async_views.providers_view, "/api/providers?page_size=1", {}),
+            (async_views.my_requests_view, "/api/myrequests", {}),
+            (async_views.my_requests_view, "/api/myrequests?status=active", {}),
+            (async_views.request_view, f"/api/requests/{self.req.id}", {"request_id": self.req.id}),
+            (async_views.request_view, "/api/requests/999", {"request_id": 999}),
+        ]
+        for view, path, kwargs in cases:
+            with self.subTest(path=path):
+                expected = client.get(path)
+                response = self.call(view, path, **kwargs)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response.get("ETag"), expected.get("ETag"))
+
+    def test_other_requests_go_to_the_sync_views(self):
+        self.assertEqual(self.call(async_views.my_requests_view, "/api/myrequests", token="Bearer x").status_code, 401)
+        response = self.call(async_views.services_view, "/api/services", method="post", data={"name": "Fuel"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Service.objects.count(), 3)
+
+    def test_cached_reads_skip_the_database(self):
+        self.call(async_views.services_view, "/api/services")
+        first = self.call(async_views.my_requests_view, "/api/myrequests")
+        with self.assertNumQueries(0):
+            self.call(async_views.services_view, "/api/services")
+            self.call(async_views.health, "/api/health")
+        with self.assertNumQueries(2):  # version + rows; the user comes from the JWT user cache
+            self.call(async_views.my_requests_view, "/api/myrequests")
+        with self.assertNumQueries(1):
+            response = self.call(async_views.my_requests_view, "/api/myrequests", headers={"if-none-match": first["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_metrics_middleware_counts_queries_in_async_mode(self):
+        metrics.clear()
+        response = async_to_sync(AsyncClient().get)(f"/api/requests/{self.req.id}", headers={"authorization": self.token})
+        self.assertEqual(response.status_code, 200)
+        series = metrics.snapshot()[("api/requests/<int:request_id>", "GET")]
+        self.assertGreaterEqual(series["queries"]["sum"], 2)
+
+    def test_asgi_middleware_matches_the_stock_stack(self):
+        client = AsyncClient()
+        expected = async_to_sync(client.get)("/api/health")
+        with override_settings(MIDDLEWARE=settings.ASGI_MIDDLEWARE):
+            response = async_to_sync(client.get)("/api/health")
+            self.assertEqual(sorted(response.headers.items()), sorted(expected.headers.items()))
+            # The admin's session round trip: saved after login, loaded on the next request
+            User.objects.create_superuser("root", "root@example.com", "pw")
+            login = async_to_sync(client.post)("/admin/login/?next=/admin/", {"username": "root", "password": "pw"})
+            self.assertEqual((login.status_code, login["Location"]), (302, "/admin/"))
+            self.assertEqual(async_to_sync(client.get)("/admin/").status_code, 200)
+
+
+class ConfirmationTests(ApiTestCase):
+    def confirm(self, req, step, role):
+        return self.client_for(self.customer).patch(
+            f"/api/requests/{req.id}/confirm-{step}", {"role": role}, format="json")
+
+    def test_both_roles_move_the_status(self):
+        req = self.make_request(status="Accepted")
+        with self.assertNumQueries(2):  # conditional UPDATE + joined read for the response
+            first = self.confirm(req, "arrived", "provider")
+        self.assertEqual((first.status_code, first.json()["status"]), (200, "Accepted"))
+        self.assertTrue(first.json()["arrived_by_provider"])
+        second = self.confirm(req, "arrived", "user").json()
+        self.assertEqual(second["status"], "Arrived")
+        self.assertEqual(second["provider"]["id"], self.provider.id)
+        self.assertEqual(self.confirm(req, "completed", "user").json()["status"], "Arrived")
+        req.refresh_from_db()
+        self.assertIsNone(req.completed_at)
+        self.assertEqual(self.confirm(req, "completed", "provider").json()["status"], "Completed")
+        req.refresh_from_db()
+        self.assertEqual(req.status, "Completed")
+        self.assertGreaterEqual(req.completed_at, req.accepted_at)  # the job's GPS window (trajectory.py)
+
+    def test_pending_request_does_not_become_active(self):
+        req = self.make_request()
+        self.confirm(req, "arrived", "user")
+        self.assertEqual(self.confirm(req, "arrived", "provider").json()["status"], "Pending")
+
+    def test_bad_role_and_missing_request(self):
+        req = self.make_request(status="Accepted")
+        self.assertEqual(self.confirm(req, "arrived", "admin").status_code, 400)
+        req.delete()
+        self.assertEqual(self.confirm(req, "arrived", "user").status_code, 404)
+
+
+class AcceptJobTests(ApiTestCase):
+    def accept(self, req, email="TOW@example.com"):
+        return self.client_for(self.provider_user).put(
+            f"/api/requests/{req.id}", {"status": "Accepted", "provider": email}, format="json")
+
+    def test_accept_is_one_update_and_idempotent(self):
+        req = self.make_request(provider=self.other_provider)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.accept(req)
+        statements = [q["sql"].split()[0] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(statements, ["UPDATE", "SELECT"])  # conditional UPDATE + joined read for the response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["status"], response.json()["provider"]["id"]), ("Accepted", self.provider.id))
+        self.assertEqual(self.accept(req).status_code, 200)
+
+    def test_rejections(self):
+        active = self.make_request(status="Accepted")
+        req = self.make_request(provider=self.other_provider)
+        self.assertEqual(self.accept(req).json()["error"],
+                         "You must complete existing active job before accepting a new request.")
+        self.assertEqual(self.accept(req, "nobody@example.com").status_code, 400)
+        self.assertEqual(self.accept(active, "spark@example.com").status_code, 409)
+        self.assertEqual(self.client_for(self.provider_user).put(
+            f"/api/requests/{req.id + 100}", {"status": "Accepted", "provider": "tow@example.com"},
+            format="json").status_code, 404)
+        req.refresh_from_db()
+        self.assertEqual((req.status, req.provider_id), ("Pending", self.other_provider.id))
+
+        # Any other path to a second active job is refused by one_active_job_per_provider
+        req.provider = self.provider
+        req.save()
+        response = self.client_for(self.provider_user).put(
+            f"/api/requests/{req.id}", {"status": "Arrived"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_edit_cannot_make_a_second_active_job(self):
+        self.make_request(status="Accepted")
+        req = self.make_request(status="Pending")
+        response = self.client_for(self.customer).patch(
+            f"/api/myrequests/{req.id}", {"status": "Arrived"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], transitions.ACCEPT_ERRORS[transitions.ACCEPT_BUSY])
+        req.refresh_from_db()
+        self.assertEqual(req.status, "Pending")
+
+    def test_provider_that_is_not_a_string(self):
+        req = self.make_request(provider=self.other_provider)
+        for provider in (42, ["tow@example.com"], {"email": "tow@example.com"}, None):
+            response = self.accept(req, provider)
+            self.assertEqual((response.status_code, response.json()["error"]),
+                             (400, transitions.ACCEPT_ERRORS[transitions.ACCEPT_NO_PROVIDER]))
+
+
+class BatchRequestTests(ApiTestCase):
+    def batch(self, method, items):
+        return getattr(self.client_for(self.provider_user), method)(
+            "/api/requests/batch", {"requests": items}, format="json")
+
+    @override_settings(ASGI_PROFILE=True)
+    def test_create_batch_uses_fixed_queries_and_reports_each_item(self):
+        items = [{"service": self.towing.id, "user": self.customer.id, "provider": self.provider.id,
+                  "lat": 15.5, "lng": 73.8}] * 20
+        items += [{"service": 999, "user": self.customer.id, "provider": self.provider.id},
+                  {"service": self.battery.id, "user": self.customer.id, "provider": self.other_provider.id,
+                   "lat": "x", "lng": 1}]
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.batch("post", items)
+        queries = [q["sql"] for q in ctx.captured_queries
+                   if "SAVEPOINT" not in q["sql"] and "api_realtimeevent\" WHERE" not in q["sql"]]  # not the outbox prune
+        self.assertEqual(len(queries), 5)  # 3 in_bulk + bulk_create + realtime events
+        body = response.json()
+        self.assertEqual((response.status_code, body["succeeded"], body["failed"]), (200, 20, 2))
+        self.assertEqual([r["status"] for r in body["results"][-3:]], [201, 404, 400])
+        self.assertEqual(ServiceRequest.objects.count(), 20)
+        self.assertEqual(RealtimeEvent.objects.count(), 20)
+
+    def test_batch_rows_match_single_creates(self):
+        item = {"service": self.towing.id, "user": self.customer.id, "provider": self.provider.id,
+                "lat": 15.5, "lng": 73.8}
+        single = self.client_for(self.provider_user).post("/api/requests", item, format="json").json()
+        batched = self.batch("post", [item]).json()["results"][0]
+        fields = ['service', 'user', 'provider', 'status', 'lat', 'lng', 'estimated_cost', 'notes']
+        rows = ServiceRequest.objects.filter(id__in=[single["id"], batched["id"]]).order_by('id').values(*fields)
+        self.assertEqual(rows[0], rows[1])
+        self.assertEqual(rows[1]["estimated_cost"], 1200.0)
+
+    def test_update_batch_keeps_one_active_job_per_provider(self):
+        active = self.make_request(status="Accepted")
+        first, second = self.make_request(provider=self.other_provider), self.make_request(provider=self.other_provider)
+        body = self.batch("patch", [
+            {"id": active.id, "status": "Completed"},                         # frees tow's slot ...
+            {"id": first.id, "status": "Accepted", "provider": "TOW@example.com"},  # ... for this one
+            {"id": second.id, "status": "Accepted", "provider": "tow@example.com"},  # busy again
+            {"id": first.id, "notes": "twice"},
+            {"id": 999, "notes": "missing"},
+            {"id": second.id + 1000},
+        ]).json()
+        self.assertEqual([r["status"] for r in body["results"]], [200, 200, 400, 400, 404, 404])
+        self.assertEqual(list(ServiceRequest.objects.filter(provider=self.provider, status__in=["Accepted", "Arrived"])
+                              .values_list('id', flat=True)), [first.id])
+        second.refresh_from_db()
+        self.assertEqual(second.status, "Pending")
+
+        self.assertEqual(self.batch("patch", [{"id": active.id, "status": "Lost"}]).json()["results"][0]["status"], 400)
+        self.assertEqual(self.batch("patch", []).status_code, 400)
+        with override_settings(API_BATCH_MAX_ITEMS=1):
+            self.assertEqual(self.batch("patch", [{"id": 1}, {"id": 2}]).status_code, 400)
+
+
+@override_settings(LOCATION_FLUSH_INTERVAL=0)  # flush by hand, no background thread
+class LocationIngestTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        locations.buffer.clear()
+        trajectory.recorder.clear()
+
+    def post(self, samples):
+        return self.client_for(self.provider_user).post(
+            "/api/providers/location", {"samples": samples}, format="json")
+
+    def test_pings_are_coalesced_into_one_bulk_write(self):
+        ranking.reload_provider_index()
+        response = self.post([{"lat": 15.61, "lng": 73.91, "ts": 100}, {"lat": 15.62, "lng": 73.92, "ts": 101}])
+        self.assertEqual((response.status_code, response.json()), (202, {"accepted": 2, "stale": 0}))
+        self.assertEqual(self.post([{"lat": 1, "lng": 1, "ts": 99}]).json(), {"accepted": 0, "stale": 1})
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.lat, 15.5)  # nothing written until the flush
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(locations.buffer.flush(), 1)
+        # positions (one executemany) + `updated` of the providers that moved
+        self.assertEqual(len([q for q in ctx.captured_queries if "UPDATE" in q["sql"]]), 2)
+        self.provider.refresh_from_db()
+        self.assertEqual((self.provider.lat, self.provider.lng), (15.62, 73.92))
+        self.assertEqual(self.provider.grid_cell, grid_cell(15.62, 73.92))
+        self.assertEqual(ranking.provider_index().rank(15.62, 73.92, k=1)[0][0], self.provider.id)
+        self.assertEqual(locations.buffer.flush(), 0)
+
+        stats = self.client.get("/api/providers/location/stats").json()
+        self.assertEqual((stats["samples"], stats["stale"], stats["rows_written"]), (3, 1, 1))
+        self.assertEqual(stats["pending_providers"], 0)
+        self.assertIsNotNone(stats["last_flush"]["max_lag_ms"])
+
+    def test_catalog_and_etags_move_on_at_the_publish_interval(self):
+        self.post([{"lat": 15.61, "lng": 73.91, "ts": 100}])
+        locations.buffer.flush()  # first flush publishes
+        client = APIClient()
+        first = client.get("/api/providers")
+        self.assertIn(15.61, [p["lat"] for p in first.json()])
+
+        self.post([{"lat": 15.7, "lng": 73.95, "ts": 102}])
+        self.assertEqual(locations.buffer.flush(), 1)
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.lat, 15.7)  # written, not yet published
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get("/api/providers", HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        later = locations.time.monotonic() + settings.LOCATION_PUBLISH_INTERVAL
+        with mock.patch.object(locations.time, "monotonic", return_value=later):
+            self.assertEqual(locations.buffer.flush(), 0)  # nothing buffered, only publishes
+        response = client.get("/api/providers", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(15.7, [p["lat"] for p in response.json()])
+
+    def test_flushes_from_other_workers_never_go_back_in_time(self):
+        locations.buffer.ingest(self.provider.id, [(15.7, 73.95, 200.0)])
+        locations.buffer.flush()
+        other_worker = locations.LocationBuffer()
+        other_worker.ingest(self.provider.id, [(15.6, 73.9, 150.0)])
+        other_worker.flush()
+        self.provider.refresh_from_db()
+        self.assertEqual((self.provider.lat, self.provider.lng), (15.7, 73.95))
+
+    def test_rejects_future_samples(self):
+        now = timezone.now().timestamp()
+        self.assertEqual(self.post([{"lat": 1, "lng": 1, "ts": now + 3600}]).status_code, 400)
+        self.assertEqual(self.post([{"lat": 1, "lng": 1, "ts": now + 5}]).json()["accepted"], 1)  # small skew
+
+    def test_rejects_bad_samples_and_non_providers(self):
+        self.assertEqual(self.post([{"lat": 95, "lng": 0}]).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        response = self.client_for(self.customer).post(
+            "/api/providers/location", {"samples": [{"lat": 1, "lng": 1}]}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(LOCATION_FLUSH_INTERVAL=0)
+class TrajectoryTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        locations.buffer.clear()
+        trajectory.recorder.clear()
+
+    def test_chunk_encoding_round_trips_compactly(self):
+        t = np.arange(1_700_000_000_000, 1_700_000_000_000 + 3600 * 1000, 5000)
+        lat = 15.5 + np.cumsum(np.full(len(t), 0.00004))
+        lng = np.full(len(t), 73.8)
+        data = trajectory.encode(t, lat, lng)
+        track = trajectory.decode(data)
+        self.assertTrue(np.array_equal(track.t, t))
+        self.assertLess(np.abs(track.lat - lat).max(), 1e-6)
+        self.assertLess(len(data) / len(t), 4)  # bytes per point
+
+    def post(self, samples):
+        return self.client_for(self.provider_user).post(
+            "/api/providers/location", {"samples": samples}, format="json")
+
+    @override_settings(TRAJECTORY_MAX_POINTS=5)
+    def test_recorder_keeps_the_newest_points_per_provider(self):
+        trajectory.recorder.add(self.provider.id, [(15.5, 73.8, 1000 + n) for n in range(8)])
+        self.assertEqual(list(trajectory.recorder.pending(self.provider.id).t), [n * 1000 for n in range(1003, 1008)])
+        self.assertEqual(trajectory.recorder.stats()["points_dropped"], 3)
+
+    @override_settings(LOCATION_FLUSH_INTERVAL=0, TRAJECTORY_CHUNK_SECONDS=0)
+    def test_ingest_writes_chunks_when_the_flusher_is_off(self):
+        req = self.make_request(status="Accepted")
+        base = int(req.accepted_at.timestamp()) + 1
+        self.post([{"lat": 15.5, "lng": 73.8, "ts": base + n} for n in range(3)])
+        self.assertEqual(TrajectoryChunk.objects.get(request=req).count, 3)
+        self.assertEqual(trajectory.recorder.stats()["pending_points"], 0)
+        locations.buffer.clear()
+
+    def test_request_route_distance_and_arrival(self):
+        req = self.make_request(status="Accepted")  # at (15.5, 73.8)
+        base = int(req.accepted_at.timestamp()) + 1
+        samples = [{"lat": 15.6 - 0.01 * n, "lng": 73.8, "ts": base + n} for n in range(11)]
+        self.post(samples)
+        self.assertEqual(len(trajectory.request_track(req)), 11)  # still buffered, already readable
+
+        self.assertEqual(trajectory.recorder.flush(force=True), 1)
+        self.assertEqual(TrajectoryChunk.objects.get().count, 11)
+        body = self.client_for(self.customer).get(f"/api/requests/{req.id}/trajectory").json()
+        self.assertEqual(body["count"], 11)
+        self.assertAlmostEqual(body["distance_km"], 11.12, places=1)
+        self.assertEqual(body["time_to_arrival_s"], 10.0)  # first sample within 150 m
+        self.assertEqual(body["t"][:2], [base * 1000, (base + 1) * 1000])
+
+        ranged = self.client_for(self.provider_user).get(
+            f"/api/requests/{req.id}/trajectory", {"from": base + 5, "to": base + 7, "points": 0}).json()
+        self.assertEqual((ranged["count"], "t" in ranged), (3, False))
+        self.assertEqual(self.client_for(self.provider_user).get(
+            f"/api/providers/{self.provider.id}/trajectory", {"from": "x"}).status_code, 400)
+
+        # Samples taken without a job are not kept
+        req.status = "Cancelled"
+        req.save()
+        self.post([{"lat": 15.0, "lng": 73.0, "ts": base + 20}])
+        trajectory.recorder.flush(force=True)
+        self.assertEqual(TrajectoryChunk.objects.count(), 1)
+        self.assertEqual(trajectory.recorder.stats()["points_dropped"], 1)
+
+    def test_samples_are_split_between_jobs_by_their_windows(self):
+        done = self.make_request(status="Accepted")
+        accepted = done.accepted_at.timestamp()
+        ServiceRequest.objects.filter(id=done.id).update(
+            status="Completed", completed_at=trajectory._datetime((accepted + 10) * 1000))
+        current = self.make_request(status="Pending")
+        ServiceRequest.objects.filter(id=current.id).update(
+            status="Accepted", accepted_at=trajectory._datetime((accepted + 20) * 1000))
+
+        self.post([{"lat": 15.5, "lng": 73.8, "ts": accepted - 5}]          # before any job
+                  + [{"lat": 15.5, "lng": 73.8, "ts": accepted + n} for n in (2, 4, 6)]      # first job
+                  + [{"lat": 15.5, "lng": 73.8, "ts": accepted + 15}]       # between jobs
+                  + [{"lat": 15.5, "lng": 73.8, "ts": accepted + n} for n in (21, 22)])     # current job
+        self.assertEqual(trajectory.recorder.flush(force=True), 2)
+        self.assertEqual(dict(TrajectoryChunk.objects.values_list('request_id', 'count')), {done.id: 3, current.id: 2})
+        self.assertEqual(trajectory.recorder.stats()["points_dropped"], 2)
+
+    def test_routes_are_private(self):
+        req = self.make_request(status="Accepted")
+        stranger = User.objects.create_user("mallory", "mallory@example.com", "pw")
+        self.assertEqual(self.client_for(stranger).get(f"/api/requests/{req.id}/trajectory").status_code, 403)
+        self.assertEqual(self.client_for(stranger).get(
+            f"/api/providers/{self.provider.id}/trajectory").status_code, 403)
+        self.assertEqual(self.client_for(self.customer).get(
+            f"/api/providers/{self.provider.id}/trajectory").status_code, 403)
+        self.assertEqual(self.client_for(self.provider_user).get(
+            f"/api/providers/{self.provider.id}/trajectory").status_code, 200)
+
+
+class MetricsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.clear()
+
+    def test_per_route_latency_queries_and_size(self):
+        req = self.make_request()
+        client = self.client_for(self.provider_user)
+        client.get("/api/services")
+        client.get("/api/services")
+        client.get(f"/api/requests/{req.id}")
+        client.get("/api/nope")
+        body = self.client.get("/api/metrics").content.decode()
+
+        route = 'route="api/requests/<int:request_id>",method="GET"'
+        self.assertIn('http_requests_total{route="api/services",method="GET",status="200"} 2', body)
+        self.assertIn('http_requests_total{route="<unmatched>",method="GET",status="404"} 1', body)
+        self.assertIn(f'http_request_duration_seconds_count{{{route}}} 1', body)
+        self.assertIn(f'http_request_db_queries_bucket{{{route},le="0.0"}} 0', body)  # it did query
+        self.assertIn(f'http_response_size_bytes_bucket{{{route},le="+Inf"}} 1', body)
+
+    def test_workers_are_merged_through_metrics_dir(self):
+        with TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.record("api/health", "GET", 200, 0.003, 0, 0.0, 20)
+            metrics.dump()
+            os.rename(metrics._own_file(directory), os.path.join(directory, "1-other.json"))  # another worker
+            metrics.clear()
+            metrics.record("api/health", "GET", 500, 0.2, 2, 0.01, 20)
+            totals = metrics.collect()
+        series = totals[("api/health", "GET")]
+        self.assertEqual(series["statuses"], {200: 1, 500: 1})
+        self.assertEqual(sum(series["duration"]["counts"]), 2)
+        self.assertIn('http_request_db_queries_sum{route="api/health",method="GET"} 2.0', metrics.render(totals))
+
+
+@override_settings(QUERY_BUDGET="raise")
+class QueryBudgetTests(ApiTestCase):
+    def test_budget_exceeded(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "feed: 2 queries, budget 1."):
+            with query_budget(1, name="feed"):
+                list(Service.objects.all())
+                list(ServiceProvider.objects.all())
+
+    def test_repeated_query_reports_its_call_site(self):
+        for _ in range(5):
+            self.make_request(provider=self.other_provider, status="Completed")
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(100, name="names"):
+                [req.service.name for req in ServiceRequest.objects.all()]
+        self.assertIn("ran 5 times (N+1?), from api/tests.py:", str(raised.exception))
+
+    def test_views_stay_within_their_budgets(self):
+        req = self.make_request()
+        client = self.client_for(self.customer)
+        for url in ("/api/requests", "/api/myrequests?status=active", f"/api/requests/{req.id}"):
+            self.assertEqual(client.get(url).status_code, 200)
+
+    @override_settings(QUERY_BUDGET="off")
+    def test_off(self):
+        with query_budget(0):
+            list(Service.objects.all())
+
+    def test_shape_ignores_literals(self):
+        self.assertEqual(
+            shape("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            shape("SELECT * FROM t WHERE id IN (%s) AND name = 'y' LIMIT 5"),
+        )
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_sqlite_profile_pragmas(self):
+        env = {"SQLITE_PATH": "/data/app.sqlite3", "SQLITE_BUSY_TIMEOUT": "9", "DB_CONN_MAX_AGE": "0"}
+        with mock.patch.dict(os.environ, env):
+            db = database_from_env(Path("/srv"))
+        self.assertEqual(db["NAME"], "/data/app.sqlite3")
+        self.assertIn("PRAGMA journal_mode=WAL", db["OPTIONS"]["init_command"])
+        self.assertIn("PRAGMA synchronous=NORMAL", db["OPTIONS"]["init_command"])
+        self.assertEqual((db["OPTIONS"]["timeout"], db["CONN_MAX_AGE"]), (9, 0))
+
+    def test_tracked_database_keeps_its_journal_mode(self):
+        # WAL persists in the file: the repo's db.sqlite3 would be rewritten by any manage.py command
+        with mock.patch.dict(os.environ, {"SQLITE_PATH": ""}):
+            db = database_from_env(Path("/srv"))
+        self.assertEqual(db["NAME"], Path("/srv/db.sqlite3"))
+        self.assertIn("PRAGMA journal_mode=DELETE", db["OPTIONS"]["init_command"])
+        self.assertIn("PRAGMA synchronous=FULL", db["OPTIONS"]["init_command"])
+        with mock.patch.dict(os.environ, {"SQLITE_PATH": "", "SQLITE_JOURNAL_MODE": "WAL"}):
+            self.assertIn("PRAGMA journal_mode=WAL", database_from_env(Path("/srv"))["OPTIONS"]["init_command"])
+
+    def test_asgi_profile_does_not_keep_connections(self):
+        with mock.patch.dict(os.environ, {"ASGI_PROFILE": "1"}):
+            self.assertEqual(database_from_env(Path("/srv"))["CONN_MAX_AGE"], 0)
+        with mock.patch.dict(os.environ, {"ASGI_PROFILE": "1", "DB_CONN_MAX_AGE": "30"}):
+            self.assertEqual(database_from_env(Path("/srv"))["CONN_MAX_AGE"], 30)
+
+    def test_postgres_profile_pools_connections(self):
+        with mock.patch.dict(os.environ, {"DB_PROFILE": "postgres", "DB_POOL_MAX_SIZE": "20"}):
+            db = database_from_env(Path("/srv"))
+        self.assertEqual(db["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(db["OPTIONS"]["pool"], {"min_size": 2, "max_size": 20})
+        self.assertEqual(db["CONN_MAX_AGE"], 0)
+        with mock.patch.dict(os.environ, {"DB_PROFILE": "oracle"}), self.assertRaises(ValueError):
+            database_from_env(Path("/srv"))
+
+
+class SeedTests(TestCase):
+    def test_seed_is_deterministic_and_keeps_invariants(self):
+        def snapshot():
+            return list(ServiceRequest.objects.order_by('id').values_list(
+                'user__username', 'provider__email', 'status', 'lat', 'estimated_cost', 'created'))
+
+        indexes = seed._secondary_indexes(ServiceRequest._meta.db_table)
+        counts = seed.seed(20, 30, 500, seed=7, prefix="a", batch_size=64)
+        self.assertEqual(counts, {"users": 20, "providers": 30, "requests": 500})
+        self.assertEqual(seed._secondary_indexes(ServiceRequest._meta.db_table), indexes)  # rebuilt
+        self.assertFalse(ServiceProvider.objects.filter(grid_cell__isnull=True).exists())
+        for req in ServiceRequest.objects.select_related('service', 'provider'):
+            self.assertEqual(req.provider.type, req.service.name)
+            self.assertEqual(req.completed_by_user, req.status == "Completed")
+        first = snapshot()
+
+        ServiceRequest.objects.all().delete()
+        User.objects.all().delete()
+        ServiceProvider.objects.all().delete()
+        seed.seed(20, 30, 500, seed=7, prefix="a", batch_size=100)
+        again = snapshot()
+        self.assertEqual([row[:5] for row in again], [row[:5] for row in first])
+        self.assertEqual([row[5] - again[0][5] for row in again], [row[5] - first[0][5] for row in first])
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoadTestHarnessTests(LiveServerTestCase):
+    def test_short_run_exercises_every_endpoint(self):
+        loadtest.prepare_accounts(customers=3, providers=2)
+        test = loadtest.LoadTest(self.live_server_url, clients=3, duration=2, customers=3, providers=2,
+                                 think_ms=(0, 5), mix={"create_request": 1, "job_flow": 1, "poll_requests": 1,
+                                                       "poll_my_active": 1, "login": 1})
+        rows = {row[0]: row for row in test.run()}
+        self.assertIn("PUT /api/requests/<id> (accept)", rows)
+        self.assertIn("GET /api/myrequests?status=active", rows)
+        self.assertEqual(rows["TOTAL"][6], 0)  # no errors
+        self.assertEqual([row[0] for row in loadtest.compare(list(rows.values()), list(rows.values()))][-1], "TOTAL")
+        self.assertEqual(loadtest.cleanup_accounts(), (5, 2))
+
+
+class TransitionConcurrencyTests(TransactionTestCase):
+    """Transitions hammered from parallel threads, each with its own connection."""
+    ROUNDS = 20
+
+    def setUp(self):
+        self.service = Service.objects.create(name="Towing", price=1200)
+        self.customer = User.objects.create_user("alice", "alice@example.com", "pw")
+        self.providers = [
+            ServiceProvider.objects.create(name=f"Tow {n}", email=f"tow{n}@example.com", type="towing",
+                                           lat=15.5, lng=73.8, phone="111")
+            for n in range(self.ROUNDS)
+        ]
+
+    def make_requests(self, count, status="Pending", providers=None):
+        return [
+            ServiceRequest.objects.create(service=self.service, user=self.customer, status=status,
+                                          provider=providers[n] if providers else None, lat=15.5, lng=73.8)
+            for n in range(count)
+        ]
+
+    def run_parallel(self, work, workers, after_round=None):
+        """
+        Call work(worker, round) for every round, all workers starting each round
+        together; after_round(round) runs once every worker has finished it.
+        """
+        barrier = threading.Barrier(len(workers))
+        errors = []
+
+        def run(worker):
+            try:
+                for n in range(self.ROUNDS):
+                    barrier.wait(timeout=10)
+                    work(worker, n)
+                    barrier.wait(timeout=10)
+                    if after_round and worker == workers[0]:
+                        after_round(n)
+            except Exception as exc:  # surfaced in the main thread below
+                errors.append(exc)
+                barrier.abort()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(worker,)) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_confirmations_are_never_lost(self):
+        requests = self.make_requests(self.ROUNDS, status="Accepted", providers=self.providers)
+
+        def tap(role, n):
+            for step in transitions.CONFIRMATIONS:
+                transitions.confirm(requests[n].id, step, role)
+
+        self.run_parallel(tap, transitions.CONFIRM_ROLES)
+        rows = ServiceRequest.objects.filter(id__in=[r.id for r in requests])
+        self.assertEqual(
+            set(rows.values_list('status', 'arrived_by_provider', 'arrived_by_user',
+                                 'completed_by_provider', 'completed_by_user')),
+            {("Completed", True, True, True, True)},
+        )
+
+    def test_one_winner_per_request_and_one_job_per_provider(self):
+        contested = self.make_requests(self.ROUNDS)   # two providers race for each
+        pairs = self.make_requests(2 * self.ROUNDS)   # one provider, two devices, two jobs
+        rivals, phone = self.providers[:2], self.providers[2]
+        outcomes = []
+
+        def try_accept(request_id, email):
+            try:
+                transitions.accept(request_id, email)
+                outcomes.append(request_id)
+            except transitions.AcceptRejected:
+                pass
+
+        def race(device, n):
+            try_accept(contested[n].id, rivals[device].email)
+            try_accept(pairs[2 * n + device].id, phone.email)
+
+        def free_providers(n):
+            ServiceRequest.objects.filter(status="Accepted").update(status="Completed")
+
+        self.run_parallel(race, (0, 1), after_round=free_providers)
+        for n in range(self.ROUNDS):
+            self.assertEqual(outcomes.count(contested[n].id), 1)
+            self.assertEqual(outcomes.count(pairs[2 * n].id) + outcomes.count(pairs[2 * n + 1].id), 1)
+
+
+class DeltaSyncTests(ApiTestCase):
+    def sync(self, client, url, token):
+        response = client.get(url, {"since": token})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_my_requests_delta_reports_changes_and_deletions(self):
+        kept = self.make_request()
+        gone = self.make_request()
+        client = self.client_for(self.customer)
+
+        first = self.sync(client, "/api/myrequests", "")
+        self.assertTrue(first["reset"])
+        self.assertEqual({r["id"] for r in first["changed"]}, {kept.id, gone.id})
+
+        # Move the existing rows out of the overlap window, then change one and delete the other
+        ServiceRequest.objects.update(updated=timezone.now() - timedelta(minutes=5))
+        RequestTombstone.objects.all().delete()
+        token = self.sync(client, "/api/myrequests", "")["since"]
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(minutes=1)):
+            kept.status = "Cancelled"
+            kept.save()
+            client.delete(f"/api/requests/{gone.id}")
+            delta = self.sync(client, "/api/myrequests", token)
+
+        self.assertFalse(delta["reset"])
+        self.assertEqual([(r["id"], r["status"]) for r in delta["changed"]], [(kept.id, "Cancelled")])
+        self.assertEqual(delta["deleted"], [gone.id])
+        self.assertEqual(self.client_for(self.provider_user).get(
+            "/api/myrequests", {"since": token}).json()["deleted"], [])
+
+    def test_provider_feed_delta_and_bad_token(self):
+        ServiceRequest.objects.update(updated=timezone.now() - timedelta(minutes=5))
+        client = self.client_for(self.provider_user)
+        token = self.sync(client, "/api/provider/jobs", "")["since"]
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(minutes=1)):
+            job = self.make_request(provider=self.other_provider)
+            self.make_request(service=self.battery, provider=self.other_provider)  # other type
+            delta = self.sync(client, "/api/provider/jobs", token)
+        self.assertEqual([r["id"] for r in delta["changed"]], [job.id])
+        self.assertEqual(client.get("/api/provider/jobs", {"since": "garbage"}).status_code, 400)
+
+    def test_provider_feed_delta_hides_jobs_taken_by_others(self):
+        rival = ServiceProvider.objects.create(name="Hook", email="hook@example.com", type="Towing", lat=15.5, lng=73.8)
+        job = self.make_request(provider=rival)
+        ServiceRequest.objects.update(updated=timezone.now() - timedelta(minutes=5))
+        client = self.client_for(self.provider_user)
+        token = self.sync(client, "/api/provider/jobs", "")["since"]
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(minutes=1)):
+            job.status = "Accepted"
+            job.save()
+            response = client.get("/api/provider/jobs", {"since": token})
+        self.assertEqual(response.json()["changed"], [])
+        self.assertEqual(response.json()["deleted"], [job.id])
+        self.assertNotIn(b"999", response.content)  # the customer's phone
+
+
+@skipUnless(connection.vendor == "sqlite", "plan assertions are written against SQLite's EXPLAIN QUERY PLAN")
+class QueryPlanTests(ApiTestCase):
+    """The hot queries must be answered from an index, never by a full table scan."""
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = queryset.explain()
+        for table in ("api_servicerequest", "api_serviceprovider"):
+            self.assertNotRegex(plan, rf"SCAN {table}\b", plan)
+        if index:
+            self.assertIn(index, plan)
+
+    def test_my_requests(self):
+        mine = ServiceRequest.objects.filter(user=self.customer)
+        self.assertUsesIndex(mine.order_by("-created", "-id"), "req_user_created_idx")
+        self.assertUsesIndex(
+            mine.filter(status__in=["Pending", "Accepted", "Arrived"]).order_by("-created", "-id"),
+            "req_user_created_idx",
+        )
+        self.assertUsesIndex(mine.filter(updated__gte=timezone.now()).order_by("updated", "id"))
+        self.assertUsesIndex(
+            RequestTombstone.objects.filter(user_id=self.customer.id, deleted__gte=timezone.now()),
+            "tomb_user_deleted_idx",
+        )
+
+    def test_provider_lookups(self):
+        self.assertUsesIndex(
+            ServiceProvider.objects.alias(email_lower=Lower("email")).filter(email_lower="tow@example.com"),
+            "provider_email_lower_idx",
+        )
+        self.assertUsesIndex(
+            User.objects.select_related("userprofile").filter(email="alice@example.com"), "auth_user_email_idx"
+        )
+        self.assertUsesIndex(
+            ServiceRequest.objects.filter(provider=self.provider, status__in=ACTIVE_JOB_STATUSES),
+            "req_provider_status_idx",
+        )
+
+    def test_provider_feed_and_dispatch(self):
+        self.assertUsesIndex(provider_jobs_queryset(self.provider, "available"), "req_status_id_idx")
+        self.assertUsesIndex(provider_jobs_queryset(self.provider, "active"))
+        self.assertUsesIndex(provider_jobs_queryset(self.provider, "past"))
+        self.assertUsesIndex(ServiceRequest.objects.filter(status="Pending").order_by("id"), "req_status_id_idx")
@@ -0,0 +1,307 @@
+"""
+Provider routes during a ServiceRequest, stored as packed arrays.
+
+GPS samples posted to /api/providers/location (see locations.py) are also
+handed to this process's TrajectoryRecorder. Every TRAJECTORY_CHUNK_SECONDS
+the recorder attributes each provider's buffered samples to the request
+whose job window contains them, from its acceptance (`accepted_at`) to its
+completion (`completed_at`, open while Accepted / Arrived), and writes one
+TrajectoryChunk row per request; samples taken while the provider has no job
+(before acceptance, between jobs) are dropped. Rows from before those columns
+existed fall back to `created` / `updated`.
+
+A chunk's `data` is
+
+    header  <B I q i i   format version, point count, first timestamp (ms),
+                         first lat, first lng (microdegrees, ~0.1 m)
+    body    zlib( int64 time deltas | int32 lat deltas | int32 lng deltas )
+
+so a point costs a few bytes instead of a row. Reads decode chunks straight
+into NumPy arrays (Track); range filtering, distance travelled and time to
+arrival are vectorized, with no Python object per point.
+"""
+import struct
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from .geo import EARTH_RADIUS_KM
+from .models import ACTIVE_JOB_STATUSES, ServiceRequest, TrajectoryChunk
+
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<BIqii")
+MICRODEGREES = 1_000_000
+# A sample this close to the request's location counts as the provider having arrived.
+ARRIVAL_RADIUS_KM = 0.15
+
+
+class Track:
+    """Parallel arrays: t in Unix milliseconds (int64), lat / lng in degrees (float64)."""
+    __slots__ = ("t", "lat", "lng")
+
+    def __init__(self, t, lat, lng):
+        self.t, self.lat, self.lng = t, lat, lng
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+
+    def __len__(self):
+        return len(self.t)
+
+    def __iter__(self):
+        return iter((self.t, self.lat, self.lng))
+
+    def between(self, start_ms=None, end_ms=None):
+        mask = np.ones(len(self.t), dtype=bool)
+        if start_ms is not None:
+            mask &= self.t >= start_ms
+        if end_ms is not None:
+            mask &= self.t <= end_ms
+        return Track(self.t[mask], self.lat[mask], self.lng[mask])
+
+
+def encode(t_ms, lat, lng):
+    """Pack a track (sorted by time, at least one point) into chunk bytes."""
+    t = np.asarray(t_ms, dtype=np.int64)
+    la = np.rint(np.asarray(lat, dtype=np.float64) * MICRODEGREES).astype(np.int64)
+    ln = np.rint(np.asarray(lng, dtype=np.float64) * MICRODEGREES).astype(np.int64)
+    header = HEADER.pack(FORMAT_VERSION, len(t), int(t[0]), int(la[0]), int(ln[0]))
+    body = (np.diff(t).astype("<i8").tobytes() + np.diff(la).astype("<i4").tobytes()
+            + np.diff(ln).astype("<i4").tobytes())
+    return header + zlib.compress(body)
+
+
+def decode(data):
+    version, count, t0, lat0, lng0 = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unknown trajectory chunk format {version}")
+    body = zlib.decompress(bytes(data[HEADER.size:]))
+    n = count - 1
+    dt = np.frombuffer(body, dtype="<i8", count=n)
+    dlat = np.frombuffer(body, dtype="<i4", count=n, offset=8 * n)
+    dlng = np.frombuffer(body, dtype="<i4", count=n, offset=12 * n)
+    t = np.concatenate(([t0], t0 + np.cumsum(dt, dtype=np.int64)))
+    lat = np.concatenate(([lat0], lat0 + np.cumsum(dlat, dtype=np.int64))) / MICRODEGREES
+    lng = np.concatenate(([lng0], lng0 + np.cumsum(dlng, dtype=np.int64))) / MICRODEGREES
+    return Track(t, lat, lng)
+
+
+def concat(tracks):
+    """One time-ordered track from several (chunks, pending samples)."""
+    tracks = [track for track in tracks if len(track)]
+    if not tracks:
+        return Track.empty()
+    t = np.concatenate([track.t for track in tracks])
+    order = np.argsort(t, kind="stable")
+    return Track(t[order], np.concatenate([track.lat for track in tracks])[order],
+                 np.concatenate([track.lng for track in tracks])[order])
+
+
+# -------------------------------
+# Analytics
+# -------------------------------
+
+def _haversine_km(lat1, lng1, lat2, lng2):
+    """Element-wise great-circle distance; angles in radians."""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def step_km(track):
+    """Length of each step between consecutive points."""
+    lat, lng = np.radians(track.lat), np.radians(track.lng)
+    return _haversine_km(lat[:-1], lng[:-1], lat[1:], lng[1:])
+
+
+def distance_km(track):
+    return float(step_km(track).sum()) if len(track) > 1 else 0.0
+
+
+def arrival_index(track, lat, lng, radius_km=ARRIVAL_RADIUS_KM):
+    """Index of the first point within `radius_km` of (lat, lng), or None."""
+    distances = _haversine_km(np.radians(track.lat), np.radians(track.lng),
+                              np.radians(float(lat)), np.radians(float(lng)))
+    within = np.flatnonzero(distances <= radius_km)
+    return int(within[0]) if len(within) else None
+
+
+def summary(track, req=None):
+    """Distance travelled, and for a request the time from the first sample to arrival at its location."""
+    result = {
+        "count": len(track),
+        "start": _iso(track.t[0]) if len(track) else None,
+        "end": _iso(track.t[-1]) if len(track) else None,
+        "distance_km": round(distance_km(track), 3),
+    }
+    if req is not None:
+        arrived = arrival_index(track, req.lat, req.lng)
+        result["arrived_at"] = _iso(track.t[arrived]) if arrived is not None else None
+        result["time_to_arrival_s"] = (
+            round((track.t[arrived] - track.t[0]) / 1000, 3) if arrived is not None else None)
+        result["distance_to_arrival_km"] = (
+            round(float(step_km(track)[:arrived].sum()), 3) if arrived is not None else None)
+    return result
+
+
+def _iso(ms):
+    return datetime.fromtimestamp(int(ms) / 1000, tz=dt_timezone.utc).isoformat()
+
+
+def _datetime(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+
+def _ms(value):
+    return int(value.timestamp() * 1000)
+
+
+# -------------------------------
+# Reads
+# -------------------------------
+
+def request_track(req, start_ms=None, end_ms=None):
+    """The request's route (stored chunks plus samples still buffered here) within the range."""
+    chunks = _chunks(TrajectoryChunk.objects.filter(request=req), start_ms, end_ms)
+    if req.provider_id and req.status in ACTIVE_JOB_STATUSES:
+        chunks.append(recorder.pending(req.provider_id).between(_ms(req.accepted_at or req.created), None))
+    return concat(chunks).between(start_ms, end_ms)
+
+
+def provider_track(provider_id, start_ms=None, end_ms=None):
+    """Everything recorded for a provider (across requests) within the range."""
+    chunks = _chunks(TrajectoryChunk.objects.filter(provider_id=provider_id), start_ms, end_ms)
+    return concat(chunks + [recorder.pending(provider_id)]).between(start_ms, end_ms)
+
+
+def _chunks(queryset, start_ms, end_ms):
+    # Chunks overlapping the range: traj_*_start_idx narrows by start, end filters the rest
+    if start_ms is not None:
+        queryset = queryset.filter(end__gte=_datetime(start_ms))
+    if end_ms is not None:
+        queryset = queryset.filter(start__lte=_datetime(end_ms))
+    return [decode(data) for data in queryset.order_by('start').values_list('data', flat=True)]
+
+
+# -------------------------------
+# Recording
+# -------------------------------
+
+class TrajectoryRecorder:
+    """Samples per provider since the last chunk was written."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._points = defaultdict(list)  # provider id -> [(ts seconds, lat, lng)]
+        self._since = {}                  # provider id -> monotonic time of the oldest buffered sample
+        self._counters = {"chunks": 0, "points_written": 0, "points_dropped": 0}
+
+    def add(self, provider_id, samples):
+        """
+        (lat, lng, ts) samples as parsed by locations.parse_samples. Past
+        TRAJECTORY_MAX_POINTS buffered for a provider the oldest are dropped.
+        """
+        cap = getattr(settings, 'TRAJECTORY_MAX_POINTS', 5000)
+        with self._lock:
+            points = self._points[provider_id]
+            points.extend((ts, lat, lng) for lat, lng, ts in samples)
+            if len(points) > cap:
+                self._counters["points_dropped"] += len(points) - cap
+                del points[:-cap]
+            self._since.setdefault(provider_id, time.monotonic())
+
+    def due(self):
+        """True when some provider's samples are old enough for flush() to write."""
+        age = getattr(settings, 'TRAJECTORY_CHUNK_SECONDS', 60)
+        now = time.monotonic()
+        with self._lock:
+            return any(now - since >= age for since in self._since.values())
+
+    def pending(self, provider_id):
+        with self._lock:
+            points = list(self._points.get(provider_id, ()))
+        return _track(points)
+
+    def flush(self, force=False):
+        """
+        Write the samples buffered for at least TRAJECTORY_CHUNK_SECONDS (all
+        of them with force=True): one attribution query and one bulk_create.
+        Returns the number of chunks written.
+        """
+        age = getattr(settings, 'TRAJECTORY_CHUNK_SECONDS', 60)
+        now = time.monotonic()
+        with self._lock:
+            due = [p for p, since in self._since.items() if force or now - since >= age]
+            batch = {p: self._points.pop(p) for p in due}
+            for p in due:
+                del self._since[p]
+        if not batch:
+            return 0
+
+        tracks = {p: _track(points) for p, points in batch.items()}
+        oldest = _datetime(min(int(track.t[0]) for track in tracks.values()))
+        windows = defaultdict(list)  # provider id -> [(request id, first ms, last ms or None)]
+        rows = (
+            ServiceRequest.objects.filter(provider_id__in=list(tracks))
+            .filter(Q(status__in=ACTIVE_JOB_STATUSES) | (Q(status="Completed") & (
+                Q(completed_at__gte=oldest) | Q(completed_at__isnull=True, updated__gte=oldest))))
+            .values_list('provider_id', 'id', 'status', 'accepted_at', 'completed_at', 'created', 'updated')
+        )
+        for provider_id, request_id, status, accepted, completed, created, updated in rows:
+            end = None if status in ACTIVE_JOB_STATUSES else _ms(completed or updated)
+            windows[provider_id].append((request_id, _ms(accepted or created), end))
+
+        chunks, written = [], 0
+        for provider_id, track in tracks.items():
+            free = np.ones(len(track), dtype=bool)
+            # Latest acceptance first: where windows overlap the newer job keeps the sample
+            for request_id, start, end in sorted(windows[provider_id], key=lambda w: w[1], reverse=True):
+                mask = free & (track.t >= start)
+                if end is not None:
+                    mask &= track.t <= end
+                if not mask.any():
+                    continue
+                free &= ~mask
+                part = Track(track.t[mask], track.lat[mask], track.lng[mask])
+                chunks.append(TrajectoryChunk(
+                    request_id=request_id, provider_id=provider_id, start=_datetime(int(part.t[0])),
+                    end=_datetime(int(part.t[-1])), count=len(part), data=encode(*part),
+                ))
+                written += len(part)
+        TrajectoryChunk.objects.bulk_create(chunks, batch_size=500)
+
+        with self._lock:
+            self._counters["chunks"] += len(chunks)
+            self._counters["points_written"] += written
+            self._counters["points_dropped"] += sum(len(track) for track in tracks.values()) - written
+        return len(chunks)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, pending_points=sum(len(points) for points in self._points.values()))
+
+    def clear(self):
+        with self._lock:
+            self._points.clear()
+            self._since.clear()
+            for counter in self._counters:
+                self._counters[counter] = 0
+
+
+def _track(points):
+    """Track from [(ts seconds, lat, lng)], sorted by time."""
+    if not points:
+        return Track.empty()
+    columns = np.array(points, dtype=np.float64)
+    order = np.argsort(columns[:, 0], kind="stable")
+    columns = columns[order]
+    return Track(np.rint(columns[:, 0] * 1000).astype(np.int64), columns[:, 1], columns[:, 2])
+
+
+recorder = TrajectoryRecorder()
@@ -0,0 +1,134 @@
+"""
+ServiceRequest state transitions written as single conditional UPDATEs.
+
+The old code loaded the row, changed it in Python and save()d every column:
+two taps racing (customer and provider confirming at the same moment) could
+both read "other side not confirmed yet" and one write overwrote the other.
+Here the database evaluates the condition against the row it is writing, so
+concurrent transitions serialize on the row lock and none are lost.
+
+queryset.update() skips auto_now and post_save, so every transition sets
+`updated` itself and publishes its realtime event (see realtime.py).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Exists, F, Subquery, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import realtime
+from .models import ACTIVE_JOB_STATUSES, ServiceProvider, ServiceRequest
+
+# step -> (provider flag, user flag, status once both have confirmed)
+CONFIRMATIONS = {
+    "arrived": ("arrived_by_provider", "arrived_by_user", "Arrived"),
+    "completed": ("completed_by_provider", "completed_by_user", "Completed"),
+}
+CONFIRM_ROLES = ("provider", "user")
+
+
+def confirm(request_id, step, role):
+    """
+    Record `role`'s confirmation of `step` and move the status on when the
+    other side has already confirmed, in one UPDATE:
+
+        SET <role flag> = true,
+            status = CASE WHEN <other flag> AND status IN ('Accepted', 'Arrived')
+                          THEN <step status> ELSE status END
+
+    The status only moves on from an active job, so a stray confirmation on a
+    Pending request cannot make it active (one_active_job_per_provider).
+    Returns the updated request (service, provider and user loaded) or None
+    when it does not exist.
+    """
+    provider_flag, user_flag, done_status = CONFIRMATIONS[step]
+    flag, other = (provider_flag, user_flag) if role == "provider" else (user_flag, provider_flag)
+    moves_on = {other: True, 'status__in': ACTIVE_JOB_STATUSES}
+    now = timezone.now()
+    changes = {
+        flag: True,
+        'status': Case(When(**moves_on, then=Value(done_status)), default=F('status')),
+        'updated': now,
+    }
+    if done_status == "Completed":
+        # Ends the window of GPS samples that belong to the job (trajectory.py)
+        changes['completed_at'] = Case(When(**moves_on, then=Value(now)), default=F('completed_at'))
+    changed = ServiceRequest.objects.filter(id=request_id).update(**changes)
+    if not changed:
+        return None
+    req = ServiceRequest.objects.select_related('service', 'provider', 'user').get(id=request_id)
+    realtime.publish_request("updated", req, req.service.name)
+    return req
+
+
+class AcceptRejected(Exception):
+    """accept() refused; `reason` is one of the ACCEPT_* constants below."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+ACCEPT_NOT_FOUND = "not_found"      # no such request
+ACCEPT_NO_PROVIDER = "no_provider"  # no provider with that email
+ACCEPT_BUSY = "busy"                # provider already has an Accepted/Arrived job
+ACCEPT_TAKEN = "taken"              # request is no longer Pending
+
+ACCEPT_ERRORS = {
+    ACCEPT_NOT_FOUND: "Request not found.",
+    ACCEPT_NO_PROVIDER: "Provider profile not found.",
+    ACCEPT_BUSY: "You must complete existing active job before accepting a new request.",
+    ACCEPT_TAKEN: "This request is no longer pending.",
+}
+ACCEPT_ERROR_STATUS = {ACCEPT_NOT_FOUND: 404, ACCEPT_TAKEN: 409}  # HTTP status; 400 otherwise
+
+
+def accept(request_id, provider_email):
+    """
+    Assign a Pending request to the provider with `provider_email`
+    (case-insensitive) in one UPDATE:
+
+        SET provider = (provider by email), status = 'Accepted'
+        WHERE id = ... AND status = 'Pending'
+          AND the provider exists AND has no Accepted/Arrived job
+
+    Two providers racing for a request, or one provider accepting two jobs
+    from two devices, cannot both succeed: the WHERE clause is evaluated on
+    the row being written, and the one_active_job_per_provider partial
+    unique index rejects whatever a concurrent transaction slips past it.
+
+    Returns the request (service, provider and user loaded); accepting a job
+    the provider already holds is a no-op. Raises AcceptRejected otherwise.
+    `provider_email` comes straight from the request body and may be any JSON value.
+    """
+    provider_email = str(provider_email or "")
+    provider = ServiceProvider.objects.alias(email_lower=Lower('email')).filter(email_lower=provider_email.lower())
+    busy = ServiceRequest.objects.filter(provider__in=provider.values('id'), status__in=ACTIVE_JOB_STATUSES)
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            changed = (
+                ServiceRequest.objects.filter(id=request_id, status="Pending")
+                .filter(Exists(provider)).exclude(Exists(busy))
+                .update(provider=Subquery(provider.values('id')[:1]), status="Accepted",
+                        accepted_at=now, updated=now)
+            )
+    except IntegrityError:
+        changed = 0
+
+    if changed:
+        req = ServiceRequest.objects.select_related('service', 'provider', 'user').get(id=request_id)
+        realtime.publish_request("updated", req, req.service.name)
+        return req
+
+    # Rejected: a few more queries, only to say why
+    row = ServiceRequest.objects.filter(id=request_id).values('status', 'provider_id').first()
+    if row is None:
+        raise AcceptRejected(ACCEPT_NOT_FOUND)
+    provider_id = provider.values_list('id', flat=True).first()
+    if provider_id is None:
+        raise AcceptRejected(ACCEPT_NO_PROVIDER)
+    if row['provider_id'] == provider_id and row['status'] in ACTIVE_JOB_STATUSES:
+        return ServiceRequest.objects.select_related('service', 'provider', 'user').get(id=request_id)
+    if busy.exists():
+        raise AcceptRejected(ACCEPT_BUSY)
+    raise AcceptRejected(ACCEPT_TAKEN)
@@ -1,456 +1,799 @@
-from django.shortcuts import get_object_or_404
-from django.contrib.auth import authenticate
-from django.contrib.auth.models import User
-from django.contrib.auth.hashers import make_password
-from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q
-
-from rest_framework.response import Response
-from rest_framework import status
-
-from .models import UserProfile, ServiceProvider, ServiceRequest, Service
-from .serializers import UserSerializer
-from .serializers import UserSignupSerializer
-
-
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import permission_classes, authentication_classes, api_view
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from .serializers import ServiceRequestSerializer, ServiceRequestUserSerializer, ServiceRequestEditSerializer
-
-from rest_framework_simplejwt.tokens import RefreshToken
-# -------------------------------
-# Swagger Access (Secure)
-# -------------------------------
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="QuickAssist API",
-        default_version='v1',
-        description="Swagger UI for testing API endpoints",
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
-
-# -------------------------------
-# Root / Home Endpoint
-# -------------------------------
-@api_view(['GET'])
-def home(request):
-    """
-    Friendly home endpoint for assignment evaluation.
-    Lists available endpoints without exposing sensitive info.
-    """
-    return Response({
-        "message": "Welcome to QuickAssist API",
-        "note": "Visit /api/swagger/ for interactive API docs",
-        "available_endpoints": [
-            "/api/health",
-            "/api/users",
-            "/api/providers",
-            "/api/requests",
-            "/api/services",
-            "/api/swagger/"
-        ]
-    })
-
-
-# -------------------------------
-# Users
-# -------------------------------
-
-@api_view(['GET', 'POST'])
-def users_view(request):
-    if request.method == 'GET':
-        users = User.objects.all()
-        data = [{"id": u.id, "username": u.username, "email": u.email} for u in users]
-        return Response(data)
-    elif request.method == 'POST':
-        username = request.data.get('username')
-        password = request.data.get('password')
-        email = request.data.get('email', '')
-        user = User.objects.create_user(username=username, password=password, email=email)
-        UserProfile.objects.create(user=user)
-        return Response({"id": user.id, "username": user.username}, status=status.HTTP_201_CREATED)
-
-@api_view(['GET', 'PUT', 'DELETE'])
-def user_view(request, user_id):
-    user = get_object_or_404(User, id=user_id)
-    if request.method == 'GET':
-        return Response({"id": user.id, "username": user.username, "email": user.email})
-    elif request.method == 'PUT':
-        user.username = request.data.get('username', user.username)
-        user.email = request.data.get('email', user.email)
-        if 'password' in request.data:
-            user.set_password(request.data['password'])
-        user.save()
-        return Response({"id": user.id, "username": user.username})
-    elif request.method == 'DELETE':
-        user.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-
-# -------------------------------
-# Providers
-# -------------------------------
-
-@api_view(['GET', 'POST'])
-def providers_view(request):
-    if request.method == 'GET':
-        providers = ServiceProvider.objects.all()
-        data = [
-            {
-                "id": p.id,
-                "name": p.name,
-                "email": p.email,
-                "type": p.type,
-                "lat": p.lat,
-                "lng": p.lng,
-                "rating": p.rating
-            } for p in providers
-        ]
-        return Response(data)
-    elif request.method == 'POST':
-        name = request.data.get('name')
-        type_ = request.data.get('type')
-        lat = request.data.get('lat', 0)
-        lng = request.data.get('lng', 0)
-        provider = ServiceProvider.objects.create(name=name, type=type_, lat=lat, lng=lng)
-        return Response({"id": provider.id, "name": provider.name}, status=status.HTTP_201_CREATED)
-
-@api_view(['GET', 'PUT', 'DELETE'])
-def provider_view(request, provider_id):
-    provider = get_object_or_404(ServiceProvider, id=provider_id)
-    if request.method == 'GET':
-        return Response({"id": provider.id, "name": provider.name, "type": provider.type})
-    elif request.method == 'PUT':
-        provider.name = request.data.get('name', provider.name)
-        provider.type = request.data.get('type', provider.type)
-        provider.save()
-        return Response({"id": provider.id, "name": provider.name})
-    elif request.method == 'DELETE':
-        provider.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-
-# -------------------------------
-# Service Requests
-# -------------------------------
-
-@api_view(['GET', 'POST'])
-def requests_view(request):
-    if request.method == 'GET':
-        requests = ServiceRequest.objects.all()
-        data = []
-        for r in requests:
-            user_profile = UserProfile.objects.filter(user=r.user).first()
-            user_phone = user_profile.phone if user_profile else None
-            data.append({
-                "id": r.id,
-                "service": {
-                    "id": r.service.id,
-                    "name": r.service.name,
-                    "description": r.service.description,
-                    "price": r.service.price
-                },
-                "user": r.user.username if r.user else None,
-                "user_phone": user_phone,
-                "provider": {
-                    "id": r.provider.id,
-                    "name": r.provider.name,
-                    "email": r.provider.email,
-                    "type": r.provider.type,
-                    "lat": r.provider.lat,
-                    "lng": r.provider.lng,
-                    "rating": r.provider.rating
-                } if r.provider else None,
-                "status": r.status,
-                "lat": r.lat,
-                "lng": r.lng,
-                "estimated_cost": r.estimated_cost
-            })
-        return Response(data)
-
-    elif request.method == 'POST':
-        service_id = request.data.get('service')   # expects service ID
-        user_id = request.data.get('user')         # expects user ID
-        provider_id = request.data.get('provider') # expects provider ID
-        lat = request.data.get('lat', 0)
-        lng = request.data.get('lng', 0)
-
-        service = get_object_or_404(Service, id=service_id)
-        user = get_object_or_404(User, id=user_id)
-        provider = get_object_or_404(ServiceProvider, id=provider_id)
-
-        req = ServiceRequest.objects.create(
-            service=service,
-            user=user,
-            provider=provider,
-            lat=lat,
-            lng=lng
-        )
-
-        # Return full provider info
-        return Response({
-            "id": req.id,
-            "service": {
-                "id": service.id,
-                "name": service.name,
-                "description": service.description,
-                "price": service.price
-            },
-            "user": user.username,
-            "provider": {
-                "id": provider.id,
-                "name": provider.name,
-                "email": provider.email,
-                "type": provider.type,
-                "lat": provider.lat,
-                "lng": provider.lng,
-                "rating": provider.rating
-            },
-            "status": req.status,
-            "lat": req.lat,
-            "lng": req.lng,
-            "estimated_cost": req.estimated_cost
-        }, status=status.HTTP_201_CREATED)
-
-@api_view(['GET', 'PUT', 'DELETE'])
-@authentication_classes([JWTAuthentication])
-@permission_classes([IsAuthenticated])
-def request_view(request, request_id):
-    req = get_object_or_404(ServiceRequest, id=request_id)
-
-    if request.method == 'GET':
-        serializer = ServiceRequestUserSerializer(req)
-        return Response(serializer.data)
-
-    elif request.method == 'PUT':
-        data = request.data
-        new_status = data.get('status', req.status)
-        if new_status == "Accepted":
-            provider_email = data.get('provider')
-            provider = None
-
-            # Lookup provider by email
-            if provider_email:
-                provider = ServiceProvider.objects.filter(email__iexact=provider_email).first()
-
-            if not provider:
-                return Response({"error": "Provider profile not found."}, status=400)
-
-            # Check for active job
-            has_active_job = ServiceRequest.objects.filter(
-                provider=provider,
-                status__in=["Accepted", "Arrived"]
-            ).exclude(id=req.id).exists()
-
-            if has_active_job:
-                return Response(
-                    {"error": "You must complete existing active job before accepting a new request."},
-                    status=400
-                )
-
-            req.provider = provider
-            req.status = new_status
-            req.save()
-
-            serializer = ServiceRequestUserSerializer(req)
-            return Response(serializer.data)
-
-        # Other status updates
-        if 'status' in data:
-            req.status = data['status']
-        if 'notes' in data:
-            req.notes = data['notes']
-        if 'lat' in data and 'lng' in data:
-            req.lat = data['lat']
-            req.lng = data['lng']
-
-        req.save()
-        serializer = ServiceRequestUserSerializer(req)
-        return Response(serializer.data)
-
-    elif request.method == 'DELETE':
-        req.delete()
-        return Response(status=204)
-    
-# -------------------------------
-# Services
-# -------------------------------
-
-@api_view(['GET', 'POST'])
-def services_view(request):
-    if request.method == 'GET':
-        services = Service.objects.all()
-        data = [{"id": s.id, "name": s.name, "description": s.description, "price": s.price} for s in services]
-        return Response(data)
-    elif request.method == 'POST':
-        name = request.data.get('name')
-        description = request.data.get('description', '')
-        price = request.data.get('price', 0)
-        service = Service.objects.create(name=name, description=description, price=price)
-        return Response({"id": service.id, "name": service.name}, status=status.HTTP_201_CREATED)
-
-# -------------------------------
-# Health
-# -------------------------------
-@api_view(['GET'])
-def health(request):
-    return Response({"status": "OK"})
-
-
-# -------------------------------
-# Signup and Login
-# -------------------------------
-@api_view(['POST'])
-def signup_user(request):
-    data = request.data
-
-    # Check if email already exists
-    if User.objects.filter(email=data.get('email')).exists():
-        return Response({"error": "Email already registered"}, status=status.HTTP_400_BAD_REQUEST)
-
-    if User.objects.filter(username=data.get('username')).exists():
-        return Response({"error": "Username already taken"}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Create user
-    user = User.objects.create(
-        username=data.get('username'),
-        email=data.get('email'),
-        password=make_password(data.get('password'))  # hash the password
-    )
-
-    # Create related profile
-    UserProfile.objects.create(
-        user=user,
-        phone=data.get('phone'),
-        role=data.get('role', 'user')  # default role = user
-    )
-
-    serializer = UserSerializer(user)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-
-@api_view(['POST'])
-@csrf_exempt
-def login_user(request):
-    try:
-        data = request.data
-        email = data.get("email")
-        password = data.get("password")
-
-        # Find user by email
-        try:
-            user_obj = User.objects.get(email=email)
-        except User.DoesNotExist:
-            return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Authenticate with username + password
-        user = authenticate(username=user_obj.username, password=password)
-        if user is not None:
-            # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
-            return Response({
-                "access": str(refresh.access_token),   # <-- Access token for frontend
-                "refresh": str(refresh),
-                "user_id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "role": user.userprofile.role
-            }, status=status.HTTP_200_OK)
-        else:
-            return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        return Response({"error": f"Login failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-# --- USER'S OWN REQUESTS: LIST, EDIT, CANCEL ---
-
-
-@api_view(['GET'])
-@authentication_classes([JWTAuthentication])
-@permission_classes([IsAuthenticated])
-def my_requests_view(request):
-    """
-    Return logged-in user's own service requests.
-    Supports optional filter query param ?status=active to get active requests only.
-    """
-    user = request.user
-    status_filter = request.query_params.get('status', None)
-
-    if status_filter == 'active':
-        active_statuses = ["Pending", "Accepted", "Arrived"]
-        requests = ServiceRequest.objects.filter(user=user, status__in=active_statuses).order_by('-created')
-    else:
-        requests = ServiceRequest.objects.filter(user=user).order_by('-created')
-
-    serializer = ServiceRequestUserSerializer(requests, many=True)
-    return Response(serializer.data)
-
-@csrf_exempt
-@api_view(['PATCH'])
-@authentication_classes([JWTAuthentication])
-@permission_classes([IsAuthenticated])
-def my_request_patch_view(request, request_id):
-    """
-    Allow editing (PATCH) for requests with statuses Pending, Accepted, Arrived.
-    """
-    user = request.user
-    try:
-        obj = ServiceRequest.objects.get(id=request_id, user=user)
-    except ServiceRequest.DoesNotExist:
-        return Response({'error': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-
-    if obj.status not in ["Pending", "Accepted", "Arrived"]:
-        return Response({'error': 'Can only edit requests with status Pending, Accepted or Arrived.'},
-                        status=status.HTTP_403_FORBIDDEN)
-
-    serializer = ServiceRequestEditSerializer(obj, data=request.data, partial=True)
-    if serializer.is_valid():
-        # Optional: restrict status changes here if required
-        serializer.save()
-        return Response({'success': 'Request updated.', 'data': ServiceRequestUserSerializer(obj).data})
-    else:
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-# --- CONFIRM ACTION (ARRIVED, COMPLETED) BY USER OR PROVIDER ---
-# Arrived confirmation
-@api_view(['PATCH'])
-@authentication_classes([JWTAuthentication])
-@permission_classes([IsAuthenticated])
-def confirm_arrived(request, id):
-    req = ServiceRequest.objects.get(pk=id)
-    role = request.data.get("role")
-    if role == "provider":
-        req.arrived_by_provider = True
-    elif role == "user":
-        req.arrived_by_user = True
-    else:
-        return Response({"error": "Invalid role"}, status=400)
-    # If both confirmed, update main status
-    if req.arrived_by_provider and req.arrived_by_user:
-        req.status = "Arrived"
-    req.save()
-    return Response(ServiceRequestSerializer(req).data, status=200)
-
-# Completed confirmation
-@api_view(['PATCH'])
-@authentication_classes([JWTAuthentication])
-@permission_classes([IsAuthenticated])
-def confirm_completed(request, id):
-    req = ServiceRequest.objects.get(pk=id)
-    role = request.data.get("role")
-    if role == "provider":
-        req.completed_by_provider = True
-    elif role == "user":
-        req.completed_by_user = True
-    else:
-        return Response({"error": "Invalid role"}, status=400)
-    # If both confirmed, update main status
-    if req.completed_by_provider and req.completed_by_user:
-        req.status = "Completed"
-    req.save()
-    return Response(ServiceRequestSerializer(req).data, status=200)
\ No newline at end of file
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.views.decorators.csrf import csrf_exempt
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from rest_framework.response import Response
+from rest_framework import status
+
+from .models import ACTIVE_JOB_STATUSES, UserProfile, ServiceProvider, ServiceRequest, Service, RequestTombstone
+from .serializers import UserSerializer
+from .serializers import UserSignupSerializer
+
+
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import permission_classes, authentication_classes, api_view
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from .serializers import ServiceRequestSerializer, ServiceRequestUserSerializer, ServiceRequestEditSerializer
+from .fast_views import provider_job_rows, request_list_rows, user_request_rows
+from .pagination import InvalidCursor, is_paginated, keyset_page
+from .querybudget import query_budget
+from .geo import nearest
+from . import authentication, batch, catalog, locations, metrics, realtime, sync, trajectory
+from .authentication import CachedJWTAuthentication, tokens_for
+from .ranking import normalize_type
+from .transitions import (
+    ACCEPT_BUSY, ACCEPT_ERROR_STATUS, ACCEPT_ERRORS, ACCEPT_NO_PROVIDER, AcceptRejected, CONFIRM_ROLES,
+    accept, confirm,
+)
+from .conditional import (
+    conditional_get, conditional_response, providers_version,
+    requests_version, my_requests_version, request_version,
+)
+
+# -------------------------------
+# Swagger Access (Secure)
+# -------------------------------
+from drf_yasg.views import get_schema_view
+from drf_yasg import openapi
+from rest_framework import permissions
+
+schema_view = get_schema_view(
+    openapi.Info(
+        title="QuickAssist API",
+        default_version='v1',
+        description="Swagger UI for testing API endpoints",
+    ),
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+# -------------------------------
+# Root / Home Endpoint
+# -------------------------------
+@api_view(['GET'])
+def home(request):
+    """
+    Friendly home endpoint for assignment evaluation.
+    Lists available endpoints without exposing sensitive info.
+    """
+    return Response({
+        "message": "Welcome to QuickAssist API",
+        "note": "Visit /api/swagger/ for interactive API docs",
+        "available_endpoints": [
+            "/api/health",
+            "/api/users",
+            "/api/providers",
+            "/api/providers/nearby",
+            "/api/requests",
+            "/api/provider/jobs",
+            "/api/services",
+            "/api/cache/stats",
+            "/api/swagger/"
+        ]
+    })
+
+
+# -------------------------------
+# List helpers
+# -------------------------------
+
+def _list_response(request, queryset, ordering, serialize):
+    """
+    Full list in `ordering`, or one keyset page when the client sends
+    ?page_size= / ?cursor= (see pagination.py).
+    """
+    if not is_paginated(request):
+        return Response(serialize(queryset.order_by(*ordering)))
+    try:
+        return Response(keyset_page(request, queryset, ordering, serialize))
+    except InvalidCursor:
+        return Response({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _delta_response(request, queryset, tombstones, serialize, snapshot=None, hidden=None):
+    """Rows changed/deleted since ?since=<token> (see sync.py)."""
+    try:
+        return Response(
+            sync.delta(request.query_params.get('since'), queryset, tombstones, serialize, snapshot, hidden)
+        )
+    except sync.InvalidSyncToken:
+        return Response({"error": "Invalid sync token."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# -------------------------------
+# Users
+# -------------------------------
+
+def _user_rows(users):
+    return [{"id": u.id, "username": u.username, "email": u.email} for u in users]
+
+
+@api_view(['GET', 'POST'])
+def users_view(request):
+    if request.method == 'GET':
+        return _list_response(request, User.objects.all(), ('id',), _user_rows)
+    elif request.method == 'POST':
+        username = request.data.get('username')
+        password = request.data.get('password')
+        email = request.data.get('email', '')
+        user = User.objects.create_user(username=username, password=password, email=email)
+        UserProfile.objects.create(user=user)
+        return Response({"id": user.id, "username": user.username}, status=status.HTTP_201_CREATED)
+
+@api_view(['GET', 'PUT', 'DELETE'])
+def user_view(request, user_id):
+    user = get_object_or_404(User, id=user_id)
+    if request.method == 'GET':
+        return Response({"id": user.id, "username": user.username, "email": user.email})
+    elif request.method == 'PUT':
+        user.username = request.data.get('username', user.username)
+        user.email = request.data.get('email', user.email)
+        if 'password' in request.data:
+            user.set_password(request.data['password'])
+        user.save()
+        return Response({"id": user.id, "username": user.username})
+    elif request.method == 'DELETE':
+        user.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+# -------------------------------
+# Providers
+# -------------------------------
+
+def _provider_rows(providers):
+    return [
+        {
+            "id": p.id,
+            "name": p.name,
+            "email": p.email,
+            "type": p.type,
+            "lat": p.lat,
+            "lng": p.lng,
+            "rating": p.rating
+        } for p in providers
+    ]
+
+
+def _catalog_response(request, name, serialize):
+    """Serve a full catalog list from the read-through cache (see catalog.py)."""
+    entry = catalog.get(name, serialize)
+    return conditional_response(
+        request, entry.version, lambda: HttpResponse(entry.body, content_type='application/json')
+    )
+
+
+@api_view(['GET', 'POST'])
+def providers_view(request):
+    if request.method == 'GET':
+        if not is_paginated(request):
+            return _catalog_response(request, "providers", _provider_rows)
+        return conditional_response(
+            request, providers_version(request),
+            lambda: _list_response(request, ServiceProvider.objects.all(), ('id',), _provider_rows),
+        )
+    elif request.method == 'POST':
+        name = request.data.get('name')
+        type_ = request.data.get('type')
+        lat = request.data.get('lat', 0)
+        lng = request.data.get('lng', 0)
+        provider = ServiceProvider.objects.create(name=name, type=type_, lat=lat, lng=lng)
+        return Response({"id": provider.id, "name": provider.name}, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+def providers_nearby_view(request):
+    """
+    k nearest providers to ?lat=&lng=, optionally only those of ?type= (case-insensitive).
+    Uses the grid index in geo.py; each row gets a "distance_km".
+    """
+    try:
+        lat = float(request.query_params['lat'])
+        lng = float(request.query_params['lng'])
+        k = int(request.query_params.get('k', 5))
+    except (KeyError, ValueError):
+        return Response({"error": "lat and lng are required numbers; k must be an integer."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return Response({"error": "lat/lng out of range."}, status=status.HTTP_400_BAD_REQUEST)
+    k = max(1, min(k, 50))
+
+    providers = ServiceProvider.objects.all()
+    type_ = request.query_params.get('type', '').strip()
+    if type_:
+        providers = providers.filter(type__iexact=type_)
+
+    ranked = nearest(providers, lat, lng, k)
+    data = _provider_rows(p for _, p in ranked)
+    for row, (distance, _) in zip(data, ranked):
+        row["distance_km"] = round(distance, 3)
+    return Response(data)
+
+@api_view(['POST'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def provider_location_view(request):
+    """
+    The logged-in provider's GPS samples, {"samples": [{"lat", "lng", "ts"}, ...]}.
+    Buffered and written in bulk (see locations.py), hence 202.
+    """
+    provider_id = _provider_id_for_request(request)
+    if provider_id is None:
+        return Response({"error": ACCEPT_ERRORS[ACCEPT_NO_PROVIDER]}, status=404)
+    try:
+        samples = locations.parse_samples(request.data, getattr(settings, 'API_BATCH_MAX_ITEMS', 500))
+    except locations.InvalidSamples as exc:
+        return Response({"error": str(exc)}, status=400)
+    accepted = locations.buffer.ingest(provider_id, samples)
+    return Response({"accepted": accepted, "stale": len(samples) - accepted}, status=202)
+
+
+@api_view(['GET'])
+def provider_location_stats_view(request):
+    """Ingest rate and flush lag of this process's location buffer (and trajectory recorder)."""
+    return Response(dict(locations.buffer.stats(), trajectory=trajectory.recorder.stats()))
+
+
+def _track_response(request, track, req=None):
+    """Summary plus the points as columns (t in Unix ms); ?points=0 for the summary only."""
+    body = trajectory.summary(track, req)
+    if request.query_params.get('points') != '0':
+        body.update(t=track.t.tolist(), lat=track.lat.tolist(), lng=track.lng.tolist())
+    return Response(body)
+
+
+def _time_range_ms(request):
+    """?from= / ?to= in Unix seconds, as milliseconds (None when absent). Raises ValueError."""
+    return tuple(
+        int(float(request.query_params[name]) * 1000) if request.query_params.get(name) else None
+        for name in ('from', 'to')
+    )
+
+
+@api_view(['GET'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def provider_trajectory_view(request, provider_id):
+    """The caller's own route across requests, ?from=&to= in Unix seconds."""
+    if _provider_id_for_request(request) != provider_id:
+        return Response({"error": "Only the provider can read their route."}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        start, end = _time_range_ms(request)
+    except ValueError:
+        return Response({"error": "from and to must be Unix timestamps"}, status=400)
+    return _track_response(request, trajectory.provider_track(provider_id, start, end))
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+def provider_view(request, provider_id):
+    provider = get_object_or_404(ServiceProvider, id=provider_id)
+    if request.method == 'GET':
+        return Response({"id": provider.id, "name": provider.name, "type": provider.type})
+    elif request.method == 'PUT':
+        provider.name = request.data.get('name', provider.name)
+        provider.type = request.data.get('type', provider.type)
+        provider.save()
+        return Response({"id": provider.id, "name": provider.name})
+    elif request.method == 'DELETE':
+        provider.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+# -------------------------------
+# Service Requests
+# -------------------------------
+
+@query_budget({'GET': 3, 'POST': 6})
+@api_view(['GET', 'POST'])
+@conditional_get(requests_version)
+def requests_view(request):
+    if request.method == 'GET':
+        # One joined query for the whole list (see fast_views)
+        return _list_response(request, ServiceRequest.objects.all(), ('id',), request_list_rows)
+
+    elif request.method == 'POST':
+        service_id = request.data.get('service')   # expects service ID
+        user_id = request.data.get('user')         # expects user ID
+        provider_id = request.data.get('provider') # expects provider ID
+        lat = request.data.get('lat', 0)
+        lng = request.data.get('lng', 0)
+
+        service = get_object_or_404(Service, id=service_id)
+        user = get_object_or_404(User, id=user_id)
+        provider = get_object_or_404(ServiceProvider, id=provider_id)
+
+        req = ServiceRequest.objects.create(
+            service=service,
+            user=user,
+            provider=provider,
+            lat=lat,
+            lng=lng
+        )
+
+        # Return full provider info
+        return Response({
+            "id": req.id,
+            "service": {
+                "id": service.id,
+                "name": service.name,
+                "description": service.description,
+                "price": service.price
+            },
+            "user": user.username,
+            "provider": {
+                "id": provider.id,
+                "name": provider.name,
+                "email": provider.email,
+                "type": provider.type,
+                "lat": provider.lat,
+                "lng": provider.lng,
+                "rating": provider.rating
+            },
+            "status": req.status,
+            "lat": req.lat,
+            "lng": req.lng,
+            "estimated_cost": req.estimated_cost
+        }, status=status.HTTP_201_CREATED)
+
+@query_budget({'GET': 3, 'PUT': 6, 'DELETE': 9})
+@api_view(['GET', 'PUT', 'DELETE'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+@conditional_get(request_version)
+def request_view(request, request_id):
+    if request.method == 'PUT' and request.data.get('status') == "Accepted":
+        return _accept_response(request, request_id)
+
+    req = get_object_or_404(ServiceRequest.objects.select_related('service', 'provider', 'user'), id=request_id)
+
+    if request.method == 'GET':
+        serializer = ServiceRequestUserSerializer(req)
+        return Response(serializer.data)
+
+    elif request.method == 'PUT':
+        data = request.data
+        # Other status updates
+        if 'status' in data:
+            req.status = data['status']
+        if 'notes' in data:
+            req.notes = data['notes']
+        if 'lat' in data and 'lng' in data:
+            req.lat = data['lat']
+            req.lng = data['lng']
+
+        try:
+            with transaction.atomic():
+                req.save()
+        except IntegrityError:  # one_active_job_per_provider
+            return Response({"error": ACCEPT_ERRORS[ACCEPT_BUSY]}, status=400)
+        serializer = ServiceRequestUserSerializer(req)
+        return Response(serializer.data)
+
+    elif request.method == 'DELETE':
+        req.delete()
+        return Response(status=204)
+
+
+@api_view(['GET'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def request_trajectory_view(request, request_id):
+    """
+    The provider's route for a request with distance travelled and time to
+    arrival (see trajectory.py); ?from=&to= in Unix seconds narrow it. Only
+    the customer who made the request and its provider may read it.
+    """
+    req = get_object_or_404(ServiceRequest, id=request_id)
+    is_customer = req.user_id == request.user.id
+    if not is_customer and (req.provider_id is None or _provider_id_for_request(request) != req.provider_id):
+        return Response({"error": "Not your request."}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        start, end = _time_range_ms(request)
+    except ValueError:
+        return Response({"error": "from and to must be Unix timestamps"}, status=400)
+    return _track_response(request, trajectory.request_track(req, start, end), req)
+
+
+def _accept_response(request, request_id):
+    """
+    PUT {"status": "Accepted", "provider": <email>}: one conditional UPDATE
+    (see transitions.accept), no separate lookup or active-job check.
+    """
+    try:
+        req = accept(request_id, request.data.get('provider'))
+    except AcceptRejected as exc:
+        return Response({"error": ACCEPT_ERRORS[exc.reason]}, status=ACCEPT_ERROR_STATUS.get(exc.reason, 400))
+    return Response(ServiceRequestUserSerializer(req).data)
+
+
+@api_view(['POST', 'PATCH'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def requests_batch_view(request):
+    """
+    POST: create many requests; PATCH: update many (see batch.py for the item
+    format). 200 with one result per item, in order; 400 if the batch itself
+    is malformed.
+    """
+    try:
+        items = batch.items_from(request.data, getattr(settings, 'API_BATCH_MAX_ITEMS', 500))
+    except batch.BatchError as exc:
+        return Response({"error": str(exc)}, status=400)
+    if request.method == 'POST':
+        results = batch.create_requests(items)
+    else:
+        results = batch.update_requests(items)
+    succeeded = sum(1 for result in results if result["status"] < 300)
+    return Response({"succeeded": succeeded, "failed": len(results) - succeeded, "results": results})
+    
+# -------------------------------
+# Provider Job Feed
+# -------------------------------
+
+PAST_JOB_STATUSES = ["Completed", "Cancelled"]
+PROVIDER_JOB_BUCKETS = ("available", "active", "past")
+
+
+def _provider_by_email(email):
+    """Case-insensitive provider lookup that can use provider_email_lower_idx."""
+    return ServiceProvider.objects.alias(email_lower=Lower('email')).filter(email_lower=email.lower()).first()
+
+
+def _provider_for_user(user):
+    """Return the ServiceProvider linked to a logged-in user (matched by email)."""
+    if not user.email:
+        return None
+    return _provider_by_email(user.email)
+
+
+def _provider_id_for_request(request):
+    """
+    The caller's provider id: the token's provider_id claim when it carries
+    one (JWT_IDENTITY_CLAIMS, see authentication.py), else looked up by email.
+    """
+    token = request.auth
+    if token is not None and "provider_id" in token:
+        return token["provider_id"]
+    provider = _provider_for_user(request.user)
+    return provider.id if provider else None
+
+
+def provider_jobs_queryset(provider, bucket):
+    """
+    Jobs a provider needs for one dashboard bucket, filtered and ordered in SQL:
+      available -> Pending requests for the provider's service type
+      active    -> the provider's Accepted/Arrived jobs
+      past      -> the provider's Completed/Cancelled jobs
+    """
+    qs = ServiceRequest.objects.select_related('service', 'provider', 'user__userprofile')
+    if bucket == "available":
+        return qs.filter(
+            status="Pending",
+            provider__isnull=False,
+            service__name__iexact=provider.type,
+        ).order_by('-id')
+    if bucket == "active":
+        return qs.filter(provider=provider, status__in=ACTIVE_JOB_STATUSES).order_by('-id')
+    return qs.filter(provider=provider, status__in=PAST_JOB_STATUSES).order_by('-created', '-id')
+
+
+@api_view(['GET'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def provider_jobs_view(request):
+    """
+    Jobs for the logged-in provider, so dashboards no longer download /api/requests.
+    Query param ?bucket=available|active|past (default: available).
+    """
+    bucket = request.query_params.get('bucket', 'available')
+    if bucket not in PROVIDER_JOB_BUCKETS:
+        return Response(
+            {"error": f"Invalid bucket. Use one of: {', '.join(PROVIDER_JOB_BUCKETS)}."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    provider = _provider_for_user(request.user)
+    if not provider:
+        return Response({"error": "Provider profile not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    if 'since' in request.query_params:
+        # Changes across all buckets: the client re-buckets rows by status. Other providers'
+        # jobs of the same type are only visible while Pending (the available bucket); once
+        # one is taken it is sent as a deletion, never as a row with the customer's details.
+        visible = Q(provider=provider) | Q(
+            status="Pending", provider__isnull=False, service__name__iexact=provider.type
+        )
+        jobs = ServiceRequest.objects.select_related('service', 'provider', 'user__userprofile').filter(visible)
+        hidden = ServiceRequest.objects.filter(service__name__iexact=provider.type).exclude(visible)
+        tombstones = RequestTombstone.objects.filter(
+            Q(provider_id=provider.id) | Q(service_type=normalize_type(provider.type))
+        )
+        return _delta_response(
+            request, jobs, tombstones, provider_job_rows,
+            snapshot=provider_jobs_queryset(provider, bucket), hidden=hidden,
+        )
+
+    # One joined query, same payload as ProviderJobSerializer (see fast_views)
+    return Response(provider_job_rows(provider_jobs_queryset(provider, bucket)))
+
+# -------------------------------
+# Live Updates (Server-Sent Events)
+# -------------------------------
+
+def _sse_identity(request):
+    """
+    (user, provider) for an /api/events request, or (None, None).
+    EventSource cannot send headers, so browsers pass a stream ticket as ?ticket=.
+    """
+    ticket = request.GET.get('ticket')
+    if ticket:
+        user = realtime.redeem_ticket(ticket)
+    else:
+        auth = CachedJWTAuthentication()
+        header = auth.get_header(request)
+        raw = auth.get_raw_token(header) if header else None
+        if not raw:
+            return None, None
+        try:
+            user = auth.get_user(auth.get_validated_token(raw))
+        except (InvalidToken, AuthenticationFailed):
+            return None, None
+    if user is None:
+        return None, None
+    return user, _provider_for_user(user)
+
+
+def _sse_unavailable():
+    return JsonResponse(
+        {"error": "Live events need the ASGI server; poll instead."}, status=status.HTTP_501_NOT_IMPLEMENTED,
+    )
+
+
+@api_view(['POST'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def events_ticket_view(request):
+    """
+    A single-use ticket for opening /api/events, or 501 when this deploy
+    cannot stream (WSGI) and clients should keep polling.
+    """
+    if not settings.ASGI_PROFILE:
+        return _sse_unavailable()
+    return Response({
+        "ticket": realtime.issue_ticket(request.user),
+        "expires_in": getattr(settings, 'REALTIME_TICKET_TTL', 30),
+    })
+
+
+async def events_view(request):
+    """
+    Stream the caller's ServiceRequest events (created / updated / deleted) as
+    Server-Sent Events, replacing 15s polling. Needs an ASGI server: under WSGI
+    it answers 501 straight away rather than hold a worker; see realtime.py.
+    """
+    if not settings.ASGI_PROFILE:
+        return _sse_unavailable()
+    user, provider = await sync_to_async(_sse_identity)(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+
+    subscription = realtime.hub.subscribe(realtime.channels_for(user, provider))
+    realtime.broker().start()
+    heartbeat = getattr(settings, 'REALTIME_HEARTBEAT', 20)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                payload = {k: v for k, v in event.items() if k != "channels"}
+                yield f"event: {event['event']}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            realtime.hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+# -------------------------------
+# Services
+# -------------------------------
+
+def _service_rows(services):
+    return [{"id": s.id, "name": s.name, "description": s.description, "price": s.price} for s in services]
+
+
+@api_view(['GET', 'POST'])
+def services_view(request):
+    if request.method == 'GET':
+        return _catalog_response(request, "services", _service_rows)
+    elif request.method == 'POST':
+        name = request.data.get('name')
+        description = request.data.get('description', '')
+        price = request.data.get('price', 0)
+        service = Service.objects.create(name=name, description=description, price=price)
+        return Response({"id": service.id, "name": service.name}, status=status.HTTP_201_CREATED)
+
+# -------------------------------
+# Health
+# -------------------------------
+@api_view(['GET'])
+def health(request):
+    return Response({"status": "OK"})
+
+
+@api_view(['GET'])
+def cache_stats_view(request):
+    """Hit/miss counters of this process's catalog cache and JWT user cache (see catalog.py, authentication.py)."""
+    return Response(dict(catalog.stats(), users=authentication.stats()))
+
+
+def metrics_view(request):
+    """Prometheus scrape target: per-endpoint metrics of every worker (see metrics.py)."""
+    return HttpResponse(metrics.render(metrics.collect()), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# -------------------------------
+# Signup and Login
+# -------------------------------
+@api_view(['POST'])
+def signup_user(request):
+    data = request.data
+
+    # Check if email already exists
+    if User.objects.filter(email=data.get('email')).exists():
+        return Response({"error": "Email already registered"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if User.objects.filter(username=data.get('username')).exists():
+        return Response({"error": "Username already taken"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Create user
+    user = User.objects.create(
+        username=data.get('username'),
+        email=data.get('email'),
+        password=make_password(data.get('password'))  # hash the password
+    )
+
+    # Create related profile
+    UserProfile.objects.create(
+        user=user,
+        phone=data.get('phone'),
+        role=data.get('role', 'user')  # default role = user
+    )
+
+    serializer = UserSerializer(user)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@csrf_exempt
+def login_user(request):
+    try:
+        data = request.data
+        email = data.get("email")
+        password = data.get("password")
+
+        # One query: email index + profile join (backends.EmailBackend)
+        user = authenticate(request, email=email, password=password)
+        if user is not None:
+            # Generate JWT tokens
+            refresh = tokens_for(user)
+            return Response({
+                "access": str(refresh.access_token),   # <-- Access token for frontend
+                "refresh": str(refresh),
+                "user_id": user.id,
+                "username": user.username,
+                "email": user.email,
+                "role": user.userprofile.role
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({"error": f"Login failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+# --- USER'S OWN REQUESTS: LIST, EDIT, CANCEL ---
+
+
+@query_budget({'GET': 4})
+@api_view(['GET'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+@conditional_get(my_requests_version)
+def my_requests_view(request):
+    """
+    Return logged-in user's own service requests, newest first.
+    Supports optional filter query param ?status=active to get active requests only,
+    ?page_size= / ?cursor= for keyset pagination, and ?since=<token> for delta sync
+    (only requests changed or deleted since the token, see sync.py).
+    """
+    user = request.user
+    status_filter = request.query_params.get('status', None)
+
+    if status_filter == 'active':
+        active_statuses = ["Pending", "Accepted", "Arrived"]
+        requests = ServiceRequest.objects.filter(user=user, status__in=active_statuses)
+    else:
+        requests = ServiceRequest.objects.filter(user=user)
+
+    if 'since' in request.query_params:
+        return _delta_response(
+            request,
+            ServiceRequest.objects.filter(user=user),
+            RequestTombstone.objects.filter(user_id=user.id),
+            user_request_rows,
+            snapshot=requests,
+        )
+    return _list_response(request, requests, ('-created', '-id'), user_request_rows)
+
+@csrf_exempt
+@api_view(['PATCH'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def my_request_patch_view(request, request_id):
+    """
+    Allow editing (PATCH) for requests with statuses Pending, Accepted, Arrived.
+    """
+    user = request.user
+    try:
+        obj = ServiceRequest.objects.get(id=request_id, user=user)
+    except ServiceRequest.DoesNotExist:
+        return Response({'error': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    if obj.status not in ["Pending", "Accepted", "Arrived"]:
+        return Response({'error': 'Can only edit requests with status Pending, Accepted or Arrived.'},
+                        status=status.HTTP_403_FORBIDDEN)
+
+    serializer = ServiceRequestEditSerializer(obj, data=request.data, partial=True)
+    if serializer.is_valid():
+        # Optional: restrict status changes here if required
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:  # one_active_job_per_provider
+            return Response({"error": ACCEPT_ERRORS[ACCEPT_BUSY]}, status=400)
+        return Response({'success': 'Request updated.', 'data': ServiceRequestUserSerializer(obj).data})
+    else:
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# --- CONFIRM ACTION (ARRIVED, COMPLETED) BY USER OR PROVIDER ---
+# Each confirmation is one conditional UPDATE (see transitions.py), so the
+# user and the provider confirming at the same moment cannot lose a flag.
+def _confirm_response(request, id, step):
+    role = request.data.get("role")
+    if role not in CONFIRM_ROLES:
+        return Response({"error": "Invalid role"}, status=400)
+    req = confirm(id, step, role)
+    if req is None:
+        return Response({"error": "Request not found"}, status=404)
+    return Response(ServiceRequestSerializer(req).data, status=200)
+
+# Arrived confirmation
+@api_view(['PATCH'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def confirm_arrived(request, id):
+    # If both confirmed, the update also sets status to Arrived
+    return _confirm_response(request, id, "arrived")
+
+# Completed confirmation
+@api_view(['PATCH'])
+@authentication_classes([CachedJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def confirm_completed(request, id):
+    # If both confirmed, the update also sets status to Completed
+    return _confirm_response(request, id, "completed")
\ No newline at end of file
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# ASGI profile: async views for the hot read endpoints and event-loop middleware (see settings)
+os.environ.setdefault('ASGI_PROFILE', '1')
 
 application = get_asgi_application()
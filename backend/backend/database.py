@@ -0,0 +1,100 @@
+"""
+DATABASES["default"] built from environment variables (see README "Database profiles").
+
+DB_PROFILE=sqlite (default)
+    SQLITE_PATH          database file (default: backend/db.sqlite3)
+    SQLITE_JOURNAL_MODE  WAL (default with SQLITE_PATH): readers no longer block on
+                         the writer. WAL is stored in the file and adds -wal/-shm
+                         files beside it, so the repo's tracked backend/db.sqlite3
+                         keeps SQLite's rollback journal (DELETE) unless this is set.
+    SQLITE_SYNCHRONOUS   NORMAL with WAL (safe there, fsync only at checkpoints),
+                         else FULL
+    SQLITE_MMAP_SIZE     bytes of the file read through mmap (default 256 MiB)
+    SQLITE_CACHE_KB      page cache per connection in KiB (default 64 MiB)
+    SQLITE_BUSY_TIMEOUT  seconds a writer waits for the lock before "database is locked" (default 5)
+    Transactions start with BEGIN IMMEDIATE, so a transaction that reads and
+    then writes waits on the busy timeout instead of failing on lock upgrade.
+
+DB_PROFILE=postgres (needs `pip install "psycopg[binary,pool]"`)
+    POSTGRES_DB / POSTGRES_USER / POSTGRES_PASSWORD / POSTGRES_HOST / POSTGRES_PORT
+    DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE  psycopg connection pool per worker process
+                                         (default 2 / 10); DB_POOL=0 turns it off
+
+Both profiles:
+    DB_CONN_MAX_AGE  seconds to keep a connection between requests (default 60;
+                     0 closes it after every request; ignored when pooling).
+                     ASGI_PROFILE=1 makes the default 0: under ASGI each request
+                     queries from a thread of its own, so a kept connection is
+                     never reused, only left for the garbage collector to close.
+"""
+import os
+
+DB_PROFILES = ("sqlite", "postgres")
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _default_conn_max_age():
+    return 0 if os.getenv("ASGI_PROFILE", "0") == "1" else 60
+
+
+def sqlite_init_command(journal_mode="WAL"):
+    """PRAGMAs run on every new SQLite connection; `journal_mode` unless SQLITE_JOURNAL_MODE is set."""
+    journal_mode = os.getenv("SQLITE_JOURNAL_MODE", journal_mode)
+    pragmas = {
+        "journal_mode": journal_mode,
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL" if journal_mode.upper() == "WAL" else "FULL"),
+        "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+        "cache_size": -_env_int("SQLITE_CACHE_KB", 64 * 1024),  # negative = KiB
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    }
+    return ";".join(f"PRAGMA {name}={value}" for name, value in pragmas.items())
+
+
+def sqlite_database(base_dir):
+    path = os.getenv("SQLITE_PATH")
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path or base_dir / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": sqlite_init_command("WAL" if path else "DELETE"),
+            "transaction_mode": "IMMEDIATE",
+            "timeout": _env_int("SQLITE_BUSY_TIMEOUT", 5),
+        },
+        "CONN_MAX_AGE": _env_int("DB_CONN_MAX_AGE", _default_conn_max_age()),
+        "CONN_HEALTH_CHECKS": True,
+        # On-disk test database: the concurrency tests write from several threads, which an
+        # in-memory (shared-cache) SQLite database rejects with "table is locked".
+        "TEST": {"NAME": base_dir / "test_db.sqlite3"},
+    }
+
+
+def postgres_database():
+    database = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.getenv("POSTGRES_DB", "quickassist"),
+        "USER": os.getenv("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+        "HOST": os.getenv("POSTGRES_HOST", "127.0.0.1"),
+        "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        "OPTIONS": {},
+        "CONN_MAX_AGE": _env_int("DB_CONN_MAX_AGE", _default_conn_max_age()),
+        "CONN_HEALTH_CHECKS": True,
+    }
+    if os.getenv("DB_POOL", "1") != "0":
+        database["OPTIONS"]["pool"] = {
+            "min_size": _env_int("DB_POOL_MIN_SIZE", 2),
+            "max_size": _env_int("DB_POOL_MAX_SIZE", 10),
+        }
+        database["CONN_MAX_AGE"] = 0  # Django requires this with a pool; the pool keeps connections
+    return database
+
+
+def database_from_env(base_dir):
+    profile = os.getenv("DB_PROFILE", "sqlite").lower()
+    if profile not in DB_PROFILES:
+        raise ValueError(f"DB_PROFILE must be one of {DB_PROFILES}, got {profile!r}")
+    return sqlite_database(base_dir) if profile == "sqlite" else postgres_database()
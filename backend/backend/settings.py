@@ -20,6 +20,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Load environment variables from .env automatically
 from dotenv import load_dotenv
 load_dotenv(BASE_DIR / '.env')
+
+from .database import database_from_env
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -69,6 +71,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',  # first, so it times the whole stack (see /api/metrics)
     'corsheaders.middleware.CorsMiddleware', #cors
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,6 +82,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# ASGI profile, turned on by backend/asgi.py: async views for the hot read endpoints
+# (api/async_views.py), the middleware above with its hooks run on the event loop instead of a
+# thread each (api/middleware.py), and DB_CONN_MAX_AGE defaulting to 0 (backend/database.py).
+ASGI_PROFILE = os.getenv('ASGI_PROFILE', '0') == '1'
+ASGI_MIDDLEWARE = [
+    name if name.startswith(('api.', 'corsheaders.')) else 'api.middleware.' + name.rsplit('.', 1)[1]
+    for name in MIDDLEWARE
+]
+if ASGI_PROFILE:
+    MIDDLEWARE = ASGI_MIDDLEWARE
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -115,11 +129,9 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Profile (SQLite with WAL, or pooled Postgres) chosen by DB_PROFILE; see backend/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
 }
 
 
@@ -142,6 +154,24 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Login by email in one indexed query (api/backends.py); ModelBackend keeps username logins for the admin
+AUTHENTICATION_BACKENDS = [
+    'api.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Password hashing. PASSWORD_HASH_ITERATIONS sets the PBKDF2 work factor (unset: Django's default,
+# which production should keep). Lower it for load tests and CI only; see api/hashers.py.
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 0)) or None
+PASSWORD_HASHERS = [
+    'api.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -176,16 +206,91 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework configuration – JSON only to avoid template dependency
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',  # JWTAuthentication + per-process user cache
     ),
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',  # Removes Browsable API -> no template error
+        # JSONRenderer's output, rendered with orjson when installed (see api/renderers.py).
+        # JSON only: removes Browsable API -> no template error
+        'api.renderers.FastJSONRenderer',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
 }
 
+SIMPLE_JWT = {
+    # Tokens carry a hash of the user's password hash (their version): changing the password
+    # revokes them. Set JWT_REVOKE_ON_PASSWORD_CHANGE=0 to accept tokens issued without it.
+    'CHECK_REVOKE_TOKEN': os.getenv('JWT_REVOKE_ON_PASSWORD_CHANGE', '1') == '1',
+}
+# Per-process cache of JWT-authenticated users (see api/authentication.py)
+JWT_USER_CACHE_SECONDS = float(os.getenv('JWT_USER_CACHE_SECONDS', 30))
+JWT_USER_CACHE_SIZE = int(os.getenv('JWT_USER_CACHE_SIZE', 10000))
+# Put "role" and "provider_id" claims in the tokens issued at login
+JWT_IDENTITY_CLAIMS = os.getenv('JWT_IDENTITY_CLAIMS', '0') == '1'
+
+# Keyset pagination for list endpoints (opt-in with ?page_size= / ?cursor=, see api/pagination.py)
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 500))
+# Items per call to /api/requests/batch
+API_BATCH_MAX_ITEMS = int(os.getenv('API_BATCH_MAX_ITEMS', 500))
+
+# Per-process provider arrays used for dispatch ranking are reloaded after this many seconds
+DISPATCH_INDEX_MAX_AGE = int(os.getenv('DISPATCH_INDEX_MAX_AGE', 60))
+
+# Buffered provider GPS positions are written every this many seconds (api/locations.py);
+# 0 turns the background flusher off
+LOCATION_FLUSH_INTERVAL = float(os.getenv('LOCATION_FLUSH_INTERVAL', 2.0))
+# Flushed positions reach `updated` (ETags) and the providers catalog cache at most this often
+LOCATION_PUBLISH_INTERVAL = float(os.getenv('LOCATION_PUBLISH_INTERVAL', 60))
+# Samples stamped further than this many seconds ahead of the server clock are rejected
+LOCATION_MAX_CLOCK_SKEW = float(os.getenv('LOCATION_MAX_CLOCK_SKEW', 30))
+# Samples are written to a request's trajectory in chunks of about this many seconds
+TRAJECTORY_CHUNK_SECONDS = int(os.getenv('TRAJECTORY_CHUNK_SECONDS', 60))
+# Samples buffered per provider before the oldest are dropped (e.g. while chunk writes fail)
+TRAJECTORY_MAX_POINTS = int(os.getenv('TRAJECTORY_MAX_POINTS', 5000))
+
+# Query budgets and N+1 detection on views (api/querybudget.py): "raise" in the test suite
+# (api/test_runner.py), "warn" with DEBUG, otherwise "off"
+QUERY_BUDGET = os.getenv('QUERY_BUDGET') or None
+TEST_RUNNER = 'api.test_runner.QueryBudgetTestRunner'
+QUERY_BUDGET_REPEAT_LIMIT = int(os.getenv('QUERY_BUDGET_REPEAT_LIMIT', 5))
+
+# Per-endpoint metrics (/api/metrics, see api/metrics.py). Under gunicorn set METRICS_DIR to
+# a directory shared by the workers (emptied on each start) so a scrape covers all of them.
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_DUMP_INTERVAL = float(os.getenv('METRICS_DUMP_INTERVAL', 5))
+
+# Live request events (/api/events, see api/realtime.py). "database" fans out across
+# worker processes through the RealtimeEvent table; "local" is single-process only.
+# Events are only published under ASGI_PROFILE; a WSGI deploy has no stream to feed.
+REALTIME_BROKER = os.getenv('REALTIME_BROKER', 'database')
+REALTIME_POLL_INTERVAL = float(os.getenv('REALTIME_POLL_INTERVAL', 0.5))
+REALTIME_EVENT_TTL = int(os.getenv('REALTIME_EVENT_TTL', 300))
+REALTIME_HEARTBEAT = int(os.getenv('REALTIME_HEARTBEAT', 20))
+# Lifetime of the single-use tickets that open the stream (/api/events/ticket)
+REALTIME_TICKET_TTL = int(os.getenv('REALTIME_TICKET_TTL', 30))
+
+# Delta sync (?since=<token>, see api/sync.py)
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', 5))
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 30))
+
+# Shared cache for the catalog read-through cache (api/catalog.py). The local-memory
+# default is per process; point CACHE_BACKEND / CACHE_LOCATION at Redis or Memcached
+# (e.g. django.core.cache.backends.redis.RedisCache, redis://127.0.0.1:6379/1) when
+# running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 32))
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 3600))
+# With a per-process cache (the LocMemCache default) a write only invalidates its own worker:
+# the others keep a cached catalog list at most this many seconds (see api/catalog.py)
+CATALOG_LOCAL_TTL = float(os.getenv('CATALOG_LOCAL_TTL', 5))
+
 # drf-spectacular basic settings (safe if package missing because import of schema view is wrapped)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'QuickAssist API',
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from api import views
+from api import async_views, views
+
+# Hot read endpoints: async views under ASGI (see api/async_views.py), the sync ones otherwise
+reads = async_views if settings.ASGI_PROFILE else views
 
 urlpatterns = [
     path('', views.home),
@@ -18,21 +22,36 @@ urlpatterns = [
     path('api/users/login', views.login_user),    # POST Login
 
     # Providers
-    path('api/providers', views.providers_view),              
+    path('api/providers', reads.providers_view),              
+    path('api/providers/nearby', views.providers_nearby_view),  # GET ?lat=&lng=&type=&k=
     path('api/providers/<int:provider_id>', views.provider_view),
+    path('api/providers/location', views.provider_location_view),  # POST GPS samples (buffered)
+    path('api/providers/location/stats', views.provider_location_stats_view),
+    path('api/providers/<int:provider_id>/trajectory', views.provider_trajectory_view),  # ?from=&to=
 
     # Service Requests
     path('api/requests', views.requests_view),
-    path('api/requests/<int:request_id>', views.request_view),
+    path('api/requests/batch', views.requests_batch_view),  # POST creates / PATCH updates, arrays
+    path('api/requests/<int:request_id>/trajectory', views.request_trajectory_view),  # route, distance, arrival
+    path('api/requests/<int:request_id>', reads.request_view),
+
+    # Provider job feed (?bucket=available|active|past)
+    path('api/provider/jobs', views.provider_jobs_view),
+
+    # Live request events (Server-Sent Events, ASGI only; 501 under WSGI)
+    path('api/events', views.events_view),  # GET ?ticket=
+    path('api/events/ticket', views.events_ticket_view),  # POST: single-use stream ticket
 
     # Health
-    path('api/health', views.health),
+    path('api/health', reads.health),
+    path('api/cache/stats', views.cache_stats_view),  # catalog cache hit/miss counters
+    path('api/metrics', views.metrics_view),  # Prometheus text format
 
     # Services
-    path('api/services', views.services_view),
+    path('api/services', reads.services_view),
 
     # --- USER REQUESTS URLS ---
-    path('api/myrequests', views.my_requests_view),
+    path('api/myrequests', reads.my_requests_view),
     path('api/myrequests/<int:request_id>', views.my_request_patch_view),
 
     # Request Confirmation
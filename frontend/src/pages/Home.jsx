@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react";
 import backendURL from "../config";
+import { subscribeToRequestEvents } from "../services/liveUpdates";
 import "../styles/home.css";
 import "../styles/myrequests.css"; // use MyRequests style for cards
 import "../styles/pageBackground.css";
@@ -76,10 +77,8 @@ const MIN_LOADING_TIME = 3000;
       return;
     }
     fetchActiveRequest();
-    const timer = setInterval(() => {
-      fetchActiveRequest();
-    }, 15000); // poll every 15s
-    return () => clearInterval(timer);
+    // Refresh when the backend pushes a change to one of our requests
+    return subscribeToRequestEvents(fetchActiveRequest);
   }, [token]);
 
   const fetchActiveRequest = async () => {
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from "react";
 import backendURL from "../config";
+import { subscribeToRequestEvents } from "../services/liveUpdates";
 import "../styles/home.css";
 import "../styles/myrequests.css";
 import "../styles/pageBackground.css";
@@ -30,12 +31,10 @@ const MyRequests = () => {
   const [sessionExpired, setSessionExpired] = useState(false);
   const navigate = useNavigate();
 
-  // Polling - auto refresh every 15s
+  // Auto refresh when the backend pushes a request event
   useEffect(() => {
-    let timer;
     fetchRequests();
-    timer = setInterval(fetchRequests, 15000);
-    return () => clearInterval(timer);
+    return subscribeToRequestEvents(fetchRequests);
     // eslint-disable-next-line
   }, []);
 
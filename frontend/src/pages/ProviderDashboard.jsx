@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from "react";
 import backendURL from "../config";
+import { subscribeToRequestEvents } from "../services/liveUpdates";
 import "../styles/pageBackground.css";
 import "../styles/global.css";
 import "../styles/providerdashboard.css";
@@ -13,7 +14,6 @@ import AvailableJobs from "../components/provider/AvailableJobs";
 const ProviderDashboard = () => {
   const [assignedJobs, setAssignedJobs] = useState([]);
   const [availableJobs, setAvailableJobs] = useState([]);
-  const [pastJobs, setPastJobs] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [refreshing, setRefreshing] = useState(false);
@@ -62,12 +62,11 @@ const ProviderDashboard = () => {
     fetchProviderProfile();
   }, []);
 
-  // Fetch jobs initially and every 15 seconds
+  // Fetch jobs initially and whenever the backend pushes a job event
   useEffect(() => {
     if (sessionExpired) return; // skip fetching if session expired
     fetchJobs();
-    const timer = setInterval(fetchJobs, 15000);
-    return () => clearInterval(timer);
+    return subscribeToRequestEvents(fetchJobs);
   }, []);
 
   async function fetchJobs() {
@@ -86,37 +85,22 @@ const ProviderDashboard = () => {
       return;
     }
     const headers = { Authorization: `Bearer ${token}` };
-    const res = await fetch(`${backendURL}/api/requests`, { headers });
+    // The backend filters and orders each bucket for the logged-in provider
+    const [activeRes, availableRes] = await Promise.all([
+      fetch(`${backendURL}/api/provider/jobs?bucket=active`, { headers }),
+      fetch(`${backendURL}/api/provider/jobs?bucket=available`, { headers }),
+    ]);
 
-    if (res.status === 401) {
+    if (activeRes.status === 401 || availableRes.status === 401) {
       setSessionExpired(true);
       setLoading(false);
       setRefreshing(false);
       return;
     }
-    if (!res.ok) throw new Error("Failed to load jobs");
-
-    const jobs = await res.json();
-    const providerEmail = (localStorage.getItem("providerEmail") || "").toLowerCase();
-    const providerType = (localStorage.getItem("providerType") || "").toLowerCase();
-
-    const assigned = jobs.filter(
-      (job) =>
-        job.provider?.email?.toLowerCase() === providerEmail &&
-        ["Accepted", "Arrived", "Completed", "Cancelled"].includes(job.status)
-    );
-    const available = jobs.filter(
-      (job) =>
-        job.provider &&
-        job.status === "Pending" &&
-        job.service?.name?.toLowerCase() === providerType
-    );
-    const past = assigned.filter((job) => ["Completed", "Cancelled"].includes(job.status));
-    const active = assigned.filter((job) => !["Completed", "Cancelled"].includes(job.status));
-
-    setAssignedJobs(active.sort((a, b) => b.id - a.id));
-    setPastJobs(past.sort((a, b) => b.id - a.id));
-    setAvailableJobs(available.sort((a, b) => b.id - a.id));
+    if (!activeRes.ok || !availableRes.ok) throw new Error("Failed to load jobs");
+
+    setAssignedJobs(await activeRes.json());
+    setAvailableJobs(await availableRes.json());
 
   } catch (e) {
     setError(e.message || "Failed to load jobs");
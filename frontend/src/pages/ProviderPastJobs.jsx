@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from "react";
 import backendURL from "../config";
+import { subscribeToRequestEvents } from "../services/liveUpdates";
 import "../styles/home.css";
 import "../styles/myrequests.css";
 import "../styles/providerpastjobs.css";
@@ -29,10 +30,8 @@ const ProviderPastJobs = () => {
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    let timer;
     fetchRequests();
-    timer = setInterval(fetchRequests, 15000);
-    return () => clearInterval(timer);
+    return subscribeToRequestEvents(fetchRequests);
   }, []);
 
   const fetchRequests = async () => {
@@ -42,7 +41,7 @@ const ProviderPastJobs = () => {
       const token = localStorage.getItem("access");
       if (!token) throw new Error("Not logged in");
 
-      const res = await fetch(`${backendURL}/api/requests`, {
+      const res = await fetch(`${backendURL}/api/provider/jobs?bucket=past`, {
         method: "GET",
         headers: {
           "Authorization": `Bearer ${token}`,
@@ -50,21 +49,10 @@ const ProviderPastJobs = () => {
         }
       });
       if (res.status === 401) throw new Error("Session expired. Please log in again.");
-      const data = await res.json();
+      if (!res.ok) throw new Error("Failed to load past jobs.");
 
-      const providerEmail = (localStorage.getItem("providerEmail") || "").toLowerCase();
-
-      // Filter requests assigned to this provider and with status Completed or Cancelled
-      const filtered = data.filter(
-        (req) =>
-          req.provider?.email?.toLowerCase() === providerEmail &&
-          ["Completed", "Cancelled"].includes(req.status)
-      );
-
-      // Sort by created date descending (latest first)
-      filtered.sort((a, b) => new Date(b.created) - new Date(a.created));
-
-      setRequests(filtered);
+      // Already filtered to this provider's Completed/Cancelled jobs, latest first
+      setRequests(await res.json());
     } catch (err) {
       setError(err.message || "Failed to load past jobs.");
     } finally {
@@ -0,0 +1,82 @@
+// services/liveUpdates.js
+import backendURL from "../config";
+
+// Same interval the pages polled at before the event stream; used whenever no stream is open
+const POLL_MS = 15000;
+// Slow safety-net poll while the stream is open
+const STREAM_POLL_MS = 120000;
+// Wait before asking for a new ticket after the stream drops
+const RECONNECT_MS = 5000;
+const REQUEST_EVENTS = ["request.created", "request.updated", "request.deleted"];
+
+// Call `refresh` whenever the backend pushes a request event over /api/events
+// (Server-Sent Events), or every 15s when the backend has no event stream
+// (WSGI deploy: /api/events/ticket answers 501). Returns a cleanup function.
+export function subscribeToRequestEvents(refresh) {
+  let source = null;
+  let debounce = null;
+  let timer = null;
+  let reconnect = null;
+  let closed = false;
+
+  const poll = (ms) => {
+    clearInterval(timer);
+    timer = setInterval(refresh, ms);
+  };
+
+  const scheduleRefresh = () => {
+    // Several events often arrive together (e.g. a dispatch cycle): refresh once
+    clearTimeout(debounce);
+    debounce = setTimeout(refresh, 300);
+  };
+
+  // EventSource cannot send an Authorization header, and an access token in the
+  // URL ends up in server and proxy logs: open the stream with a single-use ticket.
+  const connect = async () => {
+    const token = localStorage.getItem("access");
+    if (closed || !token || !window.EventSource) return;
+    let res = null;
+    try {
+      res = await fetch(`${backendURL}/api/events/ticket`, {
+        method: "POST",
+        headers: { "Authorization": `Bearer ${token}` },
+      });
+    } catch (err) {
+      res = null;
+    }
+    if (closed) return;
+    if (!res || !res.ok) {
+      // 501: no event stream on this deploy; 401/403: logged out. Keep polling either way.
+      if (!res || (res.status >= 500 && res.status !== 501)) {
+        reconnect = setTimeout(connect, RECONNECT_MS);
+      }
+      return;
+    }
+    const { ticket } = await res.json();
+    if (closed) return;
+
+    source = new EventSource(`${backendURL}/api/events?ticket=${encodeURIComponent(ticket)}`);
+    REQUEST_EVENTS.forEach((name) => source.addEventListener(name, scheduleRefresh));
+    source.onopen = () => poll(STREAM_POLL_MS);
+    source.onerror = () => {
+      // The ticket is spent, so EventSource's own retry would be refused:
+      // poll again and reconnect with a fresh ticket.
+      source.close();
+      source = null;
+      poll(POLL_MS);
+      scheduleRefresh();
+      reconnect = setTimeout(connect, RECONNECT_MS);
+    };
+  };
+
+  poll(POLL_MS);
+  connect();
+
+  return () => {
+    closed = true;
+    clearInterval(timer);
+    clearTimeout(debounce);
+    clearTimeout(reconnect);
+    if (source) source.close();
+  };
+}